@@ -1,67 +1,356 @@
-from PIL import Image, ImageOps
-import sys
+#!/usr/bin/env python3
+"""
+Convert images to 1-bit PROGMEM bitmaps for the wearable's SSD1306 OLED.
+
+Each image is scaled to fit the display (aspect ratio kept, never enlarged),
+centred on black, reduced to one bit per pixel and written as a C array in
+Adafruit_GFX `drawBitmap` layout: rows top to bottom, each row padded to
+whole bytes, most significant bit first, 1 = lit pixel.
+
+Whole directories are converted in a process pool. Inputs whose content and
+options are unchanged since the last run are skipped (a SHA-256 cache next to
+the outputs), so regenerating every screen asset only redoes what changed.
+
+Dithering:
+    threshold         lit where the grey level >= --threshold (default 128)
+    floyd-steinberg   error diffusion (Pillow's C implementation), best for photos
+    ordered           8x8 Bayer matrix, regular pattern, best for gradients
+
+--animation NAME turns all inputs into the frames of one compressed animation
+instead: frame files in natural order (frame2 before frame10), every frame of
+an animated GIF, or the cells of sprite sheets (--sheet COLSxROWS, row by
+row). Identical 8x8 tiles are stored once and each frame is coded against the
+previous one (see oled_anim.py); the header includes the decoder, and a
+report gives the compression and estimated decode time per frame.
+
+Usage:
+    python3 convert_bg.py logo.png --name brain_logo            # C array on stdout
+    python3 convert_bg.py assets/ -o generated/ --dither ordered
+    python3 convert_bg.py assets/*.png -o generated/ --size 128x32 --invert
+    python3 convert_bg.py walk/ --animation walk --size 32x32 -o generated/
+    python3 convert_bg.py heart_sheet.png --sheet 8x1 --animation heart --size 16x16 -o generated/
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import re
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+import oled_anim
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+DITHERS = ('threshold', 'floyd-steinberg', 'ordered')
+CACHE_NAME = ".convert_bg_cache.json"
+FORMAT_VERSION = 2   # Bump when the output changes for the same options
+BYTES_PER_LINE = 16
+
+
+def _bayer(n):
+    """n x n Bayer matrix (n a power of two) with values 0..n*n-1"""
+    m = np.zeros((1, 1), dtype=np.int32)
+    while m.shape[0] < n:
+        m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+    return m
+
+# Per-pixel thresholds for ordered dithering, spread evenly over 0..255
+BAYER_THRESHOLDS = ((_bayer(8) + 0.5) * (256 / 64)).astype(np.float32)
+
+
+def load_canvas(path, width, height):
+    """Greyscale display-sized canvas (PIL image) with the image centred on black"""
+    with Image.open(path) as img:
+        img.load()
+    return fit_canvas(img, width, height)
+
+
+def fit_canvas(img, width, height):
+    """`img` scaled down to fit width x height (never enlarged), centred on black, greyscale"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Transparent areas are unlit
+        img = img.convert('RGBA')
+        background = Image.new('RGBA', img.size, (0, 0, 0, 255))
+        img = Image.alpha_composite(background, img)
+    img = img.convert('L')
+    img.thumbnail((width, height), Image.Resampling.LANCZOS)
+    canvas = Image.new('L', (width, height), 0)
+    canvas.paste(img, ((width - img.width) // 2, (height - img.height) // 2))
+    return canvas
+
+
+def to_bits(canvas, dither='threshold', threshold=128, invert=False):
+    """Boolean (height, width) array of lit pixels"""
+    if dither == 'floyd-steinberg':
+        bits = np.asarray(canvas.convert('1', dither=Image.Dither.FLOYDSTEINBERG), dtype=bool)
+    else:
+        grey = np.asarray(canvas)
+        if dither == 'ordered':
+            h, w = grey.shape
+            tiles = np.tile(BAYER_THRESHOLDS, (-(-h // 8), -(-w // 8)))[:h, :w]
+            bits = grey > tiles
+        else:
+            bits = grey >= threshold
+    return ~bits if invert else bits
+
+
+def pack_bits(bits):
+    """drawBitmap bytes: each row packed MSB first and padded to a whole byte"""
+    return np.packbits(bits, axis=1).tobytes()
+
+
+def c_array(name, data, width, height, source=None, options=None, per_line=BYTES_PER_LINE):
+    """The bitmap as C source, `per_line` bytes to a line (None: all on one)"""
+    lines = []
+    if source:
+        lines.append(f"// Generated by convert_bg.py from {source}"
+                     f"{f' ({options})' if options else ''} - do not edit")
+    lines.append(f"// Image size: {width}x{height}")
+    lines.append(f"const unsigned char {name} [] PROGMEM = {{")
+    per_line = per_line or max(len(data), 1)
+    lines.append(",\n".join(", ".join(f"0x{b:02x}" for b in data[i:i + per_line])
+                            for i in range(0, len(data), per_line)))
+    lines.append("};")
+    return "\n".join(lines) + "\n"
+
+
+def array_name(path):
+    """C identifier from a file name: 'brain logo.png' -> 'brain_logo'"""
+    name = re.sub(r'\W', '_', os.path.splitext(os.path.basename(path))[0])
+    return f"_{name}" if not name or name[0].isdigit() else name
+
+
+def convert(path, width=128, height=64, dither='threshold', threshold=128, invert=False,
+            name=None, header=True, per_line=BYTES_PER_LINE):
+    """C source for one image file"""
+    bits = to_bits(load_canvas(path, width, height), dither, threshold, invert)
+    options = f"{width}x{height}, {dither}{f' {threshold}' if dither == 'threshold' else ''}" \
+              f"{', inverted' if invert else ''}"
+    return c_array(name or array_name(path), pack_bits(bits), width, height,
+                   os.path.basename(path) if header else None, options, per_line)
+
+
+def _natural_key(path):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', path)]
 
-def convert_image(image_path):
+
+def find_images(inputs):
+    """Image files named directly or found in the given directories (natural order)"""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                found.extend(os.path.join(root, f) for f in sorted(files, key=_natural_key)
+                             if f.lower().endswith(IMAGE_EXTENSIONS))
+        elif os.path.isfile(item):
+            found.append(item)
+        else:
+            raise FileNotFoundError(f"no such file or directory: {item}")
+    return found
+
+
+def content_key(paths, options):
+    """Hash of the files' bytes and every option that affects the output"""
+    digest = hashlib.sha256(json.dumps([FORMAT_VERSION, options], sort_keys=True).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_cache(path):
     try:
-        if not os.path.exists(image_path):
-            print(f"Error: File not found at {image_path}")
-            return
-
-        img = Image.open(image_path).convert('L')
-        
-        # Resize to fit 128x64 while maintaining aspect ratio
-        target_size = (128, 64)
-        img.thumbnail(target_size, Image.Resampling.LANCZOS)
-        
-        # Create a new blank (black) image
-        new_img = Image.new('1', target_size, 0)
-        
-        # Center the image
-        img_w, img_h = img.size
-        offset = ((128 - img_w) // 2, (64 - img_h) // 2)
-        
-        # Paste and convert to binary (dither or threshold)
-        # Using simple threshold
-        img = img.point(lambda x: 0 if x < 128 else 255, '1')
-        new_img.paste(img, offset)
-        
-        # Convert to byte array (Row-major)
-        # 128 width = 16 bytes per row
-        # 64 height
-        pixels = new_img.load()
-        width, height = new_img.size
-        
-        print(f"// Image size: {width}x{height}")
-        print(f"const unsigned char brain_logo [] PROGMEM = {{")
-        
-        byte_val = 0
-        bit_pos = 0
-        count = 0
-        
-        hex_output = []
-        
-        # Standard GFX bitmap is row-major
-        # Top-left pixel is byte 0, bit 7 (usually MSB first for GFX?)
-        # Adafruit_GFX: "The data is stored as a byte array, with the most significant bit of the first byte corresponding to the pixel at (0,0)"
-        
-        for y in range(height):
-            for x in range(width):
-                if pixels[x, y] > 0: # White pixel
-                    byte_val |= (0x80 >> bit_pos)
-                
-                bit_pos += 1
-                if bit_pos == 8:
-                    hex_output.append(f"0x{byte_val:02x}")
-                    byte_val = 0
-                    bit_pos = 0
-                    
-        # Join and format
-        print(", ".join(hex_output))
-        print("};")
-        
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path, cache):
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _convert_job(job):
+    """Pool worker: (source, output, options) -> (source, error or None)"""
+    source, output, options = job
+    try:
+        text = convert(source, **options)
+        tmp = output + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, output)
+        return source, None
     except Exception as e:
-        print(f"Error converting image: {e}")
+        return source, str(e)
+
+
+def frame_images(path, sheet=None):
+    """Frames in one input: sprite sheet cells (cols, rows), GIF frames, or the image itself"""
+    with Image.open(path) as img:
+        if sheet:
+            img.load()
+            cols, rows = sheet
+            w, h = img.width // cols, img.height // rows
+            return [img.crop((c * w, r * h, (c + 1) * w, (r + 1) * h))
+                    for r in range(rows) for c in range(cols)]
+        return [frame.copy() for frame in ImageSequence.Iterator(img)]
+
+
+def export_animation(sources, name, sheet=None, keyframe_every=0, width=128,
+                     height=64, dither='threshold', threshold=128, invert=False):
+    """Encode all frames of `sources` as one animation; returns (header text, report)"""
+    frames = []
+    for path in sources:
+        for img in frame_images(path, sheet):
+            frames.append(to_bits(fit_canvas(img, width, height), dither, threshold, invert))
+    anim = oled_anim.encode_animation(frames, keyframe_every)
+    oled_anim.verify(anim, frames)
+    source = (os.path.basename(sources[0]) if len(sources) == 1 else
+              f"{len(sources)} files ({os.path.basename(sources[0])} ...)")
+    return oled_anim.render_header(name, anim, source), oled_anim.report(name, anim)
+
+
+def parse_size(spec):
+    match = re.fullmatch(r'(\d+)[xX](\d+)', spec)
+    if not match or not all(0 < int(v) <= 4096 for v in match.groups()):
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, e.g. 128x64, got '{spec}'")
+    return int(match.group(1)), int(match.group(2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert images to SSD1306 PROGMEM bitmaps")
+    parser.add_argument("inputs", nargs="+", help="Image files and/or directories of images")
+    parser.add_argument("-o", "--output", metavar="DIR",
+                        help="Write one <name>.h per image here (default: a single image to stdout)")
+    parser.add_argument("--size", type=parse_size, default=(128, 64), metavar="WxH",
+                        help="Display size in pixels (default 128x64)")
+    parser.add_argument("--dither", choices=DITHERS, default='threshold',
+                        help="Reduction to 1 bit (default threshold)")
+    parser.add_argument("--threshold", type=int, default=128,
+                        help="Grey level (0-255) at or above which a pixel is lit (--dither threshold)")
+    parser.add_argument("--invert", action="store_true", help="Light the dark parts instead")
+    parser.add_argument("--name", help="C array name (single image only; default from the file name)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Convert even if unchanged since the last run")
+    parser.add_argument("--animation", metavar="NAME",
+                        help="Export all inputs as the frames of one compressed animation")
+    parser.add_argument("--sheet", type=parse_size, metavar="COLSxROWS",
+                        help="Inputs are sprite sheets of this many cells (--animation)")
+    parser.add_argument("--keyframe-every", type=int, default=0, metavar="N",
+                        help="Force a key frame every N frames (--animation; default only the first)")
+    args = parser.parse_args(argv)
+
+    try:
+        sources = find_images(args.inputs)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if not sources:
+        parser.error("no images found")
+    if not 0 <= args.threshold <= 256:
+        parser.error("--threshold must be 0-256")
+    if args.name and len(sources) > 1:
+        parser.error("--name needs exactly one image")
+    width, height = args.size
+    options = dict(width=width, height=height, dither=args.dither,
+                   threshold=args.threshold, invert=args.invert)
+
+    if args.animation:
+        return animation_main(parser, args, sources, options)
+    if args.sheet:
+        parser.error("--sheet needs --animation")
+
+    if not args.output:
+        if len(sources) > 1:
+            parser.error("several images need --output DIR")
+        # The old script's layout (one line of bytes), for pasting into a sketch
+        sys.stdout.write(convert(sources[0], name=args.name, header=False, per_line=None, **options))
+        return 0
+
+    started = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    cache_path = os.path.join(args.output, CACHE_NAME)
+    cache = {} if args.force else load_cache(cache_path)
+    jobs, keys, seen = [], {}, {}
+    for source in sources:
+        name = args.name or array_name(source)
+        if name in seen:
+            parser.error(f"{source} and {seen[name]} would both become {name}.h")
+        seen[name] = source
+        output = os.path.join(args.output, name + ".h")
+        job_options = dict(options, name=name)
+        key = content_key([source], job_options)
+        entry = cache.get(os.path.abspath(source))
+        if entry and entry.get('key') == key and os.path.exists(output):
+            continue
+        keys[source] = (key, output)
+        jobs.append((source, output, job_options))
+
+    failed = 0
+    if len(jobs) > 1 and args.workers > 1:
+        with multiprocessing.Pool(min(args.workers, len(jobs))) as pool:
+            results = list(pool.imap_unordered(_convert_job, jobs))
+    else:
+        results = [_convert_job(job) for job in jobs]
+    for source, error in results:
+        if error:
+            failed += 1
+            print(f"Error converting {source}: {error}", file=sys.stderr)
+            continue
+        key, output = keys[source]
+        cache[os.path.abspath(source)] = {'key': key, 'output': os.path.abspath(output)}
+    save_cache(cache_path, cache)
+
+    print(f"Converted {len(jobs) - failed}, unchanged {len(sources) - len(jobs)}, failed {failed} "
+          f"in {time.perf_counter() - started:.2f}s -> {args.output}")
+    return 1 if failed else 0
+
+
+def animation_main(parser, args, sources, options):
+    """--animation: one header (stdout or <NAME>.h in --output) and a report"""
+    if not re.fullmatch(r'[A-Za-z_]\w*', args.animation):
+        parser.error("--animation needs a C identifier")
+    if options['width'] % 8 or options['height'] % 8 or options['width'] > 2040:
+        parser.error("--animation needs a size in whole 8x8 tiles, at most 2040 wide")
+    started = time.perf_counter()
+    options = dict(options, sheet=args.sheet, keyframe_every=args.keyframe_every)
+    output = os.path.join(args.output, args.animation + ".h") if args.output else None
+    cache_path = os.path.join(args.output, CACHE_NAME) if args.output else None
+    cache = {} if args.force or not cache_path else load_cache(cache_path)
+    key = content_key(sources, dict(options, animation=args.animation))
+    entry = cache.get('animation:' + args.animation)
+    if output and entry and entry.get('key') == key and os.path.exists(output):
+        print(f"{args.animation}: unchanged -> {output}")
+        return 0
+
+    try:
+        header, summary = export_animation(sources, args.animation, **options)
+    except (OSError, ValueError) as e:
+        print(f"Error converting {args.animation}: {e}", file=sys.stderr)
+        return 1
+    if not output:
+        sys.stdout.write(header)
+        print(summary, file=sys.stderr)
+        return 0
+    os.makedirs(args.output, exist_ok=True)
+    with open(output + ".tmp", 'w') as f:
+        f.write(header)
+    os.replace(output + ".tmp", output)
+    cache['animation:' + args.animation] = {'key': key, 'output': os.path.abspath(output)}
+    save_cache(cache_path, cache)
+    print(summary)
+    print(f"Wrote {output} in {time.perf_counter() - started:.2f}s")
+    return 0
+
 
 if __name__ == "__main__":
-    convert_image(r'C:/Users/alber/.gemini/antigravity/brain/acc2c0e7-afbc-44cf-a192-a80d7022f89a/uploaded_image_1768111493112.png')
+    sys.exit(main())
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Tile-compressed animations for the SSD1306, with a matching C decoder.
+
+Frames are cut into 8x8 tiles in the SSD1306's own memory layout (one byte per
+column of an 8-pixel page, least significant bit on top), so a decoded tile
+is 8 bytes copied straight into `display.getBuffer()`. No intermediate frame
+buffer and no bit shuffling are needed on the device.
+
+Identical tiles are stored once, across all frames. Each frame is then a
+stream of tile indices coded with three ops:
+
+    00nnnnnn            skip n+1 tiles (unchanged since the previous frame)
+    01nnnnnn idx        repeat one tile n+1 times
+    10nnnnnn idx...     n+1 literal tile indices
+
+Tile indices are 1 byte, or 2 (little endian) once there are more than 256
+unique tiles. A key frame codes every tile. A delta frame skips the tiles
+that did not change, so it needs the previous frame already in the buffer.
+The encoder picks whichever of the two is smaller for each frame (frame 0 and
+every `keyframe_every`-th frame are always key frames).
+
+`render_header` writes the tile table, frame streams and offsets as PROGMEM
+arrays together with `oled_anim_decode()`; `decode_frame` is the same decoder
+in Python and checks every encoded frame before the header is written.
+"""
+
+import numpy as np
+
+OP_SKIP, OP_RUN, OP_LITERAL = 0, 1, 2
+MAX_COUNT = 64
+
+# Decode cost model for the report (ESP32-C3 at 160 MHz, data in cached flash)
+CPU_HZ = 160_000_000
+CYCLES_PER_FRAME = 60
+CYCLES_PER_OP = 15
+CYCLES_PER_TILE = 45       # Address calculation and an 8-byte copy
+CYCLES_PER_SKIPPED = 2
+# Adafruit_SSD1306::display() always sends the whole buffer, 9 I2C clocks per byte
+I2C_HZ = 400_000
+PANEL_BYTES = 128 * 64 // 8
+
+
+def to_tiles(bits):
+    """(tiles, 8) uint8 array of a (height, width) boolean frame, row-major by page"""
+    h, w = bits.shape
+    pages = np.packbits(bits.reshape(h // 8, 8, w), axis=1, bitorder='little')  # (pages, 1, w)
+    return pages.reshape(h // 8, w // 8, 8).reshape(-1, 8)
+
+
+class Animation:
+    """Encoded frames plus the statistics the report needs"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.tiles = []          # Unique tiles, 8 bytes each
+        self.data = bytearray()  # Frame streams back to back
+        self.offsets = []        # Start of each frame in data
+        self.stats = []          # Per frame: (kind, bytes, ops, tiles written, tiles skipped)
+        self.index_bytes = 1
+
+    @property
+    def tile_count(self):
+        return (self.width // 8) * (self.height // 8)
+
+    @property
+    def raw_bytes(self):
+        return len(self.offsets) * self.width * self.height // 8
+
+    @property
+    def encoded_bytes(self):
+        return len(self.tiles) * 8 + len(self.data) + 4 * len(self.offsets) + 16
+
+    def decode_us(self, frame):
+        _, _, ops, written, skipped = self.stats[frame]
+        cycles = (CYCLES_PER_FRAME + ops * CYCLES_PER_OP + written * CYCLES_PER_TILE +
+                  skipped * CYCLES_PER_SKIPPED)
+        return cycles / CPU_HZ * 1e6
+
+
+def _encode(indices, previous, index_bytes):
+    """Op stream for one frame's tile indices; previous=None codes a key frame"""
+    out = bytearray()
+    ops = written = skipped = 0
+    n = len(indices)
+    i = 0
+
+    def put_index(value):
+        out.extend(value.to_bytes(index_bytes, 'little'))
+
+    while i < n:
+        if previous is not None and indices[i] == previous[i]:
+            j = i
+            while j < n and j - i < MAX_COUNT and indices[j] == previous[j]:
+                j += 1
+            out.append(OP_SKIP << 6 | (j - i - 1))
+            skipped += j - i
+        else:
+            j = i
+            while j < n and j - i < MAX_COUNT and indices[j] == indices[i]:
+                j += 1
+            if j - i >= 2:
+                out.append(OP_RUN << 6 | (j - i - 1))
+                put_index(indices[i])
+            else:
+                # Literal until a run of two or an unchanged tile starts
+                j = i + 1
+                while (j < n and j - i < MAX_COUNT and
+                       not (j + 1 < n and indices[j] == indices[j + 1]) and
+                       not (previous is not None and indices[j] == previous[j])):
+                    j += 1
+                out.append(OP_LITERAL << 6 | (j - i - 1))
+                for k in range(i, j):
+                    put_index(indices[k])
+            written += j - i
+        ops += 1
+        i = j
+    return bytes(out), ops, written, skipped
+
+
+def encode_animation(frames, keyframe_every=0):
+    """Animation from a list of (height, width) boolean frames (sides multiples of 8)"""
+    height, width = frames[0].shape
+    anim = Animation(width, height)
+    lookup = {}
+    maps = []
+    for bits in frames:
+        index = []
+        for tile in to_tiles(bits):
+            key = tile.tobytes()
+            if key not in lookup:
+                lookup[key] = len(anim.tiles)
+                anim.tiles.append(key)
+            index.append(lookup[key])
+        maps.append(index)
+    anim.index_bytes = 1 if len(anim.tiles) <= 256 else 2
+
+    previous = None
+    for number, index in enumerate(maps):
+        forced = number == 0 or (keyframe_every and number % keyframe_every == 0)
+        key = _encode(index, None, anim.index_bytes)
+        choice = ('key',) + key
+        if not forced:
+            delta = _encode(index, previous, anim.index_bytes)
+            if len(delta[0]) < len(key[0]):
+                choice = ('delta',) + delta
+        kind, stream, ops, written, skipped = choice
+        anim.offsets.append(len(anim.data))
+        anim.data.extend(stream)
+        anim.stats.append((kind, len(stream), ops, written, skipped))
+        previous = index
+    return anim
+
+
+def decode_frame(anim, frame, buf):
+    """Python twin of oled_anim_decode(): update an SSD1306 page buffer (bytearray) in place"""
+    tiles_x = anim.width // 8
+    p = anim.offsets[frame]
+    pos = 0
+    while pos < anim.tile_count:
+        op = anim.data[p]
+        p += 1
+        count = (op & 0x3F) + 1
+        kind = op >> 6
+        if kind == OP_SKIP:
+            pos += count
+            continue
+        for k in range(count):
+            if kind == OP_LITERAL or k == 0:
+                tile = int.from_bytes(anim.data[p:p + anim.index_bytes], 'little')
+                p += anim.index_bytes
+            at = (pos // tiles_x) * anim.width + (pos % tiles_x) * 8
+            buf[at:at + 8] = anim.tiles[tile]
+            pos += 1
+    return buf
+
+
+def verify(anim, frames):
+    """Decode every frame in order and compare with the source; raises ValueError"""
+    buf = bytearray(anim.width * anim.height // 8)
+    for number, bits in enumerate(frames):
+        decode_frame(anim, number, buf)
+        expected = np.packbits(bits.reshape(anim.height // 8, 8, anim.width), axis=1,
+                               bitorder='little').tobytes()
+        if bytes(buf) != expected:
+            raise ValueError(f"frame {number} does not decode back to its source")
+
+
+DECODER = r"""
+#ifndef OLED_ANIM_DECODER
+#define OLED_ANIM_DECODER
+// Decoder for convert_bg.py --animation headers (see oled_anim.py for the format)
+#include <stdint.h>
+#ifdef ARDUINO
+#include <Arduino.h>
+#else
+#include <string.h>
+#define PROGMEM
+#define pgm_read_byte(p) (*(const uint8_t *)(p))
+#define pgm_read_dword(p) (*(const uint32_t *)(p))
+#define memcpy_P memcpy
+#endif
+
+typedef struct {
+  uint8_t width_tiles;        // 8-pixel columns
+  uint8_t height_tiles;       // SSD1306 pages (8 pixel rows each)
+  uint16_t frame_count;
+  uint8_t index_bytes;        // 1 or 2
+  const uint8_t *tiles;       // 8 bytes per tile, SSD1306 page layout
+  const uint8_t *data;        // Frame op streams
+  const uint32_t *frames;     // Offset of each frame in data
+} OledAnim;
+
+// Draw `frame` into an SSD1306 buffer (display.getBuffer(), buf_width = SCREEN_WIDTH)
+// with its top-left corner at column x and page `page` (y = 8 * page). Delta frames
+// only write the tiles that changed: draw the frames in order, starting from frame 0.
+static inline void oled_anim_decode(const OledAnim *a, uint16_t frame, uint8_t *buf,
+                                    uint16_t buf_width, uint16_t x, uint8_t page) {
+  const uint8_t *p = a->data + pgm_read_dword(&a->frames[frame]);
+  const uint16_t total = (uint16_t)a->width_tiles * a->height_tiles;
+  uint16_t pos = 0, tile = 0;
+  while (pos < total) {
+    uint8_t op = pgm_read_byte(p++);
+    uint8_t count = (op & 0x3F) + 1;
+    uint8_t kind = op >> 6;
+    if (kind == 0) {  // Skip: unchanged since the previous frame
+      pos += count;
+      continue;
+    }
+    for (uint8_t k = 0; k < count; k++, pos++) {
+      if (kind == 2 || k == 0) {
+        tile = pgm_read_byte(p++);
+        if (a->index_bytes == 2) tile |= (uint16_t)pgm_read_byte(p++) << 8;
+      }
+      uint8_t *dst = buf + (uint16_t)(page + pos / a->width_tiles) * buf_width
+                     + x + (pos % a->width_tiles) * 8;
+      memcpy_P(dst, a->tiles + (uint32_t)tile * 8, 8);
+    }
+  }
+}
+#endif  // OLED_ANIM_DECODER
+"""
+
+
+def _hex_rows(data, per_line=16):
+    return ",\n".join(", ".join(f"0x{b:02x}" for b in data[i:i + per_line])
+                      for i in range(0, len(data), per_line))
+
+
+def render_header(name, anim, source=None):
+    """C header: decoder plus the animation's PROGMEM tables and OledAnim descriptor"""
+    lines = []
+    if source:
+        lines.append(f"// Generated by convert_bg.py --animation from {source} - do not edit")
+    lines.append(f"// {len(anim.offsets)} frames of {anim.width}x{anim.height}, "
+                 f"{len(anim.tiles)} unique 8x8 tiles: {anim.raw_bytes} bytes raw, "
+                 f"{anim.encoded_bytes} encoded ({anim.raw_bytes / anim.encoded_bytes:.1f}x)")
+    lines.append(f"// Usage: oled_anim_decode(&{name}, frame, display.getBuffer(), SCREEN_WIDTH, x, page);")
+    lines.append("#pragma once")
+    lines.append(DECODER.strip("\n"))
+    lines.append("")
+    lines.append(f"static const uint8_t {name}_tiles[] PROGMEM = {{")
+    lines.append(_hex_rows(b''.join(anim.tiles)))
+    lines.append("};")
+    lines.append(f"static const uint8_t {name}_data[] PROGMEM = {{")
+    lines.append(_hex_rows(anim.data))
+    lines.append("};")
+    lines.append(f"static const uint32_t {name}_frames[] PROGMEM = {{")
+    lines.append(",\n".join(", ".join(str(o) for o in anim.offsets[i:i + 12])
+                            for i in range(0, len(anim.offsets), 12)))
+    lines.append("};")
+    lines.append(f"static const OledAnim {name} = {{{anim.width // 8}, {anim.height // 8}, "
+                 f"{len(anim.offsets)}, {anim.index_bytes}, {name}_tiles, {name}_data, {name}_frames}};")
+    return "\n".join(lines) + "\n"
+
+
+def report(name, anim):
+    """Compression and estimated decode time, one line per frame plus a total"""
+    push_ms = PANEL_BYTES * 9 / I2C_HZ * 1000
+    rows = [f"{name}: {len(anim.offsets)} frames {anim.width}x{anim.height}, "
+            f"{len(anim.tiles)} unique tiles ({anim.index_bytes}-byte indices)",
+            f"{'frame':>6} {'kind':>6} {'bytes':>6} {'ops':>5} {'tiles':>6} {'decode':>10}"]
+    for number, (kind, size, ops, written, _) in enumerate(anim.stats):
+        rows.append(f"{number:>6} {kind:>6} {size:>6} {ops:>5} {written:>6} "
+                    f"{anim.decode_us(number):>8.1f}us")
+    worst = max(anim.decode_us(i) for i in range(len(anim.offsets)))
+    rows.append(f"total: {anim.raw_bytes} bytes raw -> {anim.encoded_bytes} bytes "
+                f"(tiles {len(anim.tiles) * 8}, streams {len(anim.data)}, "
+                f"offsets {4 * len(anim.offsets)}) = {anim.raw_bytes / anim.encoded_bytes:.1f}x; "
+                f"decode <= {worst:.1f}us/frame (estimate, ESP32-C3 @ {CPU_HZ // 1_000_000} MHz), "
+                f"display() {push_ms:.1f}ms/frame (128x64 over I2C at {I2C_HZ // 1000} kHz)")
+    return "\n".join(rows)
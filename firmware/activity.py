@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Streaming activity summary of the IMU stream, rolled up once an hour.
+
+Every sample the monitor reads already goes through the fall detector. The
+ActivityAggregator folds the same sample into a few running totals, in
+constant time and memory, so the device can report how the wearer spent each
+hour without keeping or shipping the raw data:
+
+- activity counts per minute: acceleration beyond 1 g, less a small dead band
+  for sensor noise, integrated over time (0.01 g*s units, the idea behind
+  actigraphy counts, and independent of the sample rate);
+- time active and time still (the orientation estimator's stillness rule);
+- step-like peaks: a rise above STEP_HIGH_G and a drop back below STEP_LOW_G,
+  at most one per STEP_MIN_INTERVAL_S. At the idle sample rate some steps
+  are missed, so treat it as a trend rather than a pedometer;
+- the largest acceleration;
+- mean sensor temperature;
+- time spent in each 30 degree band of tilt from upright.
+
+Samples are weighted by the time since the previous one, so the adaptive
+sample rate does not skew the totals. Gaps longer than MAX_GAP_S (sensor
+failure, a clock step) count as not covered. At the top of each local hour
+the totals become one compact record (see `record`) and start over.
+"""
+
+import array
+import collections
+import math
+import time
+
+MAX_GAP_S = 10.0             # Longer gaps between samples are not counted
+STEP_HIGH_G = 1.2
+STEP_LOW_G = 1.0
+STEP_MIN_INTERVAL_S = 0.3
+TILT_BAND_DEG = 30           # 6 bands: 0-30 (upright) ... 150-180 (upside down)
+
+
+class ActivityAggregator:
+    """O(1)-per-sample activity totals for the current hour, plus today's running totals
+
+    Finished hours are queued in `completed` for the caller to store or send.
+    """
+    __slots__ = ('dead_band_g', 'still_accel_g', 'still_gyro_sq', 'completed',
+                 'hour', 'hour_start', 'hour_end', 'last_t', 'covered_s', 'still_s',
+                 'counts', 'tilt_s', 'steps', 'max_g', 'temp_sum', 'step_armed', 'last_step',
+                 'day', 'day_steps', 'day_active_s')
+
+    def __init__(self, dead_band_g=0.05, still_accel_g=0.1, still_gyro_rads=0.35, keep_hours=48):
+        self.dead_band_g = dead_band_g
+        self.still_accel_g = still_accel_g      # Same stillness rule as OrientationEstimator
+        self.still_gyro_sq = still_gyro_rads ** 2
+        self.completed = collections.deque(maxlen=keep_hours)
+        self.counts = array.array('d', bytes(8 * 60))
+        self.tilt_s = array.array('d', bytes(8 * (180 // TILT_BAND_DEG)))
+        self.hour = None
+        self.hour_start = self.hour_end = 0.0
+        self.last_t = None
+        self.last_step = -math.inf
+        self.step_armed = False
+        self.day = None
+        self.day_steps = 0
+        self.day_active_s = 0.0
+        self._clear()
+
+    def _clear(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0.0
+        for i in range(len(self.tilt_s)):
+            self.tilt_s[i] = 0.0
+        self.covered_s = self.still_s = self.temp_sum = 0.0
+        self.steps = 0
+        self.max_g = 0.0
+
+    def update(self, t, mag, gyro, temp, tilt_deg):
+        """Fold in one sample: t in seconds (wall clock), mag in g, gyro in rad/s, temp in C"""
+        if not self.hour_start <= t < self.hour_end:
+            self.roll(t)
+        dt = 0.0 if self.last_t is None else t - self.last_t
+        self.last_t = t
+        if mag > self.max_g:
+            self.max_g = mag
+
+        # Step-like peaks with hysteresis
+        if self.step_armed:
+            if mag < STEP_LOW_G:
+                self.step_armed = False
+                if t - self.last_step >= STEP_MIN_INTERVAL_S:
+                    self.steps += 1
+                    self.last_step = t
+        elif mag > STEP_HIGH_G:
+            self.step_armed = True
+
+        if not 0.0 < dt <= MAX_GAP_S:
+            return
+        self.covered_s += dt
+        deviation = abs(mag - 1.0)
+        if deviation > self.dead_band_g:
+            self.counts[min(59, int((t - self.hour_start) // 60))] += (deviation - self.dead_band_g) * dt
+        wx, wy, wz = gyro
+        if deviation < self.still_accel_g and wx * wx + wy * wy + wz * wz < self.still_gyro_sq:
+            self.still_s += dt
+        self.temp_sum += temp * dt
+        self.tilt_s[min(len(self.tilt_s) - 1, max(0, int(tilt_deg // TILT_BAND_DEG)))] += dt
+
+    def roll(self, t):
+        """Close the current hour (queued if it holds any data) and start the one holding t"""
+        if self.covered_s > 0:
+            self.completed.append(self.record())
+            day = self.hour[:10]
+            if day != self.day:
+                self.day, self.day_steps, self.day_active_s = day, 0, 0.0
+            self.day_steps += self.steps
+            self.day_active_s += self.covered_s - self.still_s
+        self._clear()
+        lt = time.localtime(t)
+        self.hour = time.strftime('%Y-%m-%dT%H:00', lt)
+        self.hour_start = t - (lt.tm_min * 60 + lt.tm_sec + t % 1)
+        self.hour_end = self.hour_start + 3600
+
+    def record(self):
+        """The current hour as a compact dict (counts in 0.01 g*s, times in seconds)"""
+        covered = self.covered_s
+        return {'hour': self.hour, 'covered_s': round(covered),
+                'counts': [round(c * 100) for c in self.counts],
+                'active_s': round(covered - self.still_s), 'still_s': round(self.still_s),
+                'steps': self.steps, 'max_g': round(self.max_g, 2),
+                'temp': round(self.temp_sum / covered, 1) if covered else None,
+                'tilt_s': [round(s) for s in self.tilt_s]}
+
+    def today(self):
+        """(steps, active seconds) since local midnight, the current hour included"""
+        steps, active = self.steps, self.covered_s - self.still_s
+        if self.hour is not None and self.hour[:10] == self.day:
+            steps += self.day_steps
+            active += self.day_active_s
+        return steps, active
+
+    def summary(self):
+        minutes = lambda s: f"{s / 60:.0f}m"
+        steps, active = self.today()
+        return (f"Activity this hour: active {minutes(self.covered_s - self.still_s)}, "
+                f"still {minutes(self.still_s)}, steps {self.steps}, max {self.max_g:.2f}g | "
+                f"today: active {minutes(active)}, steps {steps}")
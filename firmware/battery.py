@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Battery state estimate and power profiles for the monitor's governor.
+
+Hardware-free: the monitor feeds it voltages read from the MCP3008, and it
+can be exercised offline with recorded readings. Voltage is smoothed with a
+time-aware moving average, mapped to charge through a single-cell Li-ion
+open-circuit curve, and the discharge rate comes from an exponentially
+weighted least-squares fit of charge against time, updated in O(1) per
+reading. Only a long trend is trusted: GSM transmit bursts sag the cell for
+milliseconds and would otherwise look like sudden drains.
+"""
+
+import collections
+import logging
+import math
+
+# Resting voltage -> state of charge for a 1S Li-ion/LiPo cell
+LIPO_CURVE = (
+    (4.20, 100.0), (4.10, 90.0), (4.00, 80.0), (3.92, 70.0), (3.85, 60.0),
+    (3.80, 50.0), (3.75, 40.0), (3.71, 30.0), (3.67, 20.0), (3.61, 10.0),
+    (3.50, 5.0), (3.30, 0.0),
+)
+
+
+def voltage_to_percent(volts, curve=LIPO_CURVE):
+    """Interpolate state of charge (0-100) from a resting cell voltage"""
+    if volts >= curve[0][0]:
+        return curve[0][1]
+    for (v_hi, p_hi), (v_lo, p_lo) in zip(curve, curve[1:]):
+        if volts >= v_lo:
+            return p_lo + (p_hi - p_lo) * (volts - v_lo) / (v_hi - v_lo)
+    return curve[-1][1]
+
+
+class BatteryEstimator:
+    """Smoothed charge and discharge rate from occasional voltage readings"""
+    __slots__ = ('smoothing_s', 'rate_halflife_s', 'min_span_s', 'curve',
+                 'volts', 'percent', 'last_t', 'first_t',
+                 '_w', '_st', '_sp', '_stt', '_stp')
+
+    def __init__(self, smoothing_s=300.0, rate_halflife_s=3 * 3600.0,
+                 min_span_s=1800.0, curve=LIPO_CURVE):
+        self.smoothing_s = smoothing_s          # Voltage averaging time constant
+        self.rate_halflife_s = rate_halflife_s  # Age at which a reading counts half in the trend
+        self.min_span_s = min_span_s            # History needed before the rate is reported
+        self.curve = curve
+        self.volts = None
+        self.percent = None
+        self.last_t = None
+        self.first_t = None
+        self._w = self._st = self._sp = self._stt = self._stp = 0.0
+
+    def update(self, t, volts):
+        """Fold in one reading (t in seconds, any epoch); returns the smoothed percent"""
+        if self.last_t is None:
+            self.volts = volts
+            self.first_t = t
+        else:
+            dt = max(0.0, t - self.last_t)
+            k = 1.0 - math.exp(-dt / self.smoothing_s)
+            self.volts += k * (volts - self.volts)
+            # Age the regression sums before adding the new point
+            decay = 0.5 ** (dt / self.rate_halflife_s)
+            self._w *= decay
+            self._st *= decay
+            self._sp *= decay
+            self._stt *= decay
+            self._stp *= decay
+        self.last_t = t
+        self.percent = voltage_to_percent(self.volts, self.curve)
+
+        x = (t - self.first_t) / 3600.0  # Hours, kept small for precision
+        self._w += 1.0
+        self._st += x
+        self._sp += self.percent
+        self._stt += x * x
+        self._stp += x * self.percent
+        return self.percent
+
+    @property
+    def rate_pct_per_h(self):
+        """Discharge rate in %/h (negative while charging), or None until known"""
+        if self.last_t is None or self.last_t - self.first_t < self.min_span_s:
+            return None
+        denom = self._w * self._stt - self._st * self._st
+        if denom <= 1e-12:
+            return None
+        return -(self._w * self._stp - self._st * self._sp) / denom
+
+    def hours_remaining(self, reserve_pct=0.0):
+        """Projected hours until `reserve_pct`, or None if unknown or charging"""
+        rate = self.rate_pct_per_h
+        if rate is None or rate <= 0.05 or self.percent is None:
+            return None
+        return max(0.0, (self.percent - reserve_pct) / rate)
+
+
+# Power profiles, most capable first. The governor picks the first profile
+# whose `min_percent` the battery is above (with hysteresis on the way up).
+PowerProfile = collections.namedtuple('PowerProfile', [
+    'name',
+    'min_percent',         # Lowest charge this profile is used at
+    'idle_rate',           # IMU Hz while still
+    'active_rate',         # IMU Hz while moving / inside an impact window
+    'gps_on_s',            # GPS powered this long per period (None = always on)
+    'gps_period_s',
+    'location_interval_s', # Periodic location SMS
+    'log_level',
+])
+
+PROFILES = (
+    PowerProfile('normal', 40, 5.0, 50.0, None, None, 300, logging.INFO),
+    PowerProfile('saver', 15, 2.0, 50.0, 120, 600, 900, logging.INFO),
+    PowerProfile('critical', 0, 1.0, 25.0, 90, 1800, 1800, logging.WARNING),
+)
+
+
+def select_profile(percent, current=None, hysteresis_pct=5.0, profiles=PROFILES):
+    """Profile for `percent`; stepping up needs `hysteresis_pct` of headroom"""
+    for profile in profiles:
+        threshold = profile.min_percent
+        if current is not None and profiles.index(profile) < profiles.index(current):
+            threshold += hysteresis_pct  # Don't flap back up on a recovering reading
+        if percent >= threshold:
+            return profile
+    return profiles[-1]
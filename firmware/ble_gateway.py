@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+BLE central for the ESP32 wearable: vitals straight to the Pi, no phone needed.
+
+The ESP32 sketches (BLE_Health_Monitor.ino, medical_monitor_c3,
+ESP32_C3_XIAO_COMPLETE_CODE.ino) all advertise SERVICE_UUID and notify one
+JSON object per reading on VITALS_CHAR_UUID, with either long keys
+("heartRate", "spo2", ...) or the compact ones ("hr", "ox", ...) - the same
+two schemas the app's bleService.js accepts. `decode_vitals` turns a
+notification into one fixed-size sample.
+
+Samples go into VitalsBuffer, a ring of typed arrays (about 17 bytes a
+sample instead of a dict each), from which `aggregate()` produces one record
+per window (mean/min/max heart rate and SpO2, temperature, finger-on and
+sleeping fractions) for the telemetry uplink.
+
+BleGateway keeps one connection up: find the wearable, subscribe, wait for
+the disconnect, then try again with exponential back-off (reset once a
+connection has held for a while). The link is reached through a `connector`
+coroutine, `bleak_connector` on the device (bleak is optional and imported on
+first use) or FakeWearable, a simulated peripheral for running the gateway
+without hardware (`--ble-fake`).
+"""
+
+import array
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger("PatientMonitor")
+
+SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
+VITALS_CHAR_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
+
+BACKOFF_MIN_S = 2.0
+BACKOFF_MAX_S = 120.0
+STABLE_LINK_S = 60.0   # A connection this long resets the back-off
+SCAN_TIMEOUT_S = 15.0
+
+# Sample flag bits
+FINGER = 1
+EMERGENCY = 2
+SLEEPING = 4
+
+_NAN_RE = re.compile(rb':\s*nan', re.IGNORECASE)
+
+
+def _pick(data, short, long_):
+    value = data.get(short)
+    return data.get(long_) if value is None else value
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return value if math.isfinite(value) else 0.0
+
+
+def _truthy(value):
+    return value is True or str(value).lower() in ('1', 'true')
+
+
+def decode_vitals(payload):
+    """(hr, spo2, temp_c, flags, steps) from one notification, or None if unreadable"""
+    try:
+        data = json.loads(_NAN_RE.sub(b':0', bytes(payload)))  # Sketches print NaN bare
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    flags = 0
+    if _truthy(_pick(data, 'fd', 'fingerDetected')):
+        flags |= FINGER
+    if data.get('em') in (1, '1') or data.get('emergency') == 'ACTIVE':
+        flags |= EMERGENCY
+    if data.get('sl') == 'S' or data.get('sleepStatus') == 'Sleeping':
+        flags |= SLEEPING
+    return (int(_number(_pick(data, 'hr', 'heartRate'))),
+            int(_number(_pick(data, 'ox', 'spo2'))),
+            _number(_pick(data, 'tp', 'temperature')),
+            flags,
+            int(_number(_pick(data, 'sc', 'stepCount'))))
+
+
+class VitalsBuffer:
+    """Fixed-capacity ring of vitals samples in typed arrays (thread-safe)"""
+
+    def __init__(self, capacity=7200):
+        self.capacity = capacity
+        self.t = array.array('d', bytes(8 * capacity))
+        self.hr = array.array('B', bytes(capacity))
+        self.spo2 = array.array('B', bytes(capacity))
+        self.temp = array.array('h', bytes(2 * capacity))    # 0.1 degC
+        self.flags = array.array('B', bytes(capacity))
+        self.steps = array.array('L', bytes(array.array('L').itemsize * capacity))
+        self.count = 0  # Samples ever written; the newest is at (count - 1) % capacity
+        self.lock = threading.Lock()
+
+    def append(self, t, hr, spo2, temp_c, flags, steps):
+        with self.lock:
+            i = self.count % self.capacity
+            self.t[i] = t
+            self.hr[i] = max(0, min(255, hr))
+            self.spo2[i] = max(0, min(255, spo2))
+            self.temp[i] = max(-32768, min(32767, int(round(temp_c * 10))))
+            self.flags[i] = flags
+            self.steps[i] = max(0, steps)
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def latest(self):
+        """(t, hr, spo2, temp_c, flags, steps) of the newest sample, or None"""
+        with self.lock:
+            if not self.count:
+                return None
+            i = (self.count - 1) % self.capacity
+            return (self.t[i], self.hr[i], self.spo2[i], self.temp[i] / 10, self.flags[i], self.steps[i])
+
+    def aggregate(self, since, until):
+        """Summary of the samples with since <= t < until, or None if there are none"""
+        with self.lock:
+            n = min(self.count, self.capacity)
+            start = self.count - n
+            hr, spo2, temps = [], [], []
+            samples = finger = sleeping = emergency = 0
+            steps = None
+            for k in range(self.count - 1, start - 1, -1):  # Newest first; stop at the window
+                i = k % self.capacity
+                if self.t[i] < since:
+                    break
+                if self.t[i] >= until:
+                    continue
+                if steps is None:
+                    steps = self.steps[i]  # Latest step count in the window
+                samples += 1
+                f = self.flags[i]
+                if f & FINGER:
+                    finger += 1
+                    if self.hr[i]:
+                        hr.append(self.hr[i])
+                    if self.spo2[i]:
+                        spo2.append(self.spo2[i])
+                if self.temp[i]:
+                    temps.append(self.temp[i])
+                sleeping += bool(f & SLEEPING)
+                emergency |= bool(f & EMERGENCY)
+        if not samples:
+            return None
+        record = {'n': samples, 'finger': round(finger / samples, 2),
+                  'sleep': round(sleeping / samples, 2), 'em': int(emergency), 'steps': steps}
+        if hr:
+            record.update(hr=round(sum(hr) / len(hr)), hr_min=min(hr), hr_max=max(hr))
+        if spo2:
+            record.update(spo2=round(sum(spo2) / len(spo2)), spo2_min=min(spo2))
+        if temps:
+            record['temp'] = round(sum(temps) / len(temps) / 10, 1)
+        return record
+
+
+async def bleak_connector(address, on_disconnect):
+    """Find the wearable (by address, or the first advertising SERVICE_UUID) and connect"""
+    from bleak import BleakClient, BleakScanner  # Optional dependency
+    if address:
+        device = await BleakScanner.find_device_by_address(address, timeout=SCAN_TIMEOUT_S)
+    else:
+        device = await BleakScanner.find_device_by_filter(
+            lambda d, adv: SERVICE_UUID in [u.lower() for u in adv.service_uuids],
+            timeout=SCAN_TIMEOUT_S)
+    if device is None:
+        raise ConnectionError(f"wearable {address} not found" if address else
+                              "no wearable advertising the vitals service")
+    client = BleakClient(device, disconnected_callback=lambda _: on_disconnect())
+    await client.connect()
+    return client
+
+
+class BleGateway:
+    """Keeps the wearable connected and feeds its notifications to a VitalsBuffer"""
+
+    def __init__(self, buffer, connector=bleak_connector, address=None,
+                 on_emergency=None, clock=time.time):
+        self.buffer = buffer
+        self.connector = connector
+        self.address = address or None
+        self.on_emergency = on_emergency
+        self.clock = clock
+        self.connected = False
+        self.connects = 0
+        self.notifications = 0
+        self.bad = 0
+        self._emergency = False
+
+    def _on_notify(self, _sender, data):
+        sample = decode_vitals(data)
+        if sample is None:
+            self.bad += 1
+            return
+        self.notifications += 1
+        hr, spo2, temp_c, flags, steps = sample
+        self.buffer.append(self.clock(), hr, spo2, temp_c, flags, steps)
+        emergency = bool(flags & EMERGENCY)
+        if emergency and not self._emergency and self.on_emergency:
+            self.on_emergency()  # Rising edge only: the wearable repeats it every notification
+        self._emergency = emergency
+
+    async def run(self):
+        import asyncio  # Loaded only when the gateway runs (the monitor imports it lazily too)
+        loop = asyncio.get_running_loop()
+        backoff = BACKOFF_MIN_S
+        while True:
+            client = None
+            dropped = asyncio.Event()
+            started = time.monotonic()
+            try:
+                client = await self.connector(self.address,
+                                              lambda: loop.call_soon_threadsafe(dropped.set))
+                await client.start_notify(VITALS_CHAR_UUID, self._on_notify)
+                self.connected = True
+                self.connects += 1
+                logger.info(f"Wearable connected ({self.connects} connections so far)")
+                await dropped.wait()
+                logger.warning("Wearable disconnected")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Wearable link failed: {e}")
+            finally:
+                self.connected = False
+                if client is not None:
+                    try:
+                        await client.disconnect()
+                    except Exception:
+                        pass
+            if time.monotonic() - started >= STABLE_LINK_S:
+                backoff = BACKOFF_MIN_S
+            delay = backoff * random.uniform(0.8, 1.2)
+            logger.info(f"Reconnecting to the wearable in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            backoff = min(BACKOFF_MAX_S, backoff * 2)
+
+    def summary(self):
+        latest = self.buffer.latest()
+        vitals = (f"HR {latest[1]} SpO2 {latest[2]} T {latest[3]:.1f}C "
+                  f"{time.time() - latest[0]:.0f}s ago" if latest else "no data yet")
+        return (f"Wearable: {'connected' if self.connected else 'disconnected'} | {vitals} | "
+                f"connects {self.connects} | notifications {self.notifications} | bad {self.bad}")
+
+
+class FakeWearable:
+    """Simulated ESP32 peripheral: plausible vitals in both JSON schemas, random drop-outs
+
+    Pass `fake.connect` as BleGateway's connector.
+    """
+
+    def __init__(self, interval_s=0.5, fail_rate=0.2, mean_link_s=120.0, seed=None):
+        self.interval_s = interval_s
+        self.fail_rate = fail_rate      # Share of connection attempts that fail
+        self.mean_link_s = mean_link_s  # Average time until a simulated drop-out
+        self.rng = random.Random(seed)
+        self.emergency_at = None        # Set to a time.time() to raise the wearable's alarm
+        self._task = None
+        self._steps = 0
+
+    async def connect(self, address, on_disconnect):
+        import asyncio
+        await asyncio.sleep(0.2)
+        if self.rng.random() < self.fail_rate:
+            raise ConnectionError("simulated: wearable not found")
+        self._on_disconnect = on_disconnect
+        return self
+
+    async def start_notify(self, uuid, callback):
+        import asyncio
+        self._task = asyncio.ensure_future(self._notify_loop(callback))
+
+    async def disconnect(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def payload(self, compact):
+        t = time.time()
+        finger = self.rng.random() > 0.1
+        hr = int(72 + 8 * math.sin(t / 30) + self.rng.gauss(0, 2)) if finger else 0
+        spo2 = int(min(100, 97 + self.rng.gauss(0, 1))) if finger else 0
+        temp = 36.4 + self.rng.gauss(0, 0.1)
+        emergency = self.emergency_at is not None and t >= self.emergency_at
+        self._steps += self.rng.random() < 0.3
+        if compact:
+            return json.dumps({'hr': hr, 'ox': spo2, 'fd': int(finger), 'sq': 80, 'sl': 'A', 'ss': 0,
+                               'ax': 0.1, 'ay': 0.0, 'az': 9.8, 'tp': round(temp, 1),
+                               'em': int(emergency), 'sc': self._steps}).encode()
+        return json.dumps({'heartRate': str(hr), 'spo2': str(spo2),
+                           'fingerDetected': 'true' if finger else 'false',
+                           'temperature': f"{temp:.1f}", 'sleepStatus': 'Awake',
+                           'emergency': 'ACTIVE' if emergency else 'INACTIVE',
+                           'stepCount': str(self._steps)}).encode()
+
+    async def _notify_loop(self, callback):
+        import asyncio
+        link_until = time.monotonic() + self.rng.expovariate(1 / self.mean_link_s)
+        compact = self.rng.random() < 0.5
+        while time.monotonic() < link_until:
+            callback(VITALS_CHAR_UUID, bytearray(self.payload(compact)))
+            await asyncio.sleep(self.interval_s)
+        self._task = None
+        self._on_disconnect()  # Simulated drop-out
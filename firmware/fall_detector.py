@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Fall detection state machine shared by the live monitor and offline tools.
+
+Hardware-free so it can be driven by `Monitor.run` on the Pi, by the trace
+replay engine (`trace_replay.py`) on a workstation, or by any other caller
+that supplies acceleration magnitudes and a clock.
+"""
+
+import math
+import time
+import logging
+
+logger = logging.getLogger("PatientMonitor")
+
+STANDARD_GRAVITY = 9.80665
+
+# Defaults mirror the constants in raspberry_pi_monitor.py
+DEFAULT_THRESHOLD_G = 2.0        # Impact threshold
+DEFAULT_DURATION_MS = 40         # Impact window needed to confirm a fall
+DEFAULT_RESET_WINDOW_S = 0.2     # Quiet time that cancels an impact window
+DEFAULT_HIGH_RATE_G = 1.4        # Magnitude that switches to high-rate sampling
+DEFAULT_ACTIVE_RATE = 50.0       # Hz while moving or inside an impact window
+DEFAULT_IDLE_RATE = 5.0          # Hz while still
+DEFAULT_CONFIRM_COOLDOWN_S = 60  # Minimum time between confirmed falls
+DEFAULT_POSTURE_CONFIRM_S = 5.0  # Lying still (alert) or upright (cancel) this long
+DEFAULT_POSTURE_TIMEOUT_S = 15.0 # Alert anyway if posture is still ambiguous
+
+
+def accel_magnitude_g(accel):
+    """Magnitude of an (x, y, z) acceleration in m/s^2, expressed in g"""
+    return math.sqrt(accel[0]**2 + accel[1]**2 + accel[2]**2) / STANDARD_GRAVITY
+
+
+class FallDetector:
+    """Cumulative impact-window fall detector driven by an injectable clock
+
+    Stages: 0 idle, 1 inside an impact window, 2 impact confirmed and waiting
+    on the post-fall posture. Stage 2 is only used when a posture source (an
+    `orientation.OrientationEstimator` updated by the caller) is attached and
+    `posture_confirm_s` > 0; lying still confirms the fall, getting back up
+    cancels it, and an unresolved posture alerts after `posture_timeout_s`.
+    """
+
+    def __init__(self, threshold_g=DEFAULT_THRESHOLD_G, duration_ms=DEFAULT_DURATION_MS,
+                 reset_window_s=DEFAULT_RESET_WINDOW_S, high_rate_g=DEFAULT_HIGH_RATE_G,
+                 active_rate=DEFAULT_ACTIVE_RATE, idle_rate=DEFAULT_IDLE_RATE,
+                 confirm_cooldown_s=DEFAULT_CONFIRM_COOLDOWN_S, posture=None,
+                 posture_confirm_s=DEFAULT_POSTURE_CONFIRM_S,
+                 posture_timeout_s=DEFAULT_POSTURE_TIMEOUT_S, clock=time.time):
+        self.threshold_g = threshold_g
+        self.duration_ms = duration_ms
+        self.reset_window_s = reset_window_s
+        self.high_rate_g = high_rate_g
+        self.active_rate = active_rate
+        self.idle_rate = idle_rate
+        self.confirm_cooldown_s = confirm_cooldown_s
+        self.posture = posture
+        self.posture_confirm_s = posture_confirm_s
+        self.posture_timeout_s = posture_timeout_s
+        self.clock = clock
+
+        self.fall_cooldown = float('-inf')  # No fall confirmed yet
+        self.fall_stage = 0
+        self.fall_start = 0
+        self.last_high_accel = 0
+        self.last_duration_ms = 0.0
+        self.peak_g = 0.0
+        self.last_impact_g = 0.0
+        self.last_impact_t = 0.0   # Clock time the last confirmed impact began
+        self.posture_start = 0
+
+    def update(self, mag):
+        """Feed one magnitude sample (g); returns True when a fall is confirmed"""
+        now = self.clock()
+
+        if self.fall_stage == 2:
+            return self._check_posture(now)
+
+        if mag > self.threshold_g:
+            if self.fall_stage == 0:
+                self.fall_stage = 1
+                self.fall_start = now * 1000
+                self.peak_g = 0.0
+                logger.warning(f"IMPACT DETECTED: {mag:.2f}g")
+            self.peak_g = max(self.peak_g, mag)
+            self.last_high_accel = now
+
+        # Check for confirmation if in impact window
+        if self.fall_stage == 1:
+            duration_ms = (now * 1000 - self.fall_start)
+            if duration_ms > self.duration_ms:
+                if (now - self.fall_cooldown) > self.confirm_cooldown_s:
+                    self.last_duration_ms = duration_ms
+                    self.last_impact_g = self.peak_g
+                    self.last_impact_t = self.fall_start / 1000
+                    if self.posture is not None and self.posture_confirm_s > 0:
+                        logger.warning(f"Impact window reached {duration_ms:.0f}ms - checking posture")
+                        self.fall_stage = 2
+                        self.posture_start = now
+                        return False
+                    logger.critical(f"FALL CONFIRMED: Impact stage reached {duration_ms:.0f}ms")
+                    return self._confirm(now)
+                # Still cooling down from the last alert: drop this window rather
+                # than letting it fire late once the cooldown expires
+                logger.info(f"Impact suppressed: within {self.confirm_cooldown_s}s alert cooldown")
+                self.fall_stage = 0
+
+            # Reset if it's been quiet/low for longer than the reset window
+            elif (now - self.last_high_accel) > self.reset_window_s:
+                logger.info(f"Reset: Impact subsided ({duration_ms:.0f}ms total)")
+                self.fall_stage = 0
+
+        return False
+
+    def _check_posture(self, now):
+        """Stage 2: confirm or cancel the fall from the post-impact posture"""
+        lying = self.posture.lying_still_s(now, since=self.posture_start)
+        if lying >= self.posture_confirm_s:
+            logger.critical(f"FALL CONFIRMED: lying still {lying:.1f}s after impact "
+                            f"(tilt {self.posture.tilt_deg:.0f} deg)")
+            return self._confirm(now)
+        if self.posture.upright_s(now, since=self.posture_start) >= self.posture_confirm_s:
+            logger.info(f"Fall cancelled: upright again (tilt {self.posture.tilt_deg:.0f} deg)")
+            self.fall_stage = 0
+            return False
+        if now - self.posture_start > self.posture_timeout_s:
+            logger.critical(f"FALL CONFIRMED: posture unresolved after {self.posture_timeout_s:.0f}s")
+            return self._confirm(now)
+        return False
+
+    def _confirm(self, now):
+        self.fall_cooldown = now
+        self.fall_stage = 0  # Reset stage after trigger
+        return True
+
+    def sample_rate(self, mag):
+        """Adaptive sampling rate (Hz) for the next iteration"""
+        if mag > self.high_rate_g or self.fall_stage != 0:
+            return self.active_rate
+        return self.idle_rate
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Multi-core parameter sweep for the fall detection thresholds.
+
+Replays a labelled corpus of recorded IMU sessions through the monitor's
+sampling loop (`trace_replay.simulate`) for every parameter combination in a
+grid or random search and prints a precision/recall/latency table.
+
+The corpus is decoded once into two flat float64 files (sample times and
+magnitudes) that every worker maps read-only, so the pool shares one copy of
+the data instead of pickling it per task.
+
+Corpus manifest (CSV with header):
+    path,falls
+    sessions/day1.bin,
+    sessions/drop_test.csv,12.5;340.2
+
+`falls` lists the true fall times as seconds from the start of the trace,
+separated by ';' (empty for sessions without falls).
+
+Only magnitudes are shared with the workers, so the post-impact posture
+check is not part of the sweep; it is evaluated separately with
+trace_replay.py.
+
+Usage:
+    python3 fall_sweep.py corpus.csv --threshold 1.6:3.0:0.2 --duration-ms 20,40,80
+    python3 fall_sweep.py corpus.csv --random 200 --threshold 1.5:3.5 --reset-window 0.1:0.5
+    python3 fall_sweep.py --synthetic 20 --threshold 1.8,2.0,2.5 --high-rate-g 1.2,1.4
+"""
+
+import argparse
+import array
+import csv
+import itertools
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import fall_detector
+from trace_replay import load_trace, simulate, synthetic_trace
+
+PARAMETERS = [
+    # (name, detector kwarg, default)
+    ('threshold', 'threshold_g', fall_detector.DEFAULT_THRESHOLD_G),
+    ('duration-ms', 'duration_ms', fall_detector.DEFAULT_DURATION_MS),
+    ('reset-window', 'reset_window_s', fall_detector.DEFAULT_RESET_WINDOW_S),
+    ('high-rate-g', 'high_rate_g', fall_detector.DEFAULT_HIGH_RATE_G),
+]
+
+# Worker-side views of the shared corpus (set by _init_worker)
+_corpus = None
+
+
+class SharedCorpus:
+    """Flat time/magnitude arrays in files that workers memory-map"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.t_path = os.path.join(directory, "t.f64")
+        self.mag_path = os.path.join(directory, "mag.f64")
+        self.segments = []   # [(name, start_index, length, [fall_times])]
+        self.duration_s = 0.0
+
+    def build(self, entries):
+        """Write every (trace, falls) entry into the shared arrays"""
+        offset = 0
+        with open(self.t_path, 'wb') as ft, open(self.mag_path, 'wb') as fm:
+            for trace, falls in entries:
+                array.array('d', trace.t).tofile(ft)
+                array.array('d', trace.mag).tofile(fm)
+                # Labels are offsets into the trace; store absolute times
+                self.segments.append((trace.name, offset, len(trace),
+                                      [trace.start + f for f in falls]))
+                self.duration_s += trace.end - trace.start
+                offset += len(trace)
+        return offset
+
+    def open(self):
+        """Map the arrays read-only; returns (t, mag) memoryviews of doubles"""
+        views = []
+        for path in (self.t_path, self.mag_path):
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    views.append(memoryview(b'').cast('d'))
+                    continue
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            views.append(memoryview(mm).cast('d'))
+        return views
+
+
+def _init_worker(corpus):
+    global _corpus
+    # Per-impact detector logging would swamp the table
+    logging.getLogger("PatientMonitor").setLevel(logging.CRITICAL + 1)
+    t, mag = corpus.open()
+    _corpus = (corpus.segments, t, mag)
+
+
+def _evaluate(job):
+    """Score one parameter combination over the whole corpus"""
+    index, params, match_window_s = job
+    segments, t, mag = _corpus
+    tp = fp = fn = 0
+    latencies = []
+    for name, start, length, falls in segments:
+        alerts = simulate(t[start:start + length], mag[start:start + length], params)
+        matched = set()
+        for fall_t in falls:
+            hit = None
+            for i, alert in enumerate(alerts):
+                if i not in matched and fall_t <= alert[0] <= fall_t + match_window_s:
+                    hit = i
+                    break
+            if hit is None:
+                fn += 1
+            else:
+                matched.add(hit)
+                tp += 1
+                latencies.append(alerts[hit][0] - fall_t)
+        fp += len(alerts) - len(matched)
+    return index, params, tp, fp, fn, latencies
+
+
+def parse_values(spec, rng=None):
+    """Parse '1,2,3' or 'start:stop:step' (grid) / 'low:high' (random) specs
+
+    Raises ValueError for a malformed spec or a grid that would never end.
+    """
+    if ':' in spec:
+        parts = [float(p) for p in spec.split(':')]
+        if rng is not None:
+            return ('range', parts[0], parts[1])
+        start, stop = parts[0], parts[1]
+        if stop < start:
+            raise ValueError(f"'{spec}': stop is below start")
+        step = parts[2] if len(parts) > 2 else (stop - start) / 4 or 1.0
+        if not step > 0:  # Also NaN
+            raise ValueError(f"'{spec}': step must be positive")
+        values = []
+        v = start
+        while v <= stop + step * 1e-6:
+            values.append(round(v, 6))
+            v += step
+        return values
+    return [float(p) for p in spec.split(',')]
+
+
+def build_jobs(args):
+    names = [p[1] for p in PARAMETERS]
+    specs = [getattr(args, p[0].replace('-', '_')) for p in PARAMETERS]
+    defaults = [p[2] for p in PARAMETERS]
+
+    if args.random:
+        rng = random.Random(args.seed)
+        choices = []
+        for spec, default in zip(specs, defaults):
+            if spec is None:
+                choices.append([default])
+            else:
+                choices.append(parse_values(spec, rng=rng))
+        combos = []
+        for _ in range(args.random):
+            combo = []
+            for choice in choices:
+                if isinstance(choice, tuple):
+                    combo.append(round(rng.uniform(choice[1], choice[2]), 4))
+                else:
+                    combo.append(rng.choice(choice))
+            combos.append(combo)
+    else:
+        axes = [parse_values(spec) if spec else [default]
+                for spec, default in zip(specs, defaults)]
+        combos = itertools.product(*axes)
+
+    return [(i, dict(zip(names, combo)), args.match_window)
+            for i, combo in enumerate(combos)]
+
+
+def load_manifest(path):
+    entries = []
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            trace_path = row['path']
+            if not os.path.isabs(trace_path):
+                trace_path = os.path.join(base, trace_path)
+            falls = [float(x) for x in (row.get('falls') or '').split(';') if x.strip()]
+            entries.append((trace_path, falls))
+    return entries
+
+
+def synthetic_corpus(count, seed=0):
+    """Hour-long sessions with walking bouts; every other one contains falls"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        falls = sorted(rng.uniform(60, 3300) for _ in range(rng.randint(1, 3))) if i % 2 else []
+        walks = [(s, s + rng.uniform(60, 600)) for s in (rng.uniform(0, 3000) for _ in range(3))]
+        trace = synthetic_trace(3600, rate_hz=100.0, falls=falls, walk_periods=walks,
+                                peak_g=rng.uniform(2.2, 4.5), impact_ms=rng.uniform(60, 300),
+                                seed=seed + i)
+        trace.name = f"synthetic-{i}"
+        entries.append((trace, falls))
+    return entries
+
+
+def summarise(result, hours):
+    index, params, tp, fp, fn, latencies = result
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    latencies = sorted(latencies)
+    mean_latency = sum(latencies) / len(latencies) if latencies else float('nan')
+    p95_latency = latencies[math.ceil(0.95 * len(latencies)) - 1] if latencies else float('nan')
+    row = dict(params)
+    row.update({
+        'tp': tp, 'fp': fp, 'fn': fn,
+        'precision': precision, 'recall': recall, 'f1': f1,
+        'false_per_hour': fp / hours if hours else 0.0,
+        'latency_mean_s': mean_latency, 'latency_p95_s': p95_latency,
+    })
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep fall detection parameters over a labelled corpus")
+    parser.add_argument("manifest", nargs="?", help="Corpus manifest CSV (path,falls)")
+    parser.add_argument("--synthetic", type=int, metavar="SESSIONS",
+                        help="Use a generated corpus of this many hour-long sessions")
+    parser.add_argument("--units", choices=["ms2", "g"], default="ms2",
+                        help="Acceleration units used in CSV traces")
+    for name, kwarg, default in PARAMETERS:
+        parser.add_argument(f"--{name}", metavar="SPEC",
+                            help=f"Values for {kwarg} (default {default}); "
+                                 "'a,b,c', 'start:stop:step' or 'low:high' with --random")
+    parser.add_argument("--random", type=int, metavar="N",
+                        help="Random search with N samples instead of a full grid")
+    parser.add_argument("--seed", type=int, default=0, help="Random search seed")
+    parser.add_argument("--match-window", type=float, default=5.0,
+                        help="Seconds after a labelled fall within which an alert counts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Worker processes (default: all cores)")
+    parser.add_argument("--top", type=int, default=20, help="Rows to print (0 = all)")
+    parser.add_argument("--csv", metavar="PATH", help="Also write the full table to a CSV file")
+    args = parser.parse_args(argv)
+
+    if not args.manifest and not args.synthetic:
+        parser.error("pass a corpus manifest or --synthetic")
+    try:
+        jobs = build_jobs(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    if args.synthetic:
+        entries = synthetic_corpus(args.synthetic, args.seed)
+    else:
+        entries = [(load_trace(path, args.units), falls)
+                   for path, falls in load_manifest(args.manifest)]
+
+    with tempfile.TemporaryDirectory(prefix="fall_sweep_") as tmp:
+        corpus = SharedCorpus(tmp)
+        samples = corpus.build(entries)
+        del entries  # Workers read the mapped copy; free the decoded lists
+        hours = corpus.duration_s / 3600.0
+        labelled = sum(len(seg[3]) for seg in corpus.segments)
+        print(f"Corpus: {len(corpus.segments)} sessions, {hours:.1f}h, {samples} samples, "
+              f"{labelled} labelled falls (loaded in {time.perf_counter() - started:.1f}s)")
+        print(f"Evaluating {len(jobs)} parameter sets on {args.workers} workers...")
+
+        sweep_started = time.perf_counter()
+        rows = []
+        with multiprocessing.Pool(args.workers, initializer=_init_worker,
+                                  initargs=(corpus,)) as pool:
+            for result in pool.imap_unordered(_evaluate, jobs):
+                rows.append(summarise(result, hours))
+        elapsed = time.perf_counter() - sweep_started
+
+    rows.sort(key=lambda r: (-r['f1'], -r['recall'], r['false_per_hour'], r['latency_mean_s']))
+    columns = [p[1] for p in PARAMETERS] + ['precision', 'recall', 'f1', 'false_per_hour',
+                                            'latency_mean_s', 'latency_p95_s', 'tp', 'fp', 'fn']
+
+    print(f"Done in {elapsed:.1f}s ({corpus.duration_s * len(jobs) / max(elapsed, 1e-9):.0f}x real time)")
+    print(" ".join(f"{c:>14}" for c in columns))
+    for row in rows[:args.top or None]:
+        print(" ".join(f"{row[c]:>14.3f}" if isinstance(row[c], float) else f"{row[c]:>14}"
+                       for c in columns))
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} rows to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
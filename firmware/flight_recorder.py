@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Black-box flight recorder for the Raspberry Pi patient monitor.
+
+Keeps the last few minutes of full-rate IMU samples and GPS fixes in a
+fixed-size, memory-mapped ring file. Each record is written in place and the
+head counter is bumped; nothing is flushed per sample, so the kernel's normal
+page write-back is the only disk traffic (no file growth, no SD wear from
+appends). When an alert fires, a pre/post-trigger window is frozen into a
+small snapshot file for clinical review and threshold tuning. At most
+MAX_PENDING triggers wait for their post-trigger window at a time, and the
+snapshot directory keeps the newest `max_snapshots` files.
+
+File layouts (little-endian):
+- Ring:     64-byte header '<4sHHIQ' (magic, version, record size, capacity,
+            head) followed by `capacity` fixed-size records.
+- Snapshot: 64-byte header '<4sHHdI16s' (magic, version, record size,
+            trigger time, record count, reason) followed by the records in
+            chronological order.
+- Record:   40 bytes, '<dB3x7f' for IMU (ts, kind, ax, ay, az, gx, gy, gz,
+            temp) and '<dB3xddi8x' for GPS (ts, kind, lat, lon, satellites).
+"""
+
+import mmap
+import os
+import struct
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger("PatientMonitor")
+
+RING_MAGIC = b'PMFR'
+SNAPSHOT_MAGIC = b'PMSN'
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+
+RING_HEADER = struct.Struct('<4sHHIQ')
+SNAPSHOT_HEADER = struct.Struct('<4sHHdI16s')
+HEAD_OFFSET = 12            # Offset of the uint64 head counter in the ring header
+HEAD_FIELD = struct.Struct('<Q')
+
+IMU_RECORD = struct.Struct('<dB3x7f')
+GPS_RECORD = struct.Struct('<dB3xddi8x')
+RECORD_SIZE = IMU_RECORD.size
+assert GPS_RECORD.size == RECORD_SIZE
+RECORD_TS = struct.Struct('<d')
+
+KIND_IMU = 1
+KIND_GPS = 2
+
+MAX_PENDING = 8             # Armed snapshots; later triggers during an alert storm are ignored
+
+
+def unpack_record(buf, offset=0):
+    """Decode one record into a tuple starting with (ts, kind, ...)"""
+    kind = buf[offset + 8]
+    if kind == KIND_GPS:
+        return GPS_RECORD.unpack_from(buf, offset)
+    return IMU_RECORD.unpack_from(buf, offset)
+
+
+class FlightRecorder:
+    """Fixed-size memory-mapped ring of full-rate sensor data"""
+
+    def __init__(self, path, capacity=8192, snapshot_dir=None,
+                 pre_trigger_s=10.0, post_trigger_s=5.0, max_snapshots=500):
+        self.path = path
+        self.capacity = capacity
+        self.snapshot_dir = snapshot_dir or os.path.join(os.path.dirname(path), "snapshots")
+        self.pre_trigger_s = pre_trigger_s
+        self.post_trigger_s = post_trigger_s
+        self.max_snapshots = max_snapshots
+        self.lock = threading.Lock()
+        self.head = 0
+        self.mm = None
+        self._fd = None
+        self._pending = []        # [(trigger_ts, end_ts, pre_s, reason)]
+        self._open()
+
+    def _open(self):
+        """Map the ring file, creating or resetting it if the layout changed"""
+        size = HEADER_SIZE + self.capacity * RECORD_SIZE
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o640)
+        reuse = False
+        if os.fstat(self._fd).st_size == size:
+            header = os.pread(self._fd, RING_HEADER.size, 0)
+            magic, version, rec_size, capacity, head = RING_HEADER.unpack(header)
+            reuse = (magic == RING_MAGIC and version == FORMAT_VERSION
+                     and rec_size == RECORD_SIZE and capacity == self.capacity)
+        if not reuse:
+            # Preallocate once; the file never grows after this
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, size)
+            head = 0
+        self.mm = mmap.mmap(self._fd, size)
+        if not reuse:
+            RING_HEADER.pack_into(self.mm, 0, RING_MAGIC, FORMAT_VERSION,
+                                  RECORD_SIZE, self.capacity, 0)
+        self.head = head
+        logger.info(f"Flight recorder ready: {self.path} ({self.capacity} records, "
+                    f"{'resumed' if reuse else 'new'})")
+
+    # --- Recording (hot path) ---
+
+    def record_imu(self, ts, accel, gyro, temp):
+        """Store one IMU sample: a record write plus a head pointer update"""
+        with self.lock:
+            off = HEADER_SIZE + (self.head % self.capacity) * RECORD_SIZE
+            IMU_RECORD.pack_into(self.mm, off, ts, KIND_IMU,
+                                 accel[0], accel[1], accel[2],
+                                 gyro[0], gyro[1], gyro[2], temp)
+            self.head += 1
+            HEAD_FIELD.pack_into(self.mm, HEAD_OFFSET, self.head)
+        if self._pending and ts >= self._pending[0][1]:
+            self._finish_pending(ts)
+
+    def record_gps(self, ts, lat, lon, satellites=0):
+        """Store one GPS fix in the same ring as the IMU samples"""
+        with self.lock:
+            off = HEADER_SIZE + (self.head % self.capacity) * RECORD_SIZE
+            GPS_RECORD.pack_into(self.mm, off, ts, KIND_GPS, lat, lon, satellites)
+            self.head += 1
+            HEAD_FIELD.pack_into(self.mm, HEAD_OFFSET, self.head)
+
+    # --- Snapshots ---
+
+    def trigger(self, reason, ts, pre_s=None, post_s=None):
+        """Arm a snapshot that is written once the post-trigger window has elapsed"""
+        pre_s = self.pre_trigger_s if pre_s is None else pre_s
+        post_s = self.post_trigger_s if post_s is None else post_s
+        with self.lock:
+            if len(self._pending) >= MAX_PENDING:
+                logger.warning(f"Flight recorder: {reason} ignored, {MAX_PENDING} snapshots already armed")
+                return
+            self._pending.append((ts, ts + post_s, pre_s, reason))
+            self._pending.sort(key=lambda p: p[1])
+        logger.info(f"Flight recorder armed: {reason} (-{pre_s:g}s/+{post_s:g}s)")
+
+    def snapshot_now(self, reason, ts, pre_s=None):
+        """Freeze the most recent window immediately (on-demand dump)"""
+        pre_s = self.pre_trigger_s if pre_s is None else pre_s
+        return self._write_snapshot(ts, ts - pre_s, ts, reason)
+
+    def flush_pending(self, ts):
+        """Write any armed snapshots early (used on shutdown)"""
+        with self.lock:
+            pending, self._pending = self._pending, []
+        for trigger_ts, end_ts, pre_s, reason in pending:
+            self._write_snapshot(trigger_ts, trigger_ts - pre_s, min(end_ts, ts), reason)
+
+    def _finish_pending(self, ts):
+        with self.lock:
+            due = [p for p in self._pending if ts >= p[1]]
+            self._pending = [p for p in self._pending if ts < p[1]]
+        for trigger_ts, end_ts, pre_s, reason in due:
+            self._write_snapshot(trigger_ts, trigger_ts - pre_s, end_ts, reason)
+
+    def _window(self, start_ts, end_ts):
+        """Copy the records inside [start_ts, end_ts] out of the ring, oldest first"""
+        with self.lock:
+            head = self.head
+            count = min(head, self.capacity)
+            first = head - count
+            # Walk backwards from the newest record until we leave the window
+            lo = head
+            while lo > first:
+                off = HEADER_SIZE + ((lo - 1) % self.capacity) * RECORD_SIZE
+                if RECORD_TS.unpack_from(self.mm, off)[0] < start_ts:
+                    break
+                lo -= 1
+            chunks = []
+            for idx in range(lo, head):
+                off = HEADER_SIZE + (idx % self.capacity) * RECORD_SIZE
+                if RECORD_TS.unpack_from(self.mm, off)[0] <= end_ts:
+                    chunks.append(self.mm[off:off + RECORD_SIZE])
+        return b''.join(chunks), len(chunks)
+
+    def _write_snapshot(self, trigger_ts, start_ts, end_ts, reason):
+        data, count = self._window(start_ts, end_ts)
+        stamp = datetime.fromtimestamp(trigger_ts).strftime('%Y%m%d_%H%M%S_%f')[:-3]
+        name = f"snapshot_{stamp}_{reason.lower()}.bin"
+        path = os.path.join(self.snapshot_dir, name)
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, RECORD_SIZE,
+                                      trigger_ts, count, reason.encode('ascii', 'replace')[:16])
+        # File I/O happens off the caller's thread so sampling never waits on the SD card
+        thread = threading.Thread(target=self._save, args=(path, header, data))
+        thread.daemon = True
+        thread.start()
+        return path
+
+    def _save(self, path, header, data):
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(header.ljust(HEADER_SIZE, b'\0'))
+                f.write(data)
+            os.replace(tmp, path)
+            logger.info(f"Flight recorder snapshot saved: {path} "
+                        f"({len(data) // RECORD_SIZE} records)")
+            self._prune()
+        except Exception as e:
+            logger.error(f"Flight recorder snapshot failed: {e}")
+
+    def _prune(self):
+        """Delete the oldest snapshots beyond max_snapshots (names sort by trigger time)"""
+        names = sorted(n for n in os.listdir(self.snapshot_dir)
+                       if n.startswith("snapshot_") and n.endswith(".bin"))
+        for name in names[:max(0, len(names) - self.max_snapshots)]:
+            try:
+                os.remove(os.path.join(self.snapshot_dir, name))
+            except OSError as e:
+                logger.warning(f"Could not remove old snapshot {name}: {e}")
+
+    def close(self):
+        """Unmap the ring; the kernel writes back any dirty pages"""
+        try:
+            if self.mm:
+                self.mm.flush()
+                self.mm.close()
+            if self._fd is not None:
+                os.close(self._fd)
+        except Exception:
+            pass
+        self.mm = None
+        self._fd = None
+
+
+def read_records(path):
+    """Read all records from a ring or snapshot file in chronological order"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic = data[:4]
+    if magic == SNAPSHOT_MAGIC:
+        _, version, rec_size, trigger_ts, count, reason = SNAPSHOT_HEADER.unpack_from(data)
+        body = memoryview(data)[HEADER_SIZE:HEADER_SIZE + count * rec_size]
+        order = range(count)
+    elif magic == RING_MAGIC:
+        _, version, rec_size, capacity, head = RING_HEADER.unpack_from(data)
+        body = memoryview(data)[HEADER_SIZE:]
+        count = min(head, capacity)
+        order = (i % capacity for i in range(head - count, head))
+    else:
+        raise ValueError(f"{path}: not a flight recorder file")
+    if rec_size != RECORD_SIZE:
+        raise ValueError(f"{path}: unsupported record size {rec_size}")
+    return [unpack_record(body, i * RECORD_SIZE) for i in order]
+
+
+def read_snapshot_info(path):
+    """Return (trigger_ts, count, reason) from a snapshot header"""
+    with open(path, 'rb') as f:
+        header = f.read(SNAPSHOT_HEADER.size)
+    magic, version, rec_size, trigger_ts, count, reason = SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path}: not a snapshot file")
+    return trigger_ts, count, reason.rstrip(b'\0').decode('ascii', 'replace')
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+AT command channel for the SIM800L, with unsolicited result codes.
+
+One reader thread owns the modem's receive side and splits what arrives into
+lines. Unsolicited result codes (URCs) such as +CMTI (new SMS stored) and
++HTTPACTION (HTTP request finished) go to a callback the moment they arrive;
+everything else is collected for the AT command in progress. Commands are
+serialised by `lock`, which callers also hold across multi-step transactions
+(an SMS send, an inbox read), so traffic from different threads never
+interleaves on the wire.
+
+The reader polls quickly while a command is in flight or data is arriving
+and slowly otherwise, so an idle modem costs a few reads a second instead of
+a stream of AT+CMGL polls. Text nobody takes (line noise, unexpected
+RINGs on an idle modem) is capped at MAX_PENDING_LINES lines and
+MAX_PARTIAL_CHARS of unterminated tail, oldest dropped first.
+
+Outgoing SMS go through SmsOutbox: one worker thread behind a bounded queue
+that serves alerts first and never drops them.
+
+Hardware-free: the transport is any `read()` (returns bytes, b'' when nothing
+is waiting, never blocks) and `write(bytes)` pair, so the same code runs
+against pigpio bit-bang serial, a pyserial port or a simulator. The helpers
+below parse AT+CMGL listings, HTTP results and inbound command texts, and
+compare sender numbers exactly in international (E.164) form.
+"""
+
+import collections
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger("PatientMonitor")
+
+# New SMS stored, HTTP request finished, GPRS bearer dropped by the network
+URC_PREFIXES = ('+CMTI:', '+HTTPACTION:', '+SAPBR 1: DEACT')
+
+IDLE_POLL_S = 0.25   # Read interval with nothing going on (URC latency)
+BUSY_POLL_S = 0.02   # Read interval during a command or while data flows
+BUSY_HOLD_S = 1.0    # Stay in fast polling this long after the last byte
+MAX_PENDING_LINES = 512    # Untaken lines kept (a full SIM inbox listing is ~100)
+MAX_PARTIAL_CHARS = 1024   # Unterminated tail kept (the longest real one is the '> ' prompt)
+
+
+class ModemChannel:
+    """Single-reader AT channel over a non-blocking read/write transport"""
+
+    def __init__(self, read, write, on_urc=None, clock=time.monotonic):
+        self._read = read
+        self._write = write
+        self.on_urc = on_urc
+        self.clock = clock
+        self.lock = threading.RLock()  # One command or transaction at a time
+        self._cond = threading.Condition()
+        self._chunks = collections.deque(maxlen=MAX_PENDING_LINES)  # Non-URC lines since the last take()
+        self._partial = ''             # Unterminated tail, e.g. the '> ' prompt
+        self._last_rx = 0.0
+        self._busy_until = 0.0
+        self._thread = None
+        self.running = False
+        self.urcs = 0
+        self.read_errors = 0
+        self.dropped = 0               # Characters discarded by the caps
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="modem-rx")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(1.0)
+
+    # --- Reader thread ---
+
+    def _run(self):
+        while self.running:
+            try:
+                data = self._read()
+            except Exception as e:
+                self.read_errors += 1
+                logger.debug(f"Modem read failed: {e}")
+                data = b''
+            now = self.clock()
+            if data:
+                self._last_rx = now
+                self._busy_until = max(self._busy_until, now + BUSY_HOLD_S)
+                self._feed(bytes(data).decode('ascii', errors='replace'))
+            time.sleep(BUSY_POLL_S if now < self._busy_until else IDLE_POLL_S)
+
+    def _feed(self, text):
+        urcs = []
+        with self._cond:
+            lines = (self._partial + text).split('\n')
+            self._partial = lines.pop()
+            if len(self._partial) > MAX_PARTIAL_CHARS:
+                self.dropped += len(self._partial) - MAX_PARTIAL_CHARS
+                self._partial = self._partial[-MAX_PARTIAL_CHARS:]
+            for line in lines:
+                if line.strip().startswith(URC_PREFIXES):
+                    urcs.append(line.strip())
+                else:
+                    if len(self._chunks) == MAX_PENDING_LINES:
+                        self.dropped += len(self._chunks[0])
+                    self._chunks.append(line + '\n')
+            self._cond.notify_all()
+        for urc in urcs:
+            self.urcs += 1
+            if self.on_urc:
+                try:
+                    self.on_urc(urc)
+                except Exception as e:
+                    logger.error(f"URC handler failed for '{urc}': {e}")
+
+    # --- Command side ---
+
+    def write(self, data):
+        """Raw bytes to the modem (message bodies, Ctrl+Z)"""
+        self._busy_until = max(self._busy_until, self.clock() + BUSY_HOLD_S)
+        self._write(data)
+
+    def take(self):
+        """Everything received since the last take, including an unterminated prompt"""
+        with self._cond:
+            text = ''.join(self._chunks)
+            self._chunks.clear()
+            if not self._partial.lstrip().startswith('+'):  # Leave a half-read URC alone
+                text += self._partial
+                self._partial = ''
+            return text
+
+    def wait(self, token, timeout, idle_s=1.0):
+        """Block until `token` or an error shows up, `timeout` passes, or the
+        modem goes quiet for `idle_s`; returns the text so far (not consumed)"""
+        start = self.clock()
+        with self._cond:
+            while True:
+                text = ''.join(self._chunks) + self._partial
+                if token in text or 'ERROR' in text:
+                    return text
+                now = self.clock()
+                if now - start >= timeout or now - max(start, self._last_rx) > idle_s:
+                    return text
+                self._cond.wait(min(0.1, timeout))
+
+    def command(self, cmd, wait='OK', timeout=3, idle_s=1.0):
+        """Send one AT command; returns its response text
+
+        `idle_s` ends the wait early once the modem has gone quiet; commands
+        that stay silent for a while before answering (bearer set-up) need
+        it raised to their timeout.
+        """
+        with self.lock:
+            stale = self.take()
+            if stale.strip():
+                logger.debug(f"Modem: discarded '{stale.strip()[:60]}' before '{cmd}'")
+            self._busy_until = self.clock() + timeout
+            self.write((cmd + "\r\n").encode('utf-8'))
+            self.wait(wait, timeout, idle_s)
+            return self.take()
+
+
+# --- Outgoing SMS ---
+
+OutgoingSms = collections.namedtuple('OutgoingSms', 'message to on_done')
+
+
+class SmsQueue:
+    """Outgoing SMS waiting for the modem: alerts first, then the rest in order
+
+    Holds `maxsize` messages. When full, a new alert displaces the oldest
+    ordinary message (or goes over the limit if only alerts are waiting)
+    and a new ordinary message is refused, so an alert is never dropped.
+    Not thread-safe; the owner serialises access.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._alerts = collections.deque()
+        self._others = collections.deque()
+
+    def __len__(self):
+        return len(self._alerts) + len(self._others)
+
+    def put(self, item, alert=False):
+        """Queue `item`; returns what was dropped for it (`item` itself when
+        refused) or None"""
+        dropped = None
+        if len(self) >= self.maxsize:
+            if not alert:
+                return item
+            if self._others:
+                dropped = self._others.popleft()
+        (self._alerts if alert else self._others).append(item)
+        return dropped
+
+    def get(self):
+        """Oldest alert, else oldest ordinary message (the queue must not be empty)"""
+        return self._alerts.popleft() if self._alerts else self._others.popleft()
+
+
+class SmsOutbox:
+    """Bounded queue of outgoing SMS served by one worker thread
+
+    `send(message, to)` returns True once the modem accepted the message and
+    runs on the worker, one message at a time. Alerts go out before anything
+    else, otherwise in the order queued (see SmsQueue). The worker starts
+    with the first message and lives as long as the process.
+    """
+
+    def __init__(self, send, maxsize=16):
+        self._send = send
+        self._queue = SmsQueue(maxsize)
+        self._ready = threading.Condition()
+        self._thread = None
+        self.dropped = 0
+
+    def submit(self, message, to=None, on_done=None, alert=False):
+        """Queue one SMS; `on_done(sent)` runs on the worker afterwards
+
+        With the queue full an ordinary SMS is dropped (returns False) and an
+        alert displaces the oldest ordinary one. A dropped SMS gets
+        `on_done(False)` on the caller's thread.
+        """
+        sms = OutgoingSms(message, to, on_done)
+        with self._ready:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sms")
+                self._thread.daemon = True
+                self._thread.start()
+            dropped = self._queue.put(sms, alert)
+            self._ready.notify()
+        if dropped is not None:
+            self.dropped += 1
+            logger.error(f"SMS queue full - dropping: {dropped.message[:40]}")
+            if dropped.on_done:
+                dropped.on_done(False)
+        return dropped is not sms
+
+    def pending(self):
+        with self._ready:
+            return len(self._queue)
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._queue:
+                    self._ready.wait()
+                sms = self._queue.get()
+            try:
+                sent = self._send(sms.message, sms.to)
+            except Exception as e:
+                logger.error(f"SMS send failed: {e}")
+                sent = False
+            if sms.on_done:
+                try:
+                    sms.on_done(sent)
+                except Exception as e:
+                    logger.error(f"SMS completion handler failed: {e}")
+
+
+# --- SMS inbox and commands ---
+
+SmsMessage = collections.namedtuple('SmsMessage', 'index status sender body')
+
+_CMGL_RE = re.compile(r'^\+CMGL:\s*(\d+),"([^"]*)","([^"]*)"')
+
+SMS_COMMANDS = ('LOCATE', 'STATUS', 'SILENCE', 'SET-INTERVAL')
+
+
+def parse_cmgl(text):
+    """Messages from a text-mode AT+CMGL response"""
+    messages = []
+    current = None
+    body = []
+    for line in text.replace('\r', '').split('\n'):
+        match = _CMGL_RE.match(line)
+        if match or line.strip() in ('OK', 'ERROR'):
+            if current:
+                messages.append(current._replace(body='\n'.join(body).strip()))
+            current, body = None, []
+            if match:
+                current = SmsMessage(int(match.group(1)), match.group(2), match.group(3), '')
+        elif current is not None:
+            body.append(line)
+    if current:
+        messages.append(current._replace(body='\n'.join(body).strip()))
+    return messages
+
+
+def parse_cmti(urc):
+    """Storage index from '+CMTI: "SM",3', or None"""
+    match = re.match(r'^\+CMTI:\s*"[^"]*",\s*(\d+)', urc)
+    return int(match.group(1)) if match else None
+
+
+def parse_httpaction(urc):
+    """(method, status, length) from '+HTTPACTION: 1,200,0', or None"""
+    match = re.match(r'^\+HTTPACTION:\s*(\d+),(\d+),(\d+)', urc)
+    return tuple(int(g) for g in match.groups()) if match else None
+
+
+def parse_command(body):
+    """('LOCATE', None) / ('SET-INTERVAL', '30') etc., or (None, body) if unknown"""
+    words = body.strip().split(None, 1)
+    if not words:
+        return None, body
+    verb = words[0].upper().replace('_', '-')
+    arg = words[1].strip() if len(words) > 1 else None
+    if verb == 'SET' and arg and arg.upper().startswith('INTERVAL'):
+        verb = 'SET-INTERVAL'  # "SET INTERVAL 30"
+        arg = arg[len('INTERVAL'):].strip() or None
+    if verb not in SMS_COMMANDS:
+        return None, body
+    return verb, arg
+
+
+def e164(number, country_code):
+    """'+44 7911 123456', '0044 7911 123456' or, with country_code 44, the
+    national '07911 123456' -> '+447911123456'; None if not a phone number
+
+    Digits without a '+' or '00' prefix are a national number (one leading
+    trunk '0' dropped). Alphanumeric senders and short codes give None.
+    """
+    raw = number.strip()
+    body = raw[1:] if raw.startswith('+') else raw
+    if not body or any(not (c.isdigit() or c in ' -().') for c in body):
+        return None
+    digits = ''.join(c for c in body if c.isdigit())
+    if raw.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        digits = f"{country_code}{digits[1:] if digits.startswith('0') else digits}"
+    return f"+{digits}" if 7 <= len(digits) <= 15 else None
+
+
+def same_number(a, b, country_code):
+    """True if both are the same full international number (see e164)"""
+    number = e164(a, country_code)
+    return number is not None and number == e164(b, country_code)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Validated, hot-reloadable monitor settings from config.ini.
+
+Every tunable is described once in FIELDS with its type, bounds and whether
+it needs the hardware brought up again. A load produces an immutable
+`Config` snapshot (a namedtuple, attributes named `<section>_<key>`); the
+monitor swaps its reference to the new snapshot in one assignment, so
+readers always see one consistent set of values.
+
+`ConfigWatcher.check()` is cheap enough for a periodic job: with
+inotify_simple installed it only looks at the file after the kernel reports
+a write or rename in its directory, otherwise it compares the file's
+mtime/size/inode. A file that fails validation, or has disappeared, is
+rejected as a whole and the running snapshot stays in force; at startup
+invalid fields (or a missing file) fall back to their defaults instead, so a
+typo can never keep the monitor from running.
+Fields marked `restart` keep their running value until the next start and
+are reported as pending.
+"""
+
+import collections
+import configparser
+import logging
+import os
+import re
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+    INOTIFY_AVAILABLE = True
+except ImportError:
+    INOTIFY_AVAILABLE = False
+
+logger = logging.getLogger("PatientMonitor")
+
+Field = collections.namedtuple('Field', 'section key kind low high restart help')
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+PHONE_RE = re.compile(r'^\+?[0-9]{7,15}$')
+URL_RE = re.compile(r'^https?://[^\s"]+$')
+
+FIELDS = (
+    Field('patient', 'id', str, 1, 32, False, "Identifier sent in every SMS"),
+    Field('patient', 'caregiver_phone', 'phone', None, None, False, "International format, e.g. +15551234567"),
+    Field('patient', 'command_numbers', 'phones', None, None, False,
+          "Comma-separated numbers that may also send SMS commands (the caregiver always can)"),
+    Field('patient', 'country_code', int, 1, 999, False,
+          "Calling code for numbers written without one, e.g. 44 for 07911 123456"),
+    Field('fall', 'threshold_g', float, 1.2, 8.0, False, "Impact threshold"),
+    Field('fall', 'duration_ms', float, 5, 1000, False, "Impact window needed to confirm a fall"),
+    Field('fall', 'reset_window_s', float, 0.05, 2.0, False, "Quiet time that cancels an impact window"),
+    Field('fall', 'posture_confirm_s', float, 0, 60, False, "Lying still / upright time that settles a fall (0 = off)"),
+    Field('fall', 'posture_timeout_s', float, 1, 120, False, "Alert anyway after this long"),
+    Field('alerts', 'cooldown_s', float, 0, 3600, False, "Minimum time between fall alerts (button alerts ignore it)"),
+    Field('sampling', 'active_rate_hz', float, 10, 200, False, "IMU rate while moving or inside an impact window"),
+    Field('sampling', 'idle_rate_hz', float, 0.5, 50, False, "IMU rate while still"),
+    Field('schedule', 'heartbeat_interval_s', float, 10, 3600, False, "Health log interval"),
+    Field('schedule', 'location_interval_s', 'interval', 60, 86400, False,
+          "Periodic location SMS interval (0 = only on request, SMS 'LOCATE')"),
+    Field('button', 'long_press_s', float, 0.5, 10, False, "Hold time that cancels an alert"),
+    Field('logging', 'level', 'level', None, None, False, "DEBUG, INFO, WARNING or ERROR"),
+    Field('hardware', 'motion_wake', bool, None, None, True, "Sleep on the MPU6050 motion interrupt"),
+    Field('hardware', 'motion_wake_threshold_mg', int, 2, 510, True, "Motion interrupt threshold"),
+    Field('uplink', 'url', 'url', None, None, False, "Endpoint for batched telemetry POSTs (empty = SMS only)"),
+    Field('uplink', 'transport', 'choice', ('gprs', 'direct'), None, False,
+          "gprs (SIM800L mobile data) or direct (the Pi's own network)"),
+    Field('uplink', 'apn', str, 0, 63, False, "Mobile data APN for the GPRS bearer"),
+    Field('uplink', 'token', str, 0, 512, False, "Sent as 'Authorization: Bearer <token>' (empty = none)"),
+    Field('uplink', 'batch_bytes', int, 256, 32768, False, "Post once this much telemetry is waiting"),
+    Field('uplink', 'max_age_s', float, 10, 3600, False, "Post once the oldest waiting record is this old"),
+    Field('ble', 'enabled', bool, None, None, True, "Collect vitals from the ESP32 wearable over BLE (needs bleak)"),
+    Field('ble', 'address', str, 0, 17, True, "Wearable MAC address (empty = first one advertising the service)"),
+    Field('ble', 'window_s', float, 10, 3600, False, "One aggregated vitals record per window"),
+)
+
+Config = collections.namedtuple('Config', [f'{f.section}_{f.key}' for f in FIELDS])
+
+
+def _parse(field, raw):
+    """Convert and validate one raw string; raises ValueError with a reason"""
+    raw = raw.strip()
+    if field.kind is bool:
+        lowered = raw.lower()
+        if lowered in ('1', 'yes', 'true', 'on'):
+            return True
+        if lowered in ('0', 'no', 'false', 'off'):
+            return False
+        raise ValueError(f"expected yes/no, got '{raw}'")
+    if field.kind == 'phone':
+        if not PHONE_RE.match(raw):
+            raise ValueError(f"'{raw}' is not a phone number")
+        return raw
+    if field.kind == 'phones':
+        numbers = tuple(n.strip() for n in raw.split(',') if n.strip())
+        for number in numbers:
+            if not PHONE_RE.match(number):
+                raise ValueError(f"'{number}' is not a phone number")
+        return numbers
+    if field.kind == 'interval':
+        value = float(raw)
+        if value == 0:
+            return 0.0  # Off
+        if value != value or not field.low <= value <= field.high:
+            raise ValueError(f"{value} is neither 0 (off) nor within {field.low}..{field.high}")
+        return value
+    if field.kind == 'url':
+        if raw and not URL_RE.match(raw):
+            raise ValueError(f"'{raw}' is not an http(s) URL")
+        return raw
+    if field.kind == 'choice':
+        if raw.lower() not in field.low:
+            raise ValueError(f"expected one of {', '.join(field.low)}")
+        return raw.lower()
+    if field.kind == 'level':
+        if raw.upper() not in LOG_LEVELS:
+            raise ValueError(f"expected one of {', '.join(LOG_LEVELS)}")
+        return raw.upper()
+    if field.kind is str:
+        if not field.low <= len(raw) <= field.high or '|' in raw:
+            raise ValueError(f"must be {field.low}-{field.high} characters without '|'")
+        return raw
+    value = field.kind(raw)
+    if value != value or not field.low <= value <= field.high:  # value != value: NaN
+        raise ValueError(f"{value} outside {field.low}..{field.high}")
+    return value
+
+
+def parse_file(path, defaults, missing_ok=True):
+    """Read `path` over `defaults` (dict keyed like Config); returns (Config, errors)
+
+    A field that fails validation keeps its default in the returned Config;
+    callers decide whether any error rejects the file as a whole. A missing
+    file is an error only when `missing_ok` is false.
+    """
+    values = dict(defaults)
+    errors = []
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        with open(path) as f:
+            parser.read_file(f)
+    except FileNotFoundError:
+        return Config(**values), [] if missing_ok else ["file missing"]
+    except (OSError, configparser.Error) as e:
+        return Config(**values), [f"unreadable: {e}"]
+
+    known = set()
+    for field in FIELDS:
+        name = f'{field.section}_{field.key}'
+        known.add((field.section, field.key))
+        if parser.has_option(field.section, field.key):
+            try:
+                values[name] = _parse(field, parser.get(field.section, field.key))
+            except ValueError as e:
+                errors.append(f"[{field.section}] {field.key}: {e}")
+    for section in parser.sections():
+        for key in parser.options(section):
+            if (section, key) not in known:
+                logger.warning(f"Config: unknown setting [{section}] {key} ignored")
+    return Config(**values), errors
+
+
+class ConfigWatcher:
+    """Loads config.ini and reports validated changes to it"""
+
+    def __init__(self, path, defaults):
+        self.path = path
+        self.defaults = dict(defaults)
+        self.current = None
+        self.pending_restart = {}  # name -> value waiting for the next start
+        self.rejected = 0
+        self._stamp = None
+        self._inotify = None
+        if INOTIFY_AVAILABLE:
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                self._inotify = INotify()
+                # Watch the directory: editors often save by renaming a temp file
+                self._inotify.add_watch(os.path.dirname(path) or '.',
+                                        inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO |
+                                        inotify_flags.CREATE | inotify_flags.DELETE)
+            except OSError as e:
+                logger.warning(f"inotify unavailable ({e}); polling config mtime")
+                self._inotify = None
+
+    def load(self):
+        """Initial load: invalid fields fall back to defaults"""
+        self._stamp = self._file_stamp()
+        config, errors = parse_file(self.path, self.defaults)
+        for error in errors:
+            logger.error(f"Config {self.path}: {error} - using default")
+        self.current = config
+        return config
+
+    def check(self):
+        """Return (new Config, changed names) if the file changed validly, else None"""
+        if self._inotify is not None:
+            name = os.path.basename(self.path)
+            if not any(event.name == name for event in self._inotify.read(timeout=0)):
+                return None
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return None
+        self._stamp = stamp
+
+        # Deleted or renamed away: keep running on what was loaded, not defaults
+        config, errors = parse_file(self.path, self.defaults, missing_ok=False)
+        if errors:
+            self.rejected += 1
+            for error in errors:
+                logger.error(f"Config reload rejected - {error}")
+            logger.error("Config reload rejected; running settings unchanged")
+            return None
+
+        # Hardware-bound fields keep their running value until a restart
+        keep = {}
+        self.pending_restart = {}
+        for field in FIELDS:
+            if not field.restart:
+                continue
+            name = f'{field.section}_{field.key}'
+            new, running = getattr(config, name), getattr(self.current, name)
+            if new != running:
+                keep[name] = running
+                self.pending_restart[name] = new
+                logger.warning(f"Config: [{field.section}] {field.key} = {new} needs a restart "
+                               f"(running with {running})")
+        if keep:
+            config = config._replace(**keep)
+
+        changed = [name for name in Config._fields
+                   if getattr(config, name) != getattr(self.current, name)]
+        self.current = config
+        return (config, changed) if changed else None
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def write_template(self):
+        """Create a commented config.ini holding the defaults, if none exists"""
+        if os.path.exists(self.path):
+            return False
+        lines = ["# Patient monitor settings - changes are picked up while running.",
+                 "# Settings marked (restart) only take effect after a restart.", ""]
+        section = None
+        for field in FIELDS:
+            if field.section != section:
+                if section is not None:
+                    lines.append("")
+                section = field.section
+                lines.append(f"[{section}]")
+            value = self.defaults[f'{field.section}_{field.key}']
+            if field.kind is bool:
+                value = 'yes' if value else 'no'
+            elif field.kind == 'phones':
+                value = ', '.join(value)
+            note = " (restart)" if field.restart else ""
+            lines.append(f"# {field.help}{note}")
+            lines.append(f"{field.key} = {value}")
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'w') as f:
+                f.write("\n".join(lines) + "\n")
+            self._stamp = self._file_stamp()
+            return True
+        except OSError as e:
+            logger.warning(f"Could not write config template {self.path}: {e}")
+            return False
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Incremental orientation estimate for post-fall posture detection.
+
+A complementary filter tracks the "up" direction in the sensor frame: the
+gyro propagates it every sample and the accelerometer pulls it back towards
+measured gravity whenever the reading is close to 1 g. Each update is a fixed
+handful of float operations on preallocated slots, cheap enough to run at the
+full IMU rate on a Pi Zero.
+
+From the estimate it exposes tilt from the wearer's upright axis and how long
+the wearer has been lying still or standing upright, which the fall detector
+uses to confirm or cancel a fall after the impact.
+"""
+
+import math
+
+from fall_detector import STANDARD_GRAVITY
+
+
+class OrientationEstimator:
+    """Complementary filter on the gravity direction with posture timers"""
+    __slots__ = ('upright_axis', 'time_constant_s', 'still_accel_g', 'still_gyro_rads',
+                 'lying_tilt_deg', 'upright_tilt_deg', 'grace_s',
+                 'ux', 'uy', 'uz', 'tilt_deg', 'still', 'last_t',
+                 'lying_since', 'lying_break', 'upright_since')
+
+    def __init__(self, upright_axis=(0.0, 0.0, 1.0), time_constant_s=0.5,
+                 still_accel_g=0.1, still_gyro_rads=0.35,
+                 lying_tilt_deg=60.0, upright_tilt_deg=35.0, grace_s=0.5):
+        n = math.sqrt(sum(c * c for c in upright_axis)) or 1.0
+        self.upright_axis = tuple(c / n for c in upright_axis)
+        self.time_constant_s = time_constant_s  # Trust in gyro vs accelerometer
+        self.still_accel_g = still_accel_g      # |mag - 1g| allowed while still
+        self.still_gyro_rads = still_gyro_rads  # Rotation rate allowed while still
+        self.lying_tilt_deg = lying_tilt_deg
+        self.upright_tilt_deg = upright_tilt_deg
+        self.grace_s = grace_s                  # Blips shorter than this keep the lying timer
+
+        self.ux, self.uy, self.uz = self.upright_axis
+        self.tilt_deg = 0.0
+        self.still = False
+        self.last_t = None
+        self.lying_since = None
+        self.lying_break = None
+        self.upright_since = None
+
+    def update(self, accel, gyro, now):
+        """Fold in one sample: accel in m/s^2, gyro in rad/s, now in seconds"""
+        ax, ay, az = accel
+        wx, wy, wz = gyro
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        mag_g = norm / STANDARD_GRAVITY
+
+        if self.last_t is None:
+            # First sample: take gravity straight from the accelerometer
+            if norm > 0:
+                self.ux, self.uy, self.uz = ax / norm, ay / norm, az / norm
+            dt = 0.0
+        else:
+            dt = min(max(now - self.last_t, 0.0), 0.5)
+        self.last_t = now
+
+        ux, uy, uz = self.ux, self.uy, self.uz
+        if dt > 0:
+            # A world-fixed vector seen from the rotating body: du/dt = -w x u
+            ux, uy, uz = (ux - dt * (wy * uz - wz * uy),
+                          uy - dt * (wz * ux - wx * uz),
+                          uz - dt * (wx * uy - wy * ux))
+            # Only trust the accelerometer when it is measuring mostly gravity
+            if norm > 0 and abs(mag_g - 1.0) < 0.3:
+                k = dt / (self.time_constant_s + dt)
+                ux += k * (ax / norm - ux)
+                uy += k * (ay / norm - uy)
+                uz += k * (az / norm - uz)
+            n = math.sqrt(ux * ux + uy * uy + uz * uz) or 1.0
+            ux, uy, uz = ux / n, uy / n, uz / n
+        self.ux, self.uy, self.uz = ux, uy, uz
+
+        rx, ry, rz = self.upright_axis
+        cos_tilt = max(-1.0, min(1.0, ux * rx + uy * ry + uz * rz))
+        self.tilt_deg = math.degrees(math.acos(cos_tilt))
+
+        self.still = (abs(mag_g - 1.0) < self.still_accel_g and
+                      math.sqrt(wx * wx + wy * wy + wz * wz) < self.still_gyro_rads)
+
+        if self.still and self.tilt_deg >= self.lying_tilt_deg:
+            if self.lying_since is None:
+                self.lying_since = now
+            self.lying_break = None
+        elif self.lying_since is not None:
+            # Sensor noise or a twitch should not restart the lying timer
+            if self.lying_break is None:
+                self.lying_break = now
+            elif now - self.lying_break > self.grace_s:
+                self.lying_since = None
+                self.lying_break = None
+
+        if self.tilt_deg <= self.upright_tilt_deg:
+            if self.upright_since is None:
+                self.upright_since = now
+        else:
+            self.upright_since = None
+
+    def lying_still_s(self, now, since=None):
+        """Seconds spent lying still, counting only from `since` if given"""
+        if self.lying_since is None:
+            return 0.0
+        start = self.lying_since if since is None else max(self.lying_since, since)
+        return max(0.0, now - start)
+
+    def upright_s(self, now, since=None):
+        """Seconds spent upright, counting only from `since` if given"""
+        if self.upright_since is None:
+            return 0.0
+        start = self.upright_since if since is None else max(self.upright_since, since)
+        return max(0.0, now - start)
+
+    def calibrate(self):
+        """Take the current up direction as the wearer's upright axis"""
+        self.upright_axis = (self.ux, self.uy, self.uz)
+        self.tilt_deg = 0.0
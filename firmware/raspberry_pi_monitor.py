@@ -11,39 +11,109 @@ Features:
 """
 
 import time
+import json
+_IMPORT_START = time.perf_counter()
 import os
-import serial
-import board
-import busio
-import adafruit_mpu6050
 import math
 import logging
+import logging.handlers
 import sys
-import RPi.GPIO as GPIO
 import threading
 import atexit
+import collections
+import multiprocessing
+import signal
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# Try to import pigpio, but make it optional
-try:
-    import pigpio
-    PIGPIO_AVAILABLE = True
-except ImportError:
-    PIGPIO_AVAILABLE = False
-    logging.warning("pigpio library not found. Some features may be limited.")
+from activity import ActivityAggregator
+from battery import BatteryEstimator, PROFILES, select_profile
+from fall_detector import FallDetector, accel_magnitude_g
+from flight_recorder import FlightRecorder
+from gsm_modem import (ModemChannel, SmsOutbox, SmsQueue, parse_cmgl, parse_cmti, parse_command,
+                       parse_httpaction, same_number)
+from telemetry_uplink import TelemetrySpool, TelemetryUplink, post_direct
+from ble_gateway import FINGER, BleGateway, FakeWearable, VitalsBuffer, bleak_connector
+from monitor_config import ConfigWatcher
+from orientation import OrientationEstimator
+from sample_ring import SampleRing, KIND_IMU, KIND_IMU_FAIL, KIND_FALL
+from startup import StartupTimer, lazy_import, module_available
+from timer_wheel import TimerWheel, PRIORITY_HIGH, PRIORITY_LOW
+
+# Startup phases and lazy imports, for the startup log line and --startup-report
+STARTUP = StartupTimer(start=_IMPORT_START)
+STARTUP.lap("stdlib + helper modules", kind='import')
+
+# Hardware libraries load on first use, so only the backends in use cost
+# startup time (Blinka alone takes seconds on a Pi Zero). The split-process
+# supervisor never touches the I2C stack, and only --runtime asyncio loads asyncio.
+lazy_import('board', globals(), timer=STARTUP)
+lazy_import('busio', globals(), timer=STARTUP)
+lazy_import('adafruit_mpu6050', globals(), timer=STARTUP)
+lazy_import('serial', globals(), timer=STARTUP)
+lazy_import('RPi.GPIO', globals(), 'GPIO', timer=STARTUP)
+lazy_import('asyncio', globals(), timer=STARTUP)
+
+# pigpio is optional (checked without importing it)
+PIGPIO_AVAILABLE = module_available('pigpio')
+if PIGPIO_AVAILABLE:
+    lazy_import('pigpio', globals(), timer=STARTUP)
+
+# spidev (MCP3008 battery ADC) is optional too
+SPIDEV_AVAILABLE = module_available('spidev')
+if SPIDEV_AVAILABLE:
+    lazy_import('spidev', globals(), timer=STARTUP)
+
+# bleak (BLE central for the wearable) is optional; ble_gateway imports it when connecting
+BLEAK_AVAILABLE = module_available('bleak')
 
 # --- HARDWARE CONFIGURATION ---
-# Device Identification
+# Values below marked (config.ini) are defaults: CONFIG_FILE overrides them and
+# is re-read while running (see monitor_config.FIELDS)
+# Device Identification (config.ini)
 PATIENT_ID = "PATIENT_001"
 CAREGIVER_PHONE = "+917592991242"  # Replace with actual number
+COMMAND_NUMBERS = ()       # Extra numbers allowed to send SMS commands (the caregiver always can)
+COUNTRY_CODE = 91          # Calling code for numbers without one (senders must match exactly)
 
-# Fall Detection Parameters
+# Fall Detection Parameters (config.ini)
 FALL_THRESHOLD_G = 2.0     # Adjust sensitivity (2.0g is standard for fall detection)
 FALL_DURATION_MS = 40      # Duration in milliseconds for impact detection
-ALERT_COOLDOWN = 300       # 5 minutes between alerts (prevents spam)
-SAMPLE_RATE = 50           # Sensor sampling rate (Hz)
+FALL_RESET_WINDOW_S = 0.2  # Quiet time that cancels an impact window
+ALERT_COOLDOWN = 60        # Seconds between fall alerts (the button ignores it)
+SAMPLE_RATE = 50           # Sensor sampling rate while moving (Hz)
+IDLE_SAMPLE_RATE = 5       # Sensor sampling rate while still (Hz)
 SMS_RETRY_COUNT = 3        # Number of SMS retry attempts
+GSM_INIT_WAIT_S = 60       # An SMS raised during modem start-up waits this long for it
+LOCATE_FIX_WAIT_S = 90     # LOCATE without a fix: reply after giving the GPS this long
+SERIAL_WRITE_CHUNK = 256   # Bytes per bit-banged wave (pigpio limits a wave's pulses)
+
+# Telemetry Uplink (batched JSON over SIM800L GPRS or the Pi's network; config.ini)
+UPLINK_URL = ""            # Endpoint; empty keeps everything on SMS
+UPLINK_TRANSPORT = "gprs"  # gprs or direct
+UPLINK_APN = "internet"    # Carrier's mobile data APN
+UPLINK_TOKEN = ""          # Bearer token for the endpoint
+UPLINK_BATCH_BYTES = 4096  # Post once this much (uncompressed) telemetry waits
+UPLINK_MAX_AGE_S = 300     # ... or once the oldest record is this old
+UPLINK_FIX_INTERVAL_S = 60           # New GPS fixes recorded for the dashboard this often
+UPLINK_CHECK_S = 5                   # Flush policy check
+UPLINK_SPOOL_MAX_BYTES = 512 * 1024  # Oldest records dropped beyond this during an outage
+UPLINK_SMS_FALLBACK_FAILURES = 3     # Location updates go back to SMS after this many failed posts
+GPRS_BEARER_TIMEOUT_S = 30           # AT+SAPBR=1,1 (opening the data bearer)
+HTTP_ACTION_TIMEOUT_S = 60           # AT+HTTPACTION result (+HTTPACTION URC)
+
+# BLE Wearable Gateway (ESP32 vitals over BLE, needs bleak; config.ini)
+BLE_ENABLED = False        # Connect to the wearable
+BLE_ADDRESS = ""           # Wearable MAC; empty = first one advertising the vitals service
+VITALS_WINDOW_S = 60       # One aggregated vitals record per window
+VITALS_BUFFER_SAMPLES = 7200   # Recent samples kept (~1h at 2 notifications/s)
+VITALS_FRESH_S = 30        # Vitals older than this are left out of alerts and STATUS
+
+# Post-fall posture check (orientation from accel + gyro; times in config.ini)
+UPRIGHT_AXIS = (0.0, 0.0, 1.0)   # Sensor axis pointing up when the patient stands
+POSTURE_CONFIRM_S = 5.0    # Lying still confirms a fall, upright cancels it (0 disables the check)
+POSTURE_TIMEOUT_S = 15.0   # Alert anyway if the posture is still unclear after this long
 
 # Hardware Pins (BCM numbering)
 # Power Management
@@ -55,29 +125,88 @@ SIM800L_POWER_PIN = 17      # GPIO17 (Pin 11) - Power key
 SIM800L_RST_PIN = 27       # GPIO27 (Pin 13) - Reset pin
 SIM800L_RX_PIN = 15        # GPIO15 (Pin 10) - UART0 RX
 SIM800L_TX_PIN = 14        # GPIO14 (Pin 8)  - UART0 TX
+ALERT_QUEUE_SIZE = 16      # Pending SMS before ordinary ones are dropped (alerts never are)
 
 # GPS Module
 GPS_POWER_PIN = 22         # GPIO22 (Pin 15) - Power control
 GPS_RX_PIN = 10            # GPIO10 (Pin 19) - UART1 RX
 GPS_TX_PIN = 8             # GPIO8 (Pin 24)  - UART1 TX
+GPS_MAX_LINE = 256         # NMEA sentences are <= 82 chars; longer runs without a newline are noise
 
 # I2C Devices (MPU6050)
 I2C_SDA_PIN = 2            # GPIO2 (Pin 3) - I2C1 SDA
 I2C_SCL_PIN = 3            # GPIO3 (Pin 5) - I2C1 SCL
 
+MPU6050_ADDR = 0x68        # AD0 tied low
+MOTION_INT_PIN = 6         # GPIO6 (Pin 31) - MPU6050 INT (motion interrupt)
+
+# Battery Monitoring (MCP3008 on SPI1 CE0 - SPI0's pins carry the GPS - cell through a divider)
+BATTERY_SPI_BUS = 1            # /dev/spidev1.0, needs dtoverlay=spi1-1cs
+BATTERY_SPI_DEVICE = 0
+BATTERY_VREF = 3.3             # MCP3008 VREF
+BATTERY_DIVIDER = 2.0          # Cell volts per ADC input volt (100k/100k divider)
+BATTERY_BURST = 15             # Conversions per reading (median taken)
+BATTERY_SAMPLE_INTERVAL_S = 60
+BATTERY_LOW_PCT = 20           # LOW_BATTERY SMS
+BATTERY_CRITICAL_PCT = 10      # CRITICAL_BATTERY SMS
+BATTERY_REARM_PCT = 30         # Charged back above this: alerts can fire again
+
 # User Interface
 BUZZER_PIN = 23            # GPIO23 (Pin 16) - Buzzer
 BUTTON_PIN = 24            # GPIO24 (Pin 18) - Emergency button
 LED_PIN = 25               # GPIO25 (Pin 22) - Status LED
 
-# File paths
-import os
+# Annunciator (buzzer/LED patterns)
+ANNUNCIATOR_ALARM_S = 30          # Local fall alarm runs this long unless cancelled
+
+# Emergency Button (edge-triggered; independent of the sampling loop)
+BUTTON_GLITCH_US = 10000          # pigpio glitch filter: level must hold this long
+BUTTON_BOUNCE_MS = 50             # RPi.GPIO bouncetime when pigpio is unavailable
+BUTTON_LONG_PRESS_S = 3.0         # Holding this long after an alert cancels it (config.ini)
+BUTTON_CANCEL_WINDOW_S = 600      # How long after an alert a hold can still cancel it
+
+# Motion-Interrupt Wake (low-power idle instead of 5 Hz polling)
+MOTION_WAKE_ENABLED = False       # Requires MPU6050 INT wired to MOTION_INT_PIN (config.ini)
+MOTION_WAKE_THRESHOLD_MG = 60     # High-passed acceleration that counts as motion (config.ini)
+MOTION_WAKE_DURATION_MS = 1       # Samples above threshold before the INT fires
+MOTION_ACTIVE_HOLD_S = 3.0        # Full-rate sampling kept after each wake-up
+MOTION_SANITY_INTERVAL_S = 5.0    # Max idle wait before a sanity read of the sensor
+
+# File paths (directories are created when first written, not at import)
 LOG_DIR = os.path.join(os.path.expanduser("~"), ".patient_monitor")
-os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "patient_monitor.log")
+LOG_FILE_MAX_BYTES = 2 * 1024 * 1024   # Then rotated, keeping LOG_FILE_BACKUPS old files
+LOG_FILE_BACKUPS = 3
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".config/patient_monitor")
-os.makedirs(CONFIG_DIR, exist_ok=True)
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.ini")
+CONFIG_POLL_S = 2.0               # How often config.ini is checked for edits
+UPLINK_SPOOL_FILE = os.path.join(LOG_DIR, "uplink.spool")  # Unsent telemetry (survives restarts)
+ACTIVITY_FILE = os.path.join(LOG_DIR, "activity.jsonl")   # Hourly activity records
+ACTIVITY_FILE_MAX_BYTES = 1024 * 1024   # Then rotated to activity.jsonl.1 (~4 months each)
+
+# Periodic Jobs (timer wheel on the monotonic clock)
+TIMER_TICK_S = 0.1                # Wheel resolution
+HEARTBEAT_INTERVAL_S = 60         # Health log (config.ini)
+LOCATION_UPDATE_INTERVAL_S = 1800  # Location SMS to the caregiver (needs a GPS fix; SMS LOCATE asks any time; config.ini)
+GPS_WATCHDOG_INTERVAL_S = 30      # Warn if the GPS sent nothing for this long
+GPS_STATUS_INTERVAL_S = 30        # GPS fix/satellite status log
+ACTIVITY_CHECK_S = 60             # Store/send finished activity hours
+
+# Split-Process Mode (sampling in its own process, see --split-process)
+SAMPLE_RING_CAPACITY = 4096   # Shared-memory slots (~80s at 50 Hz)
+SUPERVISOR_POLL_S = 0.05      # How often the supervisor drains the ring
+SAMPLER_STALL_S = 15.0        # Restart the sampler if it publishes nothing for this long
+
+# Asyncio Runtime (see --runtime asyncio)
+SMS_SEND_TIMEOUT_S = 180      # Give up on one SMS (all retries) after this long
+GPS_POLL_INTERVAL_S = 0.2     # Software-serial GPS reads (pigpio has no fd to wait on)
+
+# Flight Recorder (black box of full-rate sensor data)
+RECORDER_FILE = os.path.join(LOG_DIR, "flight_recorder.ring")
+RECORDER_SNAPSHOT_DIR = os.path.join(LOG_DIR, "snapshots")
+RECORDER_CAPACITY = 8192   # ~160s of 50 Hz IMU samples plus GPS fixes (320 KiB)
+RECORDER_PRE_TRIGGER_S = 10.0   # Seconds kept before an alert
+RECORDER_POST_TRIGGER_S = 5.0   # Seconds kept after an alert
 
 def setup_logging():
     """Configure logging to both file and console with fallback to stderr"""
@@ -99,7 +228,8 @@ def setup_logging():
         
         # File handler
         try:
-            file_handler = logging.FileHandler(LOG_FILE)
+            file_handler = logging.handlers.RotatingFileHandler(
+                LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS)
             file_handler.setFormatter(log_formatter)
             # Set file permissions (rw-r-----)
             try:
@@ -127,8 +257,69 @@ def setup_logging():
     
     return logger
 
-# Initialize logger
-logger = setup_logging()
+# Handlers are attached by setup_logging() at startup; importing stays side-effect free
+logger = logging.getLogger("PatientMonitor")
+
+def resident_kib():
+    """Resident set size of this process in KiB (None without /proc)"""
+    try:
+        fd = os.open('/proc/self/statm', os.O_RDONLY)
+        try:
+            pages = int(os.read(fd, 128).split()[1])
+        finally:
+            os.close(fd)
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+def config_defaults():
+    """Module constants as config.ini defaults (names as in monitor_config.Config)"""
+    return {
+        'patient_id': PATIENT_ID,
+        'patient_caregiver_phone': CAREGIVER_PHONE,
+        'patient_command_numbers': COMMAND_NUMBERS,
+        'patient_country_code': COUNTRY_CODE,
+        'fall_threshold_g': FALL_THRESHOLD_G,
+        'fall_duration_ms': FALL_DURATION_MS,
+        'fall_reset_window_s': FALL_RESET_WINDOW_S,
+        'fall_posture_confirm_s': POSTURE_CONFIRM_S,
+        'fall_posture_timeout_s': POSTURE_TIMEOUT_S,
+        'alerts_cooldown_s': ALERT_COOLDOWN,
+        'sampling_active_rate_hz': SAMPLE_RATE,
+        'sampling_idle_rate_hz': IDLE_SAMPLE_RATE,
+        'schedule_heartbeat_interval_s': HEARTBEAT_INTERVAL_S,
+        'schedule_location_interval_s': LOCATION_UPDATE_INTERVAL_S,
+        'button_long_press_s': BUTTON_LONG_PRESS_S,
+        'logging_level': 'INFO',
+        'hardware_motion_wake': MOTION_WAKE_ENABLED,
+        'hardware_motion_wake_threshold_mg': MOTION_WAKE_THRESHOLD_MG,
+        'uplink_url': UPLINK_URL,
+        'uplink_transport': UPLINK_TRANSPORT,
+        'uplink_apn': UPLINK_APN,
+        'uplink_token': UPLINK_TOKEN,
+        'uplink_batch_bytes': UPLINK_BATCH_BYTES,
+        'uplink_max_age_s': UPLINK_MAX_AGE_S,
+        'ble_enabled': BLE_ENABLED,
+        'ble_address': BLE_ADDRESS,
+        'ble_window_s': VITALS_WINDOW_S,
+    }
+
+def detector_params(config, profile=None):
+    """FallDetector settings from a config snapshot, capped by a power profile's rates"""
+    params = {
+        'idle_rate': config.sampling_idle_rate_hz,
+        'active_rate': config.sampling_active_rate_hz,
+        'threshold_g': config.fall_threshold_g,
+        'duration_ms': config.fall_duration_ms,
+        'reset_window_s': config.fall_reset_window_s,
+        'confirm_cooldown_s': config.alerts_cooldown_s,
+        'posture_confirm_s': config.fall_posture_confirm_s,
+        'posture_timeout_s': config.fall_posture_timeout_s,
+    }
+    if profile is not None:
+        params['idle_rate'] = min(params['idle_rate'], profile.idle_rate)
+        params['active_rate'] = min(params['active_rate'], profile.active_rate)
+    return params
 
 # --- CORE CLASSES ---
 
@@ -159,19 +350,12 @@ class HardwareManager:
             GPIO.setup(LED_PIN, GPIO.OUT)
             GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
             
-            # Turn off buzzer initially
+            # Turn off buzzer initially (the startup blink is played by the Annunciator)
             GPIO.output(BUZZER_PIN, GPIO.LOW)
-            # Blink LED to indicate startup
-            for _ in range(3):
-                GPIO.output(LED_PIN, GPIO.HIGH)
-                time.sleep(0.2)
-                GPIO.output(LED_PIN, GPIO.LOW)
-                time.sleep(0.2)
+            GPIO.output(LED_PIN, GPIO.LOW)
             
-            # Initialize GSM module
-            HardwareManager.reset_gsm()
-                
-            logger.info("GPIO and GSM initialization complete")
+            # The GSM reset pulse takes seconds; GSMHandler does it in the background
+            logger.info("GPIO initialization complete")
             return True
             
         except Exception as e:
@@ -200,13 +384,304 @@ class HardwareManager:
         return HardwareManager.reset_gsm()
 
 
+# pigpiod has one waveform transmitter and one shared buffer for building
+# waves, across every connection. Anything that builds or sends a wave holds
+# WAVE_LOCK, and nobody calls wave_clear() once the monitor is running.
+WAVE_LOCK = threading.RLock()
+_wave_owner = None  # Annunciator playing background patterns, if any
+
+
+def send_serial_wave(pi, gpio, baud, data, poll_s=0.01):
+    """Bit-bang `data` out of `gpio` as a one-shot wave; blocks until sent"""
+    with WAVE_LOCK:
+        owner = _wave_owner
+        if owner:
+            owner.pause_for_serial()  # Sending a wave would cut its pattern anyway
+        try:
+            pi.wave_add_serial(gpio, baud, data)
+            wid = pi.wave_create()
+            if wid < 0:
+                return False
+            pi.wave_send_once(wid)
+            while pi.wave_tx_busy():
+                time.sleep(poll_s)
+            pi.wave_delete(wid)
+            return True
+        finally:
+            if owner:
+                owner.resume_after_serial()
+
+
+class Annunciator:
+    """Named buzzer/LED patterns with priority preemption
+
+    With pigpio every pattern is built once as a DMA waveform, so playing it
+    costs no Python wake-ups: repeating patterns loop in pigpiod and a one-shot
+    only needs one timer at its end to restore whatever it interrupted. Without
+    pigpio a single background thread toggles the pins instead. GPIO23/25 are
+    not hardware-PWM pins, so the buzzer is an active one gated on and off.
+
+    Repeating patterns are states (on until stopped); one-shots are events. The
+    most urgent (lowest priority number) of the active states and the pending
+    event plays; a less urgent event arriving meanwhile is dropped.
+    """
+    # name: (priority, repeats, [(buzzer, led, ms), ...])
+    PATTERNS = {
+        'fall':        (0, True,  [(1, 1, 250), (0, 0, 250)]),
+        'panic':       (1, False, [(1, 1, 100), (0, 0, 100)] * 3),
+        'cancel':      (2, False, [(1, 1, 600), (0, 0, 10)]),
+        'ack':         (2, False, [(1, 1, 50), (0, 0, 10)]),
+        'failed':      (3, False, [(1, 1, 600), (0, 0, 200)] * 3),
+        'sent':        (4, False, [(1, 1, 80), (0, 0, 80), (1, 1, 80), (0, 0, 10)]),
+        'sending':     (5, True,  [(0, 1, 100), (0, 0, 400)]),
+        'low_battery': (6, True,  [(1, 1, 50), (0, 0, 100), (1, 1, 50), (0, 0, 29800)]),
+        'gps_lost':    (7, True,  [(0, 1, 50), (0, 0, 2950)]),
+        'startup':     (8, False, [(0, 1, 200), (0, 0, 200)] * 3),
+    }
+
+    def __init__(self, buzzer_pin=BUZZER_PIN, led_pin=LED_PIN):
+        self.buzzer_pin = buzzer_pin
+        self.led_pin = led_pin
+        self.lock = threading.RLock()
+        self.states = set()
+        self.event = None
+        self.token = 0       # Bumped per event so a stale end-timer is ignored
+        self.playing = None
+        self.pi = None
+        self.wids = {}
+        self._timer = None
+        self._wake = threading.Event()
+        if not self._setup_waves():
+            threading.Thread(target=self._run_fallback, name="annunciator", daemon=True).start()
+            logger.info("Annunciator using a GPIO thread (pigpio unavailable)")
+
+    def _setup_waves(self):
+        global _wave_owner
+        if not PIGPIO_AVAILABLE:
+            return False
+        try:
+            self.pi = pigpio.pi()
+            if not self.pi.connected:
+                self.pi = None
+                return False
+            for pin in (self.buzzer_pin, self.led_pin):
+                self.pi.set_mode(pin, pigpio.OUTPUT)
+                self.pi.write(pin, 0)
+            with WAVE_LOCK:
+                for name, (_, _, segments) in self.PATTERNS.items():
+                    pulses = []
+                    for buzz, led, ms in segments:
+                        on = off = 0
+                        for pin, level in ((self.buzzer_pin, buzz), (self.led_pin, led)):
+                            if level:
+                                on |= 1 << pin
+                            else:
+                                off |= 1 << pin
+                        pulses.append(pigpio.pulse(on, off, ms * 1000))
+                    self.pi.wave_add_generic(pulses)
+                    wid = self.pi.wave_create()
+                    if wid < 0:
+                        raise RuntimeError(f"wave_create failed for '{name}' ({wid})")
+                    self.wids[name] = wid
+                _wave_owner = self
+            logger.info(f"Annunciator ready: {len(self.wids)} pigpio waveforms")
+            return True
+        except Exception as e:
+            logger.warning(f"Annunciator waveforms unavailable: {e}")
+            self._delete_waves()
+            return False
+
+    # --- Public API (safe from any thread) ---
+
+    def play(self, name):
+        """Start a pattern: a state for repeating patterns, else a one-shot event"""
+        with self.lock:
+            if self.PATTERNS[name][1]:
+                self.states.add(name)
+            elif self.event is None or self._priority(name) <= self._priority(self.event):
+                self.event = name
+                self.token += 1
+                self.playing = None  # Restart even if the same event is playing
+            self._update()
+
+    def stop(self, name):
+        with self.lock:
+            self.states.discard(name)
+            if self.event == name:
+                self.event = None
+            self._update()
+
+    def set_state(self, name, active):
+        if active:
+            if name not in self.states:
+                self.play(name)
+        elif name in self.states:
+            self.stop(name)
+
+    # --- Scheduling ---
+
+    def _priority(self, name):
+        return self.PATTERNS[name][0]
+
+    def _update(self):
+        candidates = list(self.states) + ([self.event] if self.event else [])
+        target = min(candidates, key=self._priority) if candidates else None
+        if self.event and target != self.event:
+            self.event = None  # Outranked by an active state: drop it
+        if target == self.playing:
+            return
+        self.playing = target
+        self._start(target)
+
+    def _start(self, name):
+        if self.pi is None:
+            self._wake.set()
+            return
+        with WAVE_LOCK:
+            try:
+                self.pi.wave_tx_stop()
+                self._pins_low()
+                if name is None:
+                    return
+                if self.PATTERNS[name][1]:
+                    self.pi.wave_send_repeat(self.wids[name])
+                else:
+                    self.pi.wave_send_once(self.wids[name])
+                    self._arm_end_timer(name)
+            except Exception as e:
+                logger.debug(f"Annunciator pattern '{name}' failed: {e}")
+
+    def _arm_end_timer(self, name):
+        if self._timer:
+            self._timer.cancel()
+        duration_s = sum(ms for _, _, ms in self.PATTERNS[name][2]) / 1000
+        self._timer = threading.Timer(duration_s, self._finished, args=(self.token,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _finished(self, token):
+        with self.lock:
+            if token == self.token and self.event:
+                self.event = None
+                self._update()
+
+    def _pins_low(self):
+        self.pi.write(self.buzzer_pin, 0)
+        self.pi.write(self.led_pin, 0)
+
+    # --- Sharing the wave transmitter with serial TX (WAVE_LOCK held) ---
+
+    def pause_for_serial(self):
+        if self.playing:
+            self.pi.wave_tx_stop()
+            self._pins_low()
+
+    def resume_after_serial(self):
+        name = self.playing
+        if name and self.PATTERNS[name][1]:
+            self.pi.wave_send_repeat(self.wids[name])
+        # An interrupted one-shot is simply cut short; its end timer still fires
+
+    # --- Fallback without pigpio ---
+
+    def _run_fallback(self):
+        while True:
+            self._wake.clear()
+            with self.lock:
+                name, token = self.playing, self.token
+            if name is None:
+                self._wake.wait()
+                continue
+            _, repeats, segments = self.PATTERNS[name]
+            interrupted = False
+            try:
+                for buzz, led, ms in segments:
+                    GPIO.output(self.buzzer_pin, GPIO.HIGH if buzz else GPIO.LOW)
+                    GPIO.output(self.led_pin, GPIO.HIGH if led else GPIO.LOW)
+                    if self._wake.wait(ms / 1000):
+                        interrupted = True  # Preempted
+                        break
+                GPIO.output(self.buzzer_pin, GPIO.LOW)
+                GPIO.output(self.led_pin, GPIO.LOW)
+            except Exception as e:
+                logger.debug(f"Annunciator GPIO failed: {e}")
+                self._wake.wait(1)
+            if not interrupted and not repeats:
+                self._finished(token)
+
+    def _delete_waves(self):
+        global _wave_owner
+        if self.pi is None:
+            return
+        with WAVE_LOCK:
+            if _wave_owner is self:
+                _wave_owner = None
+            try:
+                self.pi.wave_tx_stop()
+                self._pins_low()
+                for wid in self.wids.values():
+                    self.pi.wave_delete(wid)
+            except Exception:
+                pass
+            self.wids = {}
+
+    def cleanup(self):
+        if self._timer:
+            self._timer.cancel()
+        self._delete_waves()
+        if self.pi:
+            try:
+                self.pi.stop()
+            except Exception:
+                pass
+            self.pi = None
+
+
+class CircuitBreaker:
+    """Stops a failing device from eating the sampling loop
+
+    Closed: calls go through. After `failure_threshold` consecutive failed
+    recoveries it opens and `allow()` returns False until an exponentially
+    growing back-off expires; the next call is then a half-open probe.
+    """
+
+    def __init__(self, failure_threshold=2, base_backoff_s=1.0, max_backoff_s=60.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff_s = base_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = 0
+
+    @property
+    def is_open(self):
+        return self.failures >= self.failure_threshold
+
+    def allow(self, now):
+        return not self.is_open or now >= self.retry_at
+
+    def success(self):
+        self.failures = 0
+        self.trips = 0
+
+    def failure(self, now):
+        """Record a failure; returns the back-off in seconds if the breaker opened"""
+        self.failures += 1
+        if not self.is_open:
+            return 0
+        backoff = min(self.max_backoff_s, self.base_backoff_s * (2 ** self.trips))
+        self.trips += 1
+        self.retry_at = now + backoff
+        return backoff
+
+
 class I2CManager:
-    """Manages I2C communication with automatic recovery"""
+    """Manages the I2C bus; recovery policy lives in the device wrappers"""
     
     def __init__(self):
         self.bus = None
-        self.lock = threading.Lock()
-        self.initialize()
+        self.lock = threading.RLock()  # Re-entrant: read/write may (re)initialize
+        self.initialize(scan=True)
         atexit.register(self.cleanup)
         
     def get_bus(self):
@@ -216,8 +691,8 @@ class I2CManager:
                 return None
             return self.bus
 
-    def initialize(self):
-        """Initialize or reinitialize I2C bus"""
+    def initialize(self, scan=False):
+        """Initialize or reinitialize I2C bus (device scan only when asked)"""
         with self.lock:
             try:
                 if self.bus:
@@ -233,14 +708,16 @@ class I2CManager:
                     frequency=400000  # 400kHz
                 )
                 
-                # Test the bus
-                while not self.bus.try_lock():
-                    pass
-                try:
-                    devices = self.bus.scan()
-                    logger.info(f"I2C devices found: {[hex(addr) for addr in devices]}")
-                finally:
-                    self.bus.unlock()
+                # Test the bus (startup only - a scan costs ~100 ms)
+                if scan:
+                    if self._try_lock(0.5):
+                        try:
+                            devices = self.bus.scan()
+                            logger.info(f"I2C devices found: {[hex(addr) for addr in devices]}")
+                        finally:
+                            self.bus.unlock()
+                    else:
+                        logger.warning("I2C bus busy - skipping device scan")
                 
                 logger.info("I2C bus initialized at 400kHz")
                 return True
@@ -249,9 +726,69 @@ class I2CManager:
                 logger.error(f"I2C initialization failed: {e}")
                 self.bus = None
                 return False
+
+    def _try_lock(self, timeout):
+        """Bounded wait for the bus lock instead of spinning forever"""
+        deadline = time.monotonic() + timeout
+        while not self.bus.try_lock():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def unstick_bus(self):
+        """Clock SCL until a slave holding SDA low lets go, send STOP, then reinit"""
+        with self.lock:
+            if self.bus:
+                try:
+                    self.bus.deinit()
+                except:
+                    pass
+                self.bus = None
+
+            pi = None
+            try:
+                if PIGPIO_AVAILABLE:
+                    pi = pigpio.pi()
+                    if not pi.connected:
+                        pi = None
+                if pi is None:
+                    logger.warning("pigpio unavailable - skipping SCL clock-out")
+                else:
+                    pi.set_mode(I2C_SDA_PIN, pigpio.INPUT)
+                    pi.set_mode(I2C_SCL_PIN, pigpio.OUTPUT)
+                    pulses = 0
+                    for pulses in range(9):
+                        if pi.read(I2C_SDA_PIN):
+                            break  # SDA released
+                        pi.write(I2C_SCL_PIN, 0)
+                        time.sleep(0.00001)
+                        pi.write(I2C_SCL_PIN, 1)
+                        time.sleep(0.00001)
+                    # STOP condition: SDA rises while SCL is high
+                    pi.set_mode(I2C_SDA_PIN, pigpio.OUTPUT)
+                    pi.write(I2C_SDA_PIN, 0)
+                    time.sleep(0.00001)
+                    pi.write(I2C_SCL_PIN, 1)
+                    time.sleep(0.00001)
+                    pi.write(I2C_SDA_PIN, 1)
+                    logger.info(f"I2C bus clock-out done ({pulses} pulses)")
+            except Exception as e:
+                logger.warning(f"I2C clock-out failed: {e}")
+            finally:
+                if pi is not None:
+                    # Hand the pins back to the I2C peripheral
+                    try:
+                        pi.set_mode(I2C_SDA_PIN, pigpio.ALT0)
+                        pi.set_mode(I2C_SCL_PIN, pigpio.ALT0)
+                        pi.stop()
+                    except:
+                        pass
+
+            return self.initialize()
     
     def read_register(self, device, register, length):
-        """Thread-safe I2C read"""
+        """Thread-safe I2C read; returns None on error"""
         with self.lock:
             if not self.bus and not self.initialize():
                 return None
@@ -263,9 +800,21 @@ class I2CManager:
                 return result
             except Exception as e:
                 logger.error(f"I2C read failed: {e}")
-                self.bus = None
                 return None
     
+    def write_register(self, device, register, value):
+        """Thread-safe I2C single-byte write"""
+        with self.lock:
+            if not self.bus and not self.initialize():
+                return False
+
+            try:
+                self.bus.writeto(device, bytes([register, value & 0xFF]))
+                return True
+            except Exception as e:
+                logger.error(f"I2C write failed: {e}")
+                return False
+
     def cleanup(self):
         """Clean up resources"""
         self.running = False
@@ -285,11 +834,41 @@ class I2CManager:
             pass
         logging.info("System shutdown complete")
 
+class ImuSample:
+    """One IMU reading (accel in m/s^2, gyro in rad/s, temp in C, mag in g)
+
+    Slots instead of a dict: tens of these are made every second for as
+    long as the monitor runs.
+    """
+    __slots__ = ('accel', 'gyro', 'temp', 'mag', 'ok', 'ts')
+
+    def __init__(self, accel=None, gyro=None, temp=0.0, mag=0.0, ok=False, ts=0.0):
+        self.accel = accel
+        self.gyro = gyro
+        self.temp = temp
+        self.mag = mag
+        self.ok = ok
+        self.ts = ts
+
+
 class MPU6050Sensor:
-    """Robust MPU6050 wrapper with retry and bus-recovery logic"""
+    """Robust MPU6050 wrapper with tiered recovery and a circuit breaker
+
+    On a failed read: 1) retry the transaction, 2) soft-reset the chip by
+    re-running its init sequence, 3) clock out a stuck bus and reinit it.
+    If every tier fails the breaker opens and reads return immediately until
+    the back-off expires, so a dead sensor cannot stall the loop.
+    """
     def __init__(self, i2c_manager):
         self.i2c = i2c_manager
         self.sensor = None
+        self.setup_count = 0  # Bumped on every (re)initialisation, which resets the chip
+        self.breaker = CircuitBreaker()
+        self.stats = {
+            'retries': 0, 'soft_resets': 0, 'bus_reinits': 0,
+            'recoveries': 0, 'failures': 0, 'trips': 0,
+            'recovery_ms_total': 0.0, 'recovery_ms_max': 0.0,
+        }
         self._setup()
 
     def _setup(self):
@@ -303,6 +882,7 @@ class MPU6050Sensor:
             
             # Test read to verify connection
             _ = self.sensor.acceleration
+            self.setup_count += 1
             logger.info("MPU6050 initialized successfully")
             return True
             
@@ -311,36 +891,355 @@ class MPU6050Sensor:
             self.sensor = None
             return False
 
+    def _read(self):
+        a = self.sensor.acceleration
+        g = self.sensor.gyro
+        t = self.sensor.temperature
+        mag = accel_magnitude_g(a)
+        
+        return ImuSample(a, g, t, mag, True)
+
     def read_all(self):
         """Read Accel, Gyro, and Temp in one robust block"""
-        for attempt in range(2):
+        started = time.monotonic()
+        if not self.breaker.allow(started):
+            return ImuSample()
+        
+        if self.sensor:
             try:
-                if not self.sensor:
-                    if not self._setup():
-                        time.sleep(0.1)
-                        continue
-                
-                a = self.sensor.acceleration
-                g = self.sensor.gyro
-                t = self.sensor.temperature
-                mag = math.sqrt(a[0]**2 + a[1]**2 + a[2]**2) / 9.80665
-                
-                return {
-                    'accel': a, 'gyro': g, 'temp': t, 'mag': mag, 'ok': True
-                }
+                data = self._read()
+                self.breaker.success()
+                return data
             except (OSError, Exception) as e:
-                logger.warning(f"I2C Read Error (attempt {attempt+1}): {e}")
-                self.sensor = None
-                if attempt == 1:
-                    logger.info("Triggering I2C Bus Recovery...")
-                    self.i2c.initialize()
-                time.sleep(0.05)
+                logger.warning(f"I2C Read Error: {e}")
         
-        return {'mag': 0.0, 'ok': False}
+        return self._recover(started)
+
+    def _recover(self, started):
+        """Escalate through the recovery tiers until a read succeeds"""
+        tiers = (
+            ('retries', self._retry),
+            ('soft_resets', self._setup),
+            ('bus_reinits', self._reinit_bus),
+        )
+        for name, tier in tiers:
+            try:
+                self.stats[name] += 1
+                if tier():
+                    data = self._read()
+                    elapsed_ms = (time.monotonic() - started) * 1000
+                    self.stats['recoveries'] += 1
+                    self.stats['recovery_ms_total'] += elapsed_ms
+                    self.stats['recovery_ms_max'] = max(self.stats['recovery_ms_max'], elapsed_ms)
+                    logger.info(f"MPU6050 recovered via {name} in {elapsed_ms:.0f}ms")
+                    self.breaker.success()
+                    return data
+            except (OSError, Exception) as e:
+                logger.warning(f"I2C recovery step '{name}' failed: {e}")
+        
+        self.stats['failures'] += 1
+        backoff = self.breaker.failure(time.monotonic())
+        if backoff:
+            self.stats['trips'] += 1
+            logger.error(f"MPU6050 unreachable - circuit open, next attempt in {backoff:.0f}s")
+        return ImuSample()
+
+    def _retry(self):
+        if not self.sensor:
+            return False
+        time.sleep(0.002)  # Let a glitch on the line settle
+        return True
+
+    def _reinit_bus(self):
+        logger.info("Triggering I2C Bus Recovery...")
+        self.sensor = None
+        return self.i2c.unstick_bus() and self._setup()
+
+    def recovery_summary(self):
+        """One-line recovery statistics for the heartbeat log"""
+        st = self.stats
+        avg = st['recovery_ms_total'] / st['recoveries'] if st['recoveries'] else 0.0
+        return (f"I2C retries={st['retries']} resets={st['soft_resets']} "
+                f"bus_reinits={st['bus_reinits']} recovered={st['recoveries']} "
+                f"failed={st['failures']} trips={st['trips']} "
+                f"avg={avg:.0f}ms max={st['recovery_ms_max']:.0f}ms")
+
+class MotionWake:
+    """Sleeps the sampling loop until the MPU6050 motion interrupt fires"""
+    # MPU6050 registers used for motion detection
+    REG_ACCEL_CONFIG = 0x1C
+    REG_MOT_THR = 0x1F
+    REG_MOT_DUR = 0x20
+    REG_INT_PIN_CFG = 0x37
+    REG_INT_ENABLE = 0x38
+    REG_INT_STATUS = 0x3A
+    REG_MOT_DETECT_CTRL = 0x69
+
+    def __init__(self, imu, pin=MOTION_INT_PIN, threshold_mg=MOTION_WAKE_THRESHOLD_MG,
+                 duration_ms=MOTION_WAKE_DURATION_MS):
+        self.imu = imu
+        self.i2c = imu.i2c
+        self.pin = pin
+        self.threshold_mg = threshold_mg
+        self.duration_ms = duration_ms
+        self.event = threading.Event()
+        self.last_edge = 0
+        self.wakeups = 0
+        self.pi = None
+        self._cb = None
+        self._configured_for = None
+        self.ready = self._setup_edge_detection() and self.configure()
+
+    def _setup_edge_detection(self):
+        """Register a rising-edge callback on the INT pin"""
+        try:
+            if PIGPIO_AVAILABLE:
+                self.pi = pigpio.pi()
+                if self.pi.connected:
+                    self.pi.set_mode(self.pin, pigpio.INPUT)
+                    self.pi.set_pull_up_down(self.pin, pigpio.PUD_DOWN)
+                    self._cb = self.pi.callback(self.pin, pigpio.RISING_EDGE, self._on_edge)
+                    logger.info(f"Motion wake using pigpio callback on GPIO{self.pin}")
+                    return True
+                self.pi = None
+            GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+            GPIO.add_event_detect(self.pin, GPIO.RISING, callback=self._on_edge)
+            logger.info(f"Motion wake using RPi.GPIO edge detect on GPIO{self.pin}")
+            return True
+        except Exception as e:
+            logger.error(f"Motion wake edge detection failed: {e}")
+            return False
+
+    def _on_edge(self, *args):
+        self.last_edge = time.monotonic()
+        self.event.set()
+
+    def configure(self):
+        """Program motion detection; needed again after every MPU6050 reset"""
+        addr = MPU6050_ADDR
+        try:
+            cfg = self.i2c.read_register(addr, self.REG_ACCEL_CONFIG, 1)
+            if cfg is None:
+                return False
+            # 5 Hz high-pass on the motion path only (data registers are unaffected)
+            steps = [
+                (self.REG_ACCEL_CONFIG, (cfg[0] & 0xF8) | 0x01),
+                (self.REG_MOT_THR, max(1, min(255, self.threshold_mg // 2))),  # 2 mg/LSB
+                (self.REG_MOT_DUR, max(1, min(255, self.duration_ms))),        # 1 ms/LSB
+                (self.REG_MOT_DETECT_CTRL, 0x15),    # Accel on-delay + decrement counters
+                (self.REG_INT_PIN_CFG, 0x30),        # Active high, latched, cleared by any read
+                (self.REG_INT_ENABLE, 0x40),         # Motion interrupt only
+            ]
+            for reg, value in steps:
+                if not self.i2c.write_register(addr, reg, value):
+                    return False
+            self._configured_for = self.imu.setup_count
+            logger.info(f"MPU6050 motion interrupt armed: {self.threshold_mg}mg / {self.duration_ms}ms")
+            return True
+        except Exception as e:
+            logger.error(f"Motion interrupt configuration failed: {e}")
+            return False
+
+    def wait(self, timeout):
+        """Block until motion is reported or `timeout` elapses; True on motion"""
+        if self._configured_for != self.imu.setup_count and not self.configure():
+            time.sleep(min(timeout, 0.2))  # Fall back to plain polling this round
+            return False
+        self.event.clear()
+        # Reading INT_STATUS releases a latched INT so the next motion makes a fresh edge
+        self.i2c.read_register(MPU6050_ADDR, self.REG_INT_STATUS, 1)
+        woke = self.event.wait(timeout)
+        if woke:
+            self.wakeups += 1
+            self.i2c.read_register(MPU6050_ADDR, self.REG_INT_STATUS, 1)
+        return woke
+
+    def cleanup(self):
+        try:
+            if self._cb:
+                self._cb.cancel()
+            elif self.pi is None:
+                GPIO.remove_event_detect(self.pin)
+            if self.pi:
+                self.pi.stop()
+        except:
+            pass
+
+
+class EmergencyButton:
+    """Debounced panic button on interrupts: press, long-press and release events
+
+    Edges come from a pigpio callback behind the hardware glitch filter, or
+    from RPi.GPIO edge detection with a bouncetime. Callbacks run on the GPIO
+    library's thread (the long-press check on a timer thread) and receive the
+    monotonic time of the press edge so callers can measure latency.
+    """
+    def __init__(self, on_press, on_long_press=None, on_release=None, pin=BUTTON_PIN,
+                 glitch_us=BUTTON_GLITCH_US, bounce_ms=BUTTON_BOUNCE_MS,
+                 long_press_s=BUTTON_LONG_PRESS_S):
+        self.on_press = on_press
+        self.on_long_press = on_long_press
+        self.on_release = on_release
+        self.pin = pin
+        self.glitch_us = glitch_us
+        self.bounce_ms = bounce_ms
+        self.long_press_s = long_press_s
+        self.pressed = False
+        self.pressed_at = 0
+        self.press_id = 0
+        self.pi = None
+        self._cb = None
+        self._hold_timer = None
+        self.stats = {'presses': 0, 'long_presses': 0, 'latency_ms_last': 0.0, 'latency_ms_max': 0.0}
+        self.ready = self._setup_edge_detection()
+
+    def _setup_edge_detection(self):
+        try:
+            if PIGPIO_AVAILABLE:
+                self.pi = pigpio.pi()
+                if self.pi.connected:
+                    self.pi.set_mode(self.pin, pigpio.INPUT)
+                    self.pi.set_pull_up_down(self.pin, pigpio.PUD_UP)
+                    self.pi.set_glitch_filter(self.pin, self.glitch_us)
+                    self._cb = self.pi.callback(self.pin, pigpio.EITHER_EDGE, self._on_pigpio_edge)
+                    logger.info(f"Emergency button on GPIO{self.pin} (pigpio, {self.glitch_us}us glitch filter)")
+                    return True
+                self.pi = None
+            GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            GPIO.add_event_detect(self.pin, GPIO.BOTH, callback=self._on_gpio_edge,
+                                  bouncetime=self.bounce_ms)
+            logger.info(f"Emergency button on GPIO{self.pin} (RPi.GPIO, {self.bounce_ms}ms bouncetime)")
+            return True
+        except Exception as e:
+            logger.error(f"Emergency button setup failed: {e}")
+            return False
+
+    def _on_pigpio_edge(self, gpio, level, tick):
+        # Backdate to the edge itself: the tick is latched by pigpiod when it happens
+        try:
+            lag_us = pigpio.tickDiff(tick, self.pi.get_current_tick())
+        except Exception:
+            lag_us = 0
+        self._edge(level == 0, time.monotonic() - lag_us / 1e6)
+
+    def _on_gpio_edge(self, channel):
+        # bouncetime can swallow one edge of a pair, so go by the current level
+        self._edge(GPIO.input(self.pin) == GPIO.LOW, time.monotonic())
+
+    def _edge(self, down, t):
+        if down == self.pressed:
+            return  # Repeated level after filtering
+        self.pressed = down
+        if down:
+            self.pressed_at = t
+            self.press_id += 1
+            self.stats['presses'] += 1
+            self._hold_timer = threading.Timer(self.long_press_s, self._check_hold, args=(self.press_id,))
+            self._hold_timer.daemon = True
+            self._hold_timer.start()
+            self._call(self.on_press, t)
+        else:
+            if self._hold_timer:
+                self._hold_timer.cancel()
+            if self.on_release:
+                self._call(self.on_release, self.pressed_at, t - self.pressed_at)
+
+    def _check_hold(self, press_id):
+        # Still the same press and still held down: fire without waiting for release
+        if self.pressed and press_id == self.press_id:
+            self.stats['long_presses'] += 1
+            if self.on_long_press:
+                self._call(self.on_long_press, self.pressed_at)
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Emergency button handler failed: {e}")
+
+    def record_latency(self, pressed_at):
+        """Note how long a press took to reach the modem queue"""
+        ms = (time.monotonic() - pressed_at) * 1000
+        self.stats['latency_ms_last'] = ms
+        self.stats['latency_ms_max'] = max(self.stats['latency_ms_max'], ms)
+        logger.info(f"Button alert queued {ms:.1f}ms after press")
+        return ms
+
+    def summary(self):
+        st = self.stats
+        return (f"Button presses={st['presses']} long={st['long_presses']} "
+                f"latency last={st['latency_ms_last']:.1f}ms max={st['latency_ms_max']:.1f}ms")
+
+    def cleanup(self):
+        try:
+            if self._hold_timer:
+                self._hold_timer.cancel()
+            if self._cb:
+                self._cb.cancel()
+                self.pi.set_glitch_filter(self.pin, 0)
+            elif self.pi is None:
+                GPIO.remove_event_detect(self.pin)
+            if self.pi:
+                self.pi.stop()
+        except:
+            pass
+
+
+class BatteryMonitor:
+    """Cell voltage from an MCP3008 channel over SPI"""
+    def __init__(self, channel=BATTERY_ADC_PIN, bus=BATTERY_SPI_BUS, device=BATTERY_SPI_DEVICE):
+        self.channel = channel
+        self.spi = None
+        self.ready = False
+        if not SPIDEV_AVAILABLE:
+            logger.warning("spidev not available - battery monitoring disabled")
+            return
+        try:
+            self.spi = spidev.SpiDev()
+            self.spi.open(bus, device)
+            self.spi.max_speed_hz = 1000000
+            self.spi.mode = 0
+            self.ready = self.read_volts() is not None
+            if not self.ready:
+                logger.warning(f"No battery voltage on MCP3008 channel {channel} - check the divider")
+        except Exception as e:
+            logger.error(f"Battery ADC initialization failed: {e}")
+
+    def read_volts(self, samples=BATTERY_BURST):
+        """Median of a short burst of conversions; None if unreadable"""
+        codes = []
+        try:
+            for _ in range(samples):
+                # Start bit, single-ended channel select, then clock out 10 bits
+                r = self.spi.xfer2([1, (8 + self.channel) << 4, 0])
+                codes.append(((r[1] & 3) << 8) | r[2])
+        except Exception as e:
+            logger.warning(f"Battery read failed: {e}")
+            return None
+        codes.sort()
+        code = codes[len(codes) // 2]  # Median shrugs off GSM transmit sag
+        if code == 0:
+            return None  # Floating or unwired input
+        return code * BATTERY_VREF / 1023 * BATTERY_DIVIDER
+
+    def cleanup(self):
+        try:
+            if self.spi:
+                self.spi.close()
+        except:
+            pass
+
+
+GpsFix = collections.namedtuple('GpsFix', 'lat lon t')  # Indexable like the (lat, lon, t) tuple it replaced
+
 
 class GPSHandler(threading.Thread):
-    """Non-blocking background GPS tracker using software serial"""
-    def __init__(self, port=None, baud=9600):
+    """Non-blocking background GPS tracker using software serial
+
+    With open_port=False nothing is opened and only `feed` brings in data
+    (soak_test.py drives the parser that way, on its own clock).
+    """
+    def __init__(self, port=None, baud=9600, open_port=True, clock=time.time):
         self._rx_pin = 10  # GPIO10 (Pin 19) - GPS RX
         self._tx_pin = 8   # GPIO8 (Pin 24) - GPS TX
         self._baud = baud
@@ -352,6 +1251,16 @@ class GPSHandler(threading.Thread):
         self.location = None
         self.lock = threading.Lock()
         self.running = False
+        self.recorder = None  # Optional FlightRecorder, attached by Monitor
+        self.clock = clock
+        self.last_data_time = self.clock()
+        self.fix_quality = 0
+        self.satellites = 0
+        self.powered = True   # Cleared while the power governor duty-cycles the receiver
+        self._buffer = ""
+        self.discarded = 0    # Bytes dropped as noise (see GPS_MAX_LINE)
+        if not open_port:
+            return
         
         try:
             # Initialize pigpio for software serial
@@ -397,14 +1306,8 @@ class GPSHandler(threading.Thread):
                     time.sleep(2)  # Wait for GPS to be ready
                     try:
                         # Send a test command to see if GPS responds
-                        self.pi.wave_clear()
                         test_cmd = b'$PMTK000*32\r\n'  # Generic test command
-                        self.pi.wave_add_serial(self._tx_pin, self._baud, test_cmd)
-                        wid = self.pi.wave_create()
-                        self.pi.wave_send_once(wid)
-                        while self.pi.wave_tx_busy():
-                            time.sleep(0.1)
-                        self.pi.wave_delete(wid)
+                        send_serial_wave(self.pi, self._tx_pin, self._baud, test_cmd, poll_s=0.1)
                         logger.info("GPS test command sent")
                     except Exception as e:
                         logger.warning(f"GPS test command failed: {e}")
@@ -435,9 +1338,7 @@ class GPSHandler(threading.Thread):
             self.running = False
 
     def run(self):
-        last_status_log = 0
-        buffer = ""
-        last_data_time = time.time()
+        self.last_data_time = self.clock()
         
         while self.running:
             try:
@@ -445,26 +1346,16 @@ class GPSHandler(threading.Thread):
                     # Software serial using pigpio
                     (count, data) = self.pi.bb_serial_read(self._rx_pin)
                     if count > 0:
-                        last_data_time = time.time()
-                        buffer += data.decode('ascii', errors='replace')
-                        logger.debug(f"GPS raw data: {data.decode('ascii', errors='replace').strip()}")
-                        
-                        # Process complete lines
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            line = line.strip()
-                            self._process_gps_line(line, last_status_log)
+                        self.feed(data)
                     else:
-                        # Log every 30 seconds if no data received
-                        if time.time() - last_data_time > 30:
-                            logger.warning("No GPS data received in last 30 seconds - check connections")
-                            last_data_time = time.time()
+                        time.sleep(GPS_POLL_INTERVAL_S)  # pigpiod keeps buffering meanwhile
                 else:
                     # Hardware serial
                     if hasattr(self, 'ser') and self.ser.in_waiting > 0:
                         line = self.ser.readline().decode('ascii', errors='replace')
                         logger.debug(f"GPS raw data: {line.strip()}")
-                        self._process_gps_line(line.strip(), last_status_log)
+                        self.last_data_time = self.clock()
+                        self._process_gps_line(line.strip())
                     else:
                         time.sleep(0.1)
                         
@@ -472,7 +1363,23 @@ class GPSHandler(threading.Thread):
                 logger.warning(f"GPS read error: {e}")
                 time.sleep(1)
     
-    def _process_gps_line(self, line, last_status_log):
+    def feed(self, data):
+        """Buffer raw serial bytes and process every complete NMEA line"""
+        self.last_data_time = self.clock()
+        text = data.decode('ascii', errors='replace')
+        logger.debug(f"GPS raw data: {text.strip()}")
+        lines = (self._buffer + text).split('\n')
+        self._buffer = lines.pop()
+        if len(self._buffer) > GPS_MAX_LINE:
+            # Noise without line ends (wrong baud rate, floating RX pin) must not pile up
+            self.discarded += len(self._buffer)
+            self._buffer = ""
+        
+        # Process complete lines
+        for line in lines:
+            self._process_gps_line(line.strip())
+
+    def _process_gps_line(self, line):
         """Process a single NMEA sentence"""
         # Log any NMEA sentences for debugging
         if line.startswith('$') and any(x in line for x in ['GPGGA', 'GNGGA', 'GPRMC', 'GPGSA']):
@@ -480,21 +1387,24 @@ class GPSHandler(threading.Thread):
         
         if '$GPGGA' in line or '$GNGGA' in line:
             parts = line.split(',')
-            if len(parts) > 6:
-                fix_quality = int(parts[6]) if parts[6] else 0
-                satellites = int(parts[7]) if parts[7] else 0
-                
-                # Log GPS status every 30 seconds
-                if time.time() - last_status_log > 30:
-                    logger.info(f"GPS Status: Fix={fix_quality}, Sats={satellites}")
-                    last_status_log = time.time()
+            if len(parts) > 7:
+                try:
+                    fix_quality = int(parts[6]) if parts[6] else 0
+                    satellites = int(parts[7]) if parts[7] else 0
+                except ValueError:
+                    logger.debug(f"GPS: malformed GGA '{line[:82]}'")
+                    return
+                self.fix_quality = fix_quality  # Logged by Monitor's gps_status job
+                self.satellites = satellites
                 
                 if fix_quality > 0 and parts[2] and parts[4]:  # Valid fix with data
                     lat = self._parse_deg(parts[2], parts[3])
                     lon = self._parse_deg(parts[4], parts[5])
                     with self.lock:
-                        self.location = (lat, lon, time.time())
+                        self.location = GpsFix(lat, lon, self.clock())
                         logger.info(f"GPS Fix: {lat:.6f}, {lon:.6f} ({satellites} satellites)")
+                    if self.recorder:
+                        self.recorder.record_gps(self.location.t, lat, lon, satellites)
 
     def _parse_deg(self, raw, direction):
         if not raw: return 0.0
@@ -512,27 +1422,63 @@ class GPSHandler(threading.Thread):
 
     def get_last_fix(self):
         with self.lock:
-            if self.location and (time.time() - self.location[2] < 300):
+            if self.location and (self.clock() - self.location[2] < 300):
                 return self.location
         return None
     
     def get_gps_status(self):
         """Get detailed GPS status for SMS reporting"""
         with self.lock:
-            if self.location and (time.time() - self.location[2] < 300):
-                age = int(time.time() - self.location[2])
+            if self.location and (self.clock() - self.location[2] < 300):
+                age = int(self.clock() - self.location[2])
                 return f"GPS_OK({age}s)"
             else:
                 return "GPS_NO_FIX"
 
+    def check_data(self):
+        """Periodic job: warn when the receiver has gone quiet"""
+        silent = self.clock() - self.last_data_time
+        if self.running and self.powered and silent > GPS_WATCHDOG_INTERVAL_S:
+            logger.warning(f"No GPS data received in last {silent:.0f} seconds - check connections")
+
+    def log_status(self):
+        """Periodic job: fix quality and satellites from the last GGA sentence"""
+        if self.running:
+            logger.info(f"GPS Status: Fix={self.fix_quality}, Sats={self.satellites}")
+
 class GSMHandler:
-    """Asynchronous SMS handler using threaded dispatch"""
+    """Asynchronous SMS handler using threaded dispatch
+
+    All modem input goes through one ModemChannel reader. New SMS are
+    announced by +CMTI; the inbox thread then lists unread messages, hands
+    each to `on_message(sender, body)` and deletes them in one batch.
+    `http_post` sends telemetry over a GPRS bearer that stays open between
+    requests.
+
+    With `transport` (a `read()`/`write(bytes)` pair) the modem is reached
+    through it instead of the bit-bang serial pins and is not reset
+    (uplink_sim.py drives a simulated SIM800L that way).
+    """
     SMS_RETRY_COUNT = 3  # Class constant for SMS retry attempts
     
-    def __init__(self):
+    def __init__(self, phone=CAREGIVER_PHONE, on_message=None, transport=None):
         self.initialized = False
         self.module_ready = False
         self.pi = None
+        self.phone = phone  # Replaced on config reload; read once per message
+        self.on_message = on_message
+        self.init_thread = None
+        self.modem = None
+        self.inbox_event = threading.Event()
+        self.inbox_thread = None
+        self.received = 0
+        self.bearer_up = False
+        self.http_event = threading.Event()
+        self.http_result = None
+        self.outbox = SmsOutbox(self._send_sms_logic, ALERT_QUEUE_SIZE)
+        if transport is not None:
+            self._start(*transport, reset=False)
+            return
         
         if PIGPIO_AVAILABLE:
             try:
@@ -542,7 +1488,7 @@ class GSMHandler:
                 self.pi = None
         else:
             logging.warning("pigpio not available. Using basic GPIO mode.")
-        if not self.pi.connected:
+        if not self.pi or not self.pi.connected:
             logger.error("pigpiod NOT running. SMS Disabled.")
             return
 
@@ -560,15 +1506,81 @@ class GSMHandler:
                 logger.error(f"GSM Serial Open failed with error {err}")
                 return
 
-            self.initialized = True
-            logger.info("GSM Hardware Interface initialized")
-            
-            # Initialize the module
-            self.initialize_module()
+            self._start(self._serial_read, self._serial_write)
             
         except Exception as e:
             logger.error(f"GSM Init Failed: {e}")
 
+    def _start(self, read, write, reset=True):
+        self.modem = ModemChannel(read, write, on_urc=self._on_urc)
+        self.modem.start()
+        self.initialized = True
+        logger.info("GSM Hardware Interface initialized")
+        
+        # The modem needs seconds to reset and answer; don't hold up
+        # startup (and the fall detector) for it
+        self.init_thread = threading.Thread(target=self._power_up, args=(reset,), name="gsm-init")
+        self.init_thread.daemon = True
+        self.init_thread.start()
+
+    def _power_up(self, reset=True):
+        """Background start-up: reset pulse, the AT init sequence, then the inbox"""
+        if reset:
+            HardwareManager.reset_gsm()
+        if self.initialize_module():
+            self.inbox_thread = threading.Thread(target=self._inbox_loop, name="gsm-inbox")
+            self.inbox_thread.daemon = True
+            self.inbox_thread.start()
+            self.inbox_event.set()  # Commands that arrived while we were down
+
+    def _serial_read(self):
+        count, data = self.pi.bb_serial_read(SIM800L_RX_PIN)
+        return data if count > 0 else b''
+
+    def _serial_write(self, data):
+        for i in range(0, len(data), SERIAL_WRITE_CHUNK):
+            send_serial_wave(self.pi, SIM800L_TX_PIN, 9600, data[i:i + SERIAL_WRITE_CHUNK])
+
+    def _on_urc(self, urc):
+        """Modem reader thread: note new messages and HTTP results, act elsewhere"""
+        index = parse_cmti(urc)
+        if index is not None:
+            logger.info(f"SMS received (slot {index})")
+            self.inbox_event.set()
+        elif urc.startswith('+HTTPACTION:'):
+            self.http_result = parse_httpaction(urc)
+            self.http_event.set()
+        elif urc.startswith('+SAPBR 1: DEACT'):
+            logger.warning("GPRS bearer dropped by the network")
+            self.bearer_up = False
+
+    def _inbox_loop(self):
+        while True:
+            self.inbox_event.wait()
+            self.inbox_event.clear()
+            try:
+                self.process_inbox()
+            except Exception as e:
+                logger.error(f"SMS inbox processing failed: {e}")
+
+    def process_inbox(self):
+        """Read unread SMS, hand them to on_message, delete them in one batch"""
+        with self.modem.lock:  # Not in the middle of someone's SMS send
+            resp = self.send_at('AT+CMGL="REC UNREAD"', wait="\nOK", timeout=5)
+            messages = parse_cmgl(resp or "")
+            if messages:
+                # Listing marked them read; delete every read message at once
+                self.send_at("AT+CMGD=1,1", timeout=5)
+        for msg in messages:
+            self.received += 1
+            logger.info(f"SMS from {msg.sender}: {msg.body[:40]!r}")
+            if self.on_message:
+                try:
+                    self.on_message(msg.sender, msg.body)
+                except Exception as e:
+                    logger.error(f"SMS command from {msg.sender} failed: {e}")
+        return messages
+
     def initialize_module(self):
         """Initialize SIM800L module with proper sequence"""
         if not self.initialized:
@@ -600,6 +1612,11 @@ class GSMHandler:
             if not resp or "OK" not in resp:
                 logger.warning("Failed to set text mode")
             
+            # Store incoming SMS and announce them with +CMTI instead of being polled
+            resp = self.send_at("AT+CNMI=2,1,0,0,0", wait="OK", timeout=3)
+            if not resp or "OK" not in resp:
+                logger.warning("Failed to enable new-SMS indications")
+            
             # Check network registration
             reg = self.send_at("AT+CREG?", wait="+CREG:", timeout=5)
             logger.info(f"Network registration: {reg.strip() if reg else 'No response'}")
@@ -616,45 +1633,12 @@ class GSMHandler:
             logger.error(f"Module configuration failed: {e}")
             return False
 
-    def send_at(self, cmd, wait="OK", timeout=3):
+    def send_at(self, cmd, wait="OK", timeout=3, idle_s=1.0):
         if not self.initialized: 
             return None
             
-        # Clear any pending data
-        for _ in range(3):
-            (count, data) = self.pi.bb_serial_read(SIM800L_RX_PIN)
-            if count == 0:
-                break
-            time.sleep(0.01)
-        
-        # Send command with proper timing
-        self.pi.wave_clear()
-        cmd_bytes = (cmd + "\r\n").encode('utf-8')
-        self.pi.wave_add_serial(SIM800L_TX_PIN, 9600, cmd_bytes)
-        wid = self.pi.wave_create()
-        if wid >= 0:
-            self.pi.wave_send_once(wid)
-            while self.pi.wave_tx_busy():
-                time.sleep(0.01)
-            self.pi.wave_delete(wid)
-        
-        # Wait for response with longer timeout
-        start = time.time()
-        resp = ""
-        last_read = time.time()
-        
-        while (time.time() - start) < timeout:
-            (count, data) = self.pi.bb_serial_read(SIM800L_RX_PIN)
-            if count > 0:
-                resp += data.decode('ascii', errors='replace')
-                last_read = time.time()
-                if wait in resp or "ERROR" in resp: 
-                    break
-            else:
-                # If no data for 1 second, break
-                if time.time() - last_read > 1.0:
-                    break
-            time.sleep(0.02)
+        # Stale input is discarded, URCs are routed away by the channel's reader
+        resp = self.modem.command(cmd, wait=wait, timeout=timeout, idle_s=idle_s)
         
         # Debug logging
         if resp:
@@ -664,18 +1648,90 @@ class GSMHandler:
             
         return resp
 
-    def dispatch_sms_async(self, message):
-        """Spawns a background thread to send SMS without blocking monitoring"""
-        thread = threading.Thread(target=self._send_sms_logic, args=(message,))
-        thread.daemon = True
-        thread.start()
+    def open_bearer(self, apn):
+        """Bring up the GPRS bearer (profile 1) unless it is already up; it stays up"""
+        with self.modem.lock:
+            if self.bearer_up:
+                status = self.send_at("AT+SAPBR=2,1", wait="+SAPBR:", timeout=3)
+                if status and "+SAPBR: 1,1," in status:
+                    return True
+                self.bearer_up = False
+            logger.info(f"Opening GPRS bearer (APN '{apn}')")
+            self.send_at('AT+SAPBR=3,1,"Contype","GPRS"', timeout=3)
+            self.send_at(f'AT+SAPBR=3,1,"APN","{apn}"', timeout=3)
+            self.send_at("AT+SAPBR=1,1", timeout=GPRS_BEARER_TIMEOUT_S, idle_s=GPRS_BEARER_TIMEOUT_S)
+            status = self.send_at("AT+SAPBR=2,1", wait="+SAPBR:", timeout=3)
+            self.bearer_up = bool(status and "+SAPBR: 1,1," in status)
+            if not self.bearer_up:
+                logger.warning(f"GPRS bearer did not open: {status.strip() if status else 'no response'}")
+            return self.bearer_up
+
+    def http_post(self, url, body, headers, apn):
+        """POST `body` through the modem's HTTP stack; returns the HTTP status or None
+
+        The modem lock is held per step, not while the request is in flight,
+        so an alert SMS can go out in the middle of a slow upload.
+        """
+        if not self.initialized or not self.module_ready:
+            return None
+        if not self.open_bearer(apn):
+            return None
+        extra = "\\r\\n".join(f"{k}: {v}" for k, v in headers.items() if k != 'Content-Type')
+        with self.modem.lock:
+            self.send_at("AT+HTTPTERM", timeout=2)  # Left over from an interrupted request
+            resp = self.send_at("AT+HTTPINIT", timeout=3)
+            if not resp or "OK" not in resp:
+                logger.warning(f"HTTPINIT failed: {resp.strip() if resp else 'no response'}")
+                return None
+            self.send_at('AT+HTTPPARA="CID",1', timeout=2)
+            self.send_at(f'AT+HTTPPARA="URL","{url}"', timeout=2)
+            self.send_at(f'AT+HTTPPARA="CONTENT","{headers.get("Content-Type", "application/json")}"',
+                         timeout=2)
+            if extra:
+                self.send_at(f'AT+HTTPPARA="USERDATA","{extra}"', timeout=2)
+            self.send_at(f"AT+HTTPSSL={1 if url.startswith('https') else 0}", timeout=2)
+            resp = self.send_at(f"AT+HTTPDATA={len(body)},20000", wait="DOWNLOAD", timeout=5)
+            if not resp or "DOWNLOAD" not in resp:
+                logger.warning(f"HTTPDATA refused: {resp.strip() if resp else 'no response'}")
+                self.send_at("AT+HTTPTERM", timeout=2)
+                return None
+            self.modem.write(body)
+            self.modem.wait("OK", timeout=20)
+            self.modem.take()
+            self.http_event.clear()
+            self.http_result = None
+            self.send_at("AT+HTTPACTION=1", timeout=3)
+        # The result arrives as a +HTTPACTION URC, seconds to a minute later
+        self.http_event.wait(HTTP_ACTION_TIMEOUT_S)
+        result = self.http_result
+        with self.modem.lock:
+            self.send_at("AT+HTTPTERM", timeout=2)
+        if result is None:
+            logger.warning(f"No HTTP result within {HTTP_ACTION_TIMEOUT_S}s")
+            return None
+        status = result[1]
+        if status >= 600:
+            self.bearer_up = False  # 60x: network/DNS trouble, re-check the bearer next time
+        return status
+
+    def dispatch_sms_async(self, message, on_done=None, to=None, alert=False):
+        """Queue an SMS for the background sender without blocking monitoring"""
+        return self.outbox.submit(message, to, on_done, alert)
 
-    def _send_sms_logic(self, message):
+    def _send_sms_logic(self, message, to=None):
+        if self.init_thread and self.init_thread.is_alive():
+            logger.info("Waiting for the GSM module to finish initializing")
+            self.init_thread.join(GSM_INIT_WAIT_S)
         if not self.initialized or not self.module_ready:
             logger.error("SMS skip: GSM not initialized or ready")
             return False
             
-        logger.info(f"Background SMS Dispatching to {CAREGIVER_PHONE}")
+        phone = to or self.phone  # One number for all retries, even across a reload
+        with self.modem.lock:  # The whole exchange, so inbox reads cannot cut in
+            return self._send_sms_locked(message, phone)
+
+    def _send_sms_locked(self, message, phone):
+        logger.info(f"Background SMS Dispatching to {phone}")
         for attempt in range(self.SMS_RETRY_COUNT):
             try:
                 logger.info(f"SMS Attempt {attempt+1}/{self.SMS_RETRY_COUNT}")
@@ -708,34 +1764,20 @@ class GSMHandler:
                     continue
                 
                 # 4. Start SMS
-                resp = self.send_at(f'AT+CMGS="{CAREGIVER_PHONE}"', wait=">", timeout=3)
+                resp = self.send_at(f'AT+CMGS="{phone}"', wait=">", timeout=3)
                 if not resp or ">" not in resp:
                     logger.warning(f"No SMS prompt (resp: {resp[:50] if resp else 'None'}")
                     time.sleep(2)
                     continue
                 
                 # 5. Send message + Ctrl+Z with proper timing
-                self.pi.wave_clear()
-                # Send message content
-                message_bytes = message.encode('utf-8')
-                self.pi.wave_add_serial(SIM800L_TX_PIN, 9600, message_bytes)
-                wid = self.pi.wave_create()
-                self.pi.wave_send_once(wid)
-                while self.pi.wave_tx_busy():
-                    time.sleep(0.1)
-                self.pi.wave_delete(wid)
+                self.modem.write(message.encode('utf-8'))
                 
                 # Small delay between message and Ctrl+Z
                 time.sleep(0.5)
                 
                 # Send Ctrl+Z to end message
-                self.pi.wave_clear()
-                self.pi.wave_add_serial(SIM800L_TX_PIN, 9600, chr(26).encode())
-                wid = self.pi.wave_create()
-                self.pi.wave_send_once(wid)
-                while self.pi.wave_tx_busy():
-                    time.sleep(0.1)
-                self.pi.wave_delete(wid)
+                self.modem.write(chr(26).encode())
 
                 # 6. Wait for final response with longer timeout
                 time.sleep(3)  # Give module more time to process SMS
@@ -744,23 +1786,22 @@ class GSMHandler:
                 
                 # Wait up to 15 seconds for SMS response
                 while (time.time() - start_time) < 15:
-                    (count, data) = self.pi.bb_serial_read(SIM800L_RX_PIN)
-                    if count > 0:
-                        chunk = data.decode('ascii', errors='replace')
+                    chunk = self.modem.take()
+                    if chunk:
                         final_resp += chunk
                         logger.debug(f"SMS chunk: {chunk.strip()}")
                         
                         # Check for success indicators
-                        if "+CMGS:" in final_resp:
+                        if "OK" in final_resp and "+CMGS:" in final_resp:
+                            logger.info("SMS Sent successfully! (CMGS + OK)")
+                            return True
+                        elif "+CMGS:" in final_resp:
                             logger.info("SMS reference received")
                             # Wait for final OK
                             continue
                         elif "Call Ready" in final_resp and "SMS Ready" in final_resp:
                             logger.info("SMS Sent successfully! (Call Ready + SMS Ready)")
                             return True
-                        elif "OK" in final_resp and "+CMGS:" in final_resp:
-                            logger.info("SMS Sent successfully! (CMGS + OK)")
-                            return True
                         elif "SMS Ready" in final_resp:
                             logger.info("SMS appears to be sent! (SMS Ready)")
                             return True
@@ -793,115 +1834,1147 @@ class GSMHandler:
         logger.error("All SMS attempts failed")
         return False
 
+class Sampler:
+    """IMU sampling, orientation and fall detection - the timing-critical part
+
+    Driven by Monitor.run in the default single-process mode, or on its own by
+    run_sampler_process in split-process mode. Detector settings change only
+    between samples: apply_params hands over a complete set that the next
+    sample() installs, so a reload never leaves the detector half-updated.
+    `imu` replaces the MPU6050 (anything with read_all(); soak_test.py passes
+    a simulated patient) and `clock` stamps the samples.
+    """
+    def __init__(self, i2c, config, imu=None, clock=time.time):
+        self.imu = imu if imu is not None else MPU6050Sensor(i2c)
+        self.clock = clock
+        self.orientation = OrientationEstimator(UPRIGHT_AXIS)
+        self.detector = FallDetector(posture=self.orientation, clock=clock,
+                                     **detector_params(config))
+        self.pending_params = None
+        self.last_mag = 0.0
+        self.motion_wake = None
+        self.active_until = 0
+        if config.hardware_motion_wake:
+            wake = MotionWake(self.imu, threshold_mg=config.hardware_motion_wake_threshold_mg)
+            if wake.ready:
+                self.motion_wake = wake
+                atexit.register(wake.cleanup)
+            else:
+                logger.warning("Motion wake unavailable - polling at the idle rate instead")
+
+    def sample(self):
+        """Take one reading; returns (data, fall_confirmed)"""
+        if self.pending_params is not None:
+            params, self.pending_params = self.pending_params, None
+            for name, value in params.items():
+                setattr(self.detector, name, value)
+        data = self.imu.read_all()
+        data.ts = self.clock()
+        if data.ok:
+            self.orientation.update(data.accel, data.gyro, data.ts)
+        self.last_mag = data.mag
+        return data, self.detector.update(data.mag)
+
+    def apply_params(self, params):
+        """Queue detector settings (see detector_params) for the next sample"""
+        self.pending_params = dict(params)
+
+    def next_delay(self, t_start):
+        """Seconds until the next sample is due, or None to idle until motion"""
+        # Adaptive Sampling Rate
+        rate = self.detector.sample_rate(self.last_mag)
+        if self.motion_wake and time.monotonic() < self.active_until:
+            rate = self.detector.active_rate
+        
+        # Low-power idle: wait for the motion interrupt instead of polling
+        if self.motion_wake and rate == self.detector.idle_rate:
+            return None
+        
+        # Precision Sleep
+        elapsed = time.monotonic() - t_start
+        return max(0, (1.0 / rate) - elapsed)
+
+    def wait_for_motion(self):
+        """Block on the motion interrupt, waking at least every MOTION_SANITY_INTERVAL_S"""
+        if self.motion_wake.wait(MOTION_SANITY_INTERVAL_S):
+            self.active_until = time.monotonic() + MOTION_ACTIVE_HOLD_S
+
+    def wait_next(self, t_start):
+        """Sleep until the next sample is due (in wake mode, idle until motion)"""
+        delay = self.next_delay(t_start)
+        if delay is None:
+            self.wait_for_motion()
+        else:
+            time.sleep(delay)
+
+
+def _set_realtime_priority(priority):
+    """Put the calling process under SCHED_FIFO, falling back to a lower nice value"""
+    if priority <= 0:
+        return
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        logger.info(f"Sampler running with SCHED_FIFO priority {priority}")
+    except (AttributeError, PermissionError, OSError) as e:
+        logger.warning(f"SCHED_FIFO unavailable ({e}); using nice -10")
+        try:
+            os.nice(-10)
+        except OSError:
+            pass
+
+
+def run_sampler_process(ring, config, rt_priority=0):
+    """Entry point of the dedicated sampling process (split-process mode)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor stops us
+    _set_realtime_priority(rt_priority)
+    sampler = Sampler(I2CManager(), config)
+    control_seq = None
+    last_stats = time.monotonic()
+    logger.info(f"Sampler process active (PID {os.getpid()})")
+    
+    while True:
+        t_start = time.monotonic()
+        data, fell = sampler.sample()
+        if data.ok:
+            a, g = data.accel, data.gyro
+            ring.publish(data.ts, KIND_IMU, a[0], a[1], a[2], g[0], g[1], g[2],
+                         data.temp, data.mag, sampler.orientation.tilt_deg)
+        else:
+            ring.publish(data.ts, KIND_IMU_FAIL)
+        if fell:
+            det = sampler.detector
+            now = time.time()
+            # Impact age, not its time: the payload is float32
+            ring.publish(now, KIND_FALL, det.last_impact_g, det.last_duration_ms,
+                         sampler.orientation.tilt_deg, now - det.last_impact_t)
+        
+        if t_start - last_stats > 60:
+            logger.info(f"[SAMPLER] {sampler.imu.recovery_summary()}")
+            last_stats = t_start
+        
+        if ring.control_seq != control_seq:
+            # Reloaded config / governor rates; a torn read is retried next sample
+            control = ring.read_control()
+            if control:
+                control_seq, params = control
+                sampler.apply_params(params)
+                logger.info(f"Sampler settings updated (#{control_seq // 2})")
+        
+        sampler.wait_next(t_start)
+
+
+class PowerGovernor:
+    """Battery-driven power profiles, run as a timer wheel job
+
+    Each reading updates the smoothed charge estimate; crossing a profile
+    boundary rescales IMU rates, GPS duty cycle, the location SMS interval
+    and log verbosity (see battery.PROFILES). Below the normal profile these
+    cap the config.ini values; the normal profile leaves config.ini in
+    charge. Low and critical charge send one SMS each per discharge with the
+    projected hours left.
+    """
+    def __init__(self, monitor, battery):
+        self.monitor = monitor
+        self.battery = battery
+        self.estimator = BatteryEstimator()
+        self.profile = PROFILES[0]
+        self.alerted = set()  # Thresholds already reported this discharge
+        self.gps_on = True
+        self.skipped = 0
+
+    def sample(self):
+        m = self.monitor
+        if m.sms_in_flight:
+            self.skipped += 1  # The modem's transmit bursts sag the cell; read next time
+            return
+        volts = self.battery.read_volts()
+        if volts is None:
+            return
+        pct = self.estimator.update(time.monotonic(), volts)
+        profile = select_profile(pct, self.profile)
+        if profile is not self.profile:
+            logger.warning(f"Power profile {self.profile.name} -> {profile.name} (battery {pct:.0f}%)")
+            self.apply(profile)
+        self._check_low(pct)
+
+    def apply(self, profile):
+        m = self.monitor
+        self.profile = profile
+        m.apply_detector_params()
+        m.schedule_location_updates()
+        m.apply_log_level()
+        if profile.gps_on_s is None:
+            m.timers.cancel("gps_duty")
+            m.timers.cancel("gps_duty_off")
+            self.set_gps_power(True)
+        else:
+            m.timers.every("gps_duty", profile.gps_period_s, self._gps_window,
+                           priority=PRIORITY_LOW, first_in=0)
+
+    def _gps_window(self):
+        """Power the receiver for this profile's on-time, then off again"""
+        self.set_gps_power(True)
+        if self.profile.gps_on_s is not None:
+            self.monitor.timers.after("gps_duty_off", self.profile.gps_on_s,
+                                      lambda: self.set_gps_power(False))
+
+    def wake_gps(self):
+        """An alert needs a fresh fix: open a GPS window now if it is off"""
+        if not self.gps_on:
+            self._gps_window()
+
+    def set_gps_power(self, on):
+        if on == self.gps_on:
+            return
+        try:
+            GPIO.output(GPS_POWER_PIN, GPIO.HIGH if on else GPIO.LOW)
+        except Exception as e:
+            logger.warning(f"Could not switch GPS power: {e}")
+            return
+        self.gps_on = on
+        gps = self.monitor.gps
+        gps.powered = on
+        if on:
+            gps.last_data_time = time.time()  # Give it a full watchdog period to speak
+        logger.info(f"GPS power {'on' if on else 'off'} ({self.profile.name} profile)")
+
+    def _check_low(self, pct):
+        if pct > BATTERY_REARM_PCT:
+            self.alerted.clear()
+        for level, threshold in (("CRITICAL", BATTERY_CRITICAL_PCT), ("LOW", BATTERY_LOW_PCT)):
+            if pct <= threshold and threshold not in self.alerted:
+                # Crossing both at once (e.g. at boot) sends only the more severe one
+                self.alerted.update(t for t in (BATTERY_LOW_PCT, BATTERY_CRITICAL_PCT) if t >= threshold)
+                self.monitor.send_battery_alert(level, pct, self.estimator.hours_remaining())
+                break
+        self.monitor.annunciator.set_state('low_battery', pct <= BATTERY_LOW_PCT)
+
+    def summary(self):
+        est = self.estimator
+        if est.percent is None:
+            return f"Battery no reading yet | Profile {self.profile.name}"
+        rate = est.rate_pct_per_h
+        hours = est.hours_remaining()
+        return (f"Battery {est.percent:.0f}% ({est.volts:.2f}V) | "
+                f"Rate {'n/a' if rate is None else f'{rate:.1f}%/h'} | "
+                f"Remaining {'n/a' if hours is None else f'{hours:.1f}h'} | "
+                f"Profile {self.profile.name} | GPS {'on' if self.gps_on else 'off'}")
+
+
 class Monitor:
-    """The main monitoring orchestrator"""
-    def __init__(self):
+    """The main monitoring orchestrator
+
+    `clock` (wall time) and `monotonic` (timer wheel, alert window) default to
+    the system clocks; soak_test.py runs both on one virtual clock and
+    overrides the _open_* methods to attach simulated hardware.
+    """
+    def __init__(self, split_process=False, rt_priority=0, startup_report=False, ble_fake=False,
+                 clock=time.time, monotonic=time.monotonic):
         logger.info("--- PATIENT MONITOR SYSTEM STARTING ---")
+        STARTUP.lap("arguments + logging")
+        self.clock = clock
+        self.monotonic = monotonic
         
         # Initialize GPIO and hardware components
         HardwareManager.setup_gpio()
         self.hardware = HardwareManager()
-        self.i2c = I2CManager()
+        STARTUP.lap("GPIO")
+        self.split_process = split_process
+        self.rt_priority = rt_priority
+        self.startup_report = startup_report
+        self.sampler = None
+        self.sampler_proc = None
+        self.ring = None
+        self.governor = None
+        
+        # Settings from config.ini over the module defaults, re-read while running
+        self.config_watcher = ConfigWatcher(CONFIG_FILE, config_defaults())
+        if self.config_watcher.write_template():
+            logger.info(f"Wrote default settings to {CONFIG_FILE}")
+        self.config = self.config_watcher.load()
+        # SET-INTERVAL by SMS, kept apart from the config snapshot (which only
+        # _reload_config replaces) until config.ini changes the interval
+        self.sms_location_interval = None
+        self.apply_log_level()
+        STARTUP.lap("config")
         
         # Initialize sensors and modules
-        self.imu = MPU6050Sensor(self.i2c)
-        self.gps = GPSHandler()
-        self.gsm = GSMHandler()
+        if split_process:
+            # Fork the sampler before any pigpio connections or threads exist
+            self.ring = SampleRing(capacity=SAMPLE_RING_CAPACITY, create=True)
+            self.ring.write_control(detector_params(self.config))
+            atexit.register(self.ring.close)
+            atexit.register(self._stop_sampler)
+            self._start_sampler()
+        else:
+            self.sampler = self._open_sampler()
+            self.imu = self.sampler.imu
+            self.detector = self.sampler.detector
+        STARTUP.lap("sampler process" if split_process else "sampler (I2C + MPU6050)")
+        self.gps = self._open_gps()
+        STARTUP.lap("GPS")
+        self.gsm = self._open_gsm()
+        STARTUP.lap("GSM")
+        
+        # Batched telemetry for the dashboard (only with [uplink] url set)
+        self.uplink = None
+        self.uplink_spool = None  # Kept across uplink off/on, closed at exit
+        self.uplink_thread = None
+        self._last_uplink_fix = None
+        self.configure_uplink()
+        atexit.register(self._close_uplink)  # Runs after _close_activity spools the last hour
+        
+        # Vitals from the ESP32 wearable over BLE (asyncio; a thread of its own
+        # in the threaded runtime, a task in the asyncio one)
+        self.vitals = None
+        self.ble = None
+        if ble_fake or self.config.ble_enabled:
+            self.setup_ble(fake=ble_fake)
+        STARTUP.lap("BLE gateway")
+        
+        # Black-box recorder of full-rate IMU/GPS data
+        self.recorder = None
+        self._snapshot_requested = None  # Time of a SIGUSR1 not yet served
+        try:
+            self.recorder = FlightRecorder(
+                RECORDER_FILE, capacity=RECORDER_CAPACITY,
+                snapshot_dir=RECORDER_SNAPSHOT_DIR,
+                pre_trigger_s=RECORDER_PRE_TRIGGER_S,
+                post_trigger_s=RECORDER_POST_TRIGGER_S)
+            self.gps.recorder = self.recorder
+            atexit.register(self._close_recorder)
+            # `kill -USR1 <pid>` dumps the recent window on demand
+            signal.signal(signal.SIGUSR1, self._on_snapshot_signal)
+        except Exception as e:
+            logger.error(f"Flight recorder unavailable: {e}")
+        STARTUP.lap("flight recorder")
+        
+        # Hourly activity summary of the IMU stream (O(1) per sample)
+        self.activity = ActivityAggregator()
+        atexit.register(self._close_activity)
         
         # Initialize state variables
-        self.last_heartbeat = time.time()
         self.iterations = 0
-        self.fall_cooldown = 0
-        self.fall_stage = 0 
-        self.fall_start = 0
-        self.last_high_accel = 0
+        self.last_mag = 0.0
         self.running = False
+        self.alert_lock = threading.Lock()
+        self.alert_active_until = 0  # Monotonic; a button hold before this cancels the alert
+        self._raised_by = None       # Press time of the press that raised the current alert
+        self.sms_in_flight = 0
+        
+        # Periodic work lives on the timer wheel, not in the sampling loop
+        self.timers = TimerWheel(tick_s=TIMER_TICK_S, clock=self.monotonic)
+        self._register_jobs()
+        
+        # Buzzer/LED patterns play in pigpiod (or a helper thread), never in the loop
+        self.annunciator = Annunciator()
+        atexit.register(self.annunciator.cleanup)
+        self.annunciator.play('startup')
+        STARTUP.lap("timers + annunciator")
+        
+        # Panic button works from its own interrupt thread, not the sampling loop
+        self.button = EmergencyButton(self._on_button_press, self._on_button_hold,
+                                      self._on_button_release,
+                                      long_press_s=self.config.button_long_press_s)
+        if self.button.ready:
+            atexit.register(self.button.cleanup)
+        else:
+            self.button = None
+        STARTUP.lap("button")
+        
+        # Battery-driven power profiles (needs the MCP3008 and spidev)
+        battery = BatteryMonitor()
+        if battery.ready:
+            atexit.register(battery.cleanup)
+            self.governor = PowerGovernor(self, battery)
+            self.timers.every("battery", BATTERY_SAMPLE_INTERVAL_S, self.governor.sample,
+                              priority=PRIORITY_LOW, first_in=1)
+        STARTUP.lap("battery")
+
+    def _open_sampler(self):
+        """In-process sampler on the I2C bus (single-process mode)"""
+        self.i2c = I2CManager()
+        return Sampler(self.i2c, self.config, clock=self.clock)
+
+    def _open_gps(self):
+        return GPSHandler(clock=self.clock)
+
+    def _open_gsm(self):
+        return GSMHandler(self.config.patient_caregiver_phone, on_message=self._on_sms)
+
+    def _register_jobs(self):
+        timers = self.timers
+        timers.every("heartbeat", self.config.schedule_heartbeat_interval_s, self._heartbeat)
+        self.schedule_location_updates()
+        timers.every("config_reload", CONFIG_POLL_S, self._reload_config, priority=PRIORITY_LOW)
+        timers.every("gps_watchdog", GPS_WATCHDOG_INTERVAL_S, self._check_gps,
+                     jitter_s=1, priority=PRIORITY_LOW)
+        timers.every("gps_status", GPS_STATUS_INTERVAL_S, self.gps.log_status,
+                     jitter_s=1, priority=PRIORITY_LOW)
+        timers.every("uplink", UPLINK_CHECK_S, self._check_uplink, priority=PRIORITY_LOW)
+        timers.every("uplink_fix", UPLINK_FIX_INTERVAL_S, self._record_fix,
+                     jitter_s=1, priority=PRIORITY_LOW)
+        timers.every("activity", ACTIVITY_CHECK_S, self._store_activity, priority=PRIORITY_LOW)
+        if self.vitals is not None:
+            timers.every("vitals", self.config.ble_window_s, self._forward_vitals, priority=PRIORITY_LOW)
+        if self.recorder:
+            timers.every("recorder_snapshot", 1.0, self._serve_snapshot_request, priority=PRIORITY_LOW)
+        if self.split_process:
+            timers.every("sampler_check", 1.0, self._check_sampler, priority=PRIORITY_HIGH)
 
     def run(self):
         self.gps.start()
-        logger.info("Monitoring loop active. Heartbeat every 60s.")
+        if self.ble:
+            ble_thread = threading.Thread(target=lambda: asyncio.run(self.ble.run()), name="ble")
+            ble_thread.daemon = True
+            ble_thread.start()
+        if self.split_process:
+            return self._run_supervisor()
+        logger.info(f"Monitoring loop active. Heartbeat every {self.config.schedule_heartbeat_interval_s:g}s.")
+        timers = self.timers
         
         while True:
             t_start = time.monotonic()
-            self.iterations += 1
-            
-            # 1. Data Sampling
-            data = self.imu.read_all()
-            mag = data['mag']
-            
-            # 2. Heartbeat & Periodic Location (Every 60s/300s)
-            now_time = time.time()
-            if (now_time - self.last_heartbeat) > 60:
-                logger.info(f"[HEARTBEAT] System Healthy | Iterations: {self.iterations} | Accel: {mag:.2f}g")
-                
-                # Send periodic location update every 5 minutes (300s)
-                if self.iterations % 5 == 0: 
-                    loc = self.gps.get_last_fix()
-                    if loc:
-                        gps_status = self.gps.get_gps_status()
-                        ts = datetime.now().strftime('%H:%M:%S')
-                        loc_sms = f"LOCATION_UPDATE|{PATIENT_ID}|{loc[0]:.6f},{loc[1]:.6f}|{gps_status}|{ts}|Device:PiZero"
-                        logger.info(f"Sending periodic location update: {loc_sms}")
-                        self.gsm.dispatch_sms_async(loc_sms)
-                
-                self.last_heartbeat = now_time
-
-            # 3. Fall Detection Logic (Cumulative Window)
-            if mag > FALL_THRESHOLD_G:
-                if self.fall_stage == 0:
-                    self.fall_stage = 1
-                    self.fall_start = time.time() * 1000
-                    logger.warning(f"IMPACT DETECTED: {mag:.2f}g")
-                self.last_high_accel = time.time()
             
-            # Check for confirmation if in impact window
-            if self.fall_stage == 1:
-                duration_ms = (time.time() * 1000 - self.fall_start)
-                if duration_ms > FALL_DURATION_MS:
-                    if (time.time() - self.fall_cooldown) > 60:
-                        logger.critical(f"FALL CONFIRMED: Impact stage reached {duration_ms:.0f}ms")
-                        self.trigger_emergency(mag)
-                        self.fall_cooldown = time.time()
-                        self.fall_stage = 0 # Reset stage after trigger
-                
-                # Reset if it's been quiet/low for > 200ms
-                elif (time.time() - self.last_high_accel) > 0.2:
-                    logger.info(f"Reset: Impact subsided ({duration_ms:.0f}ms total)")
-                    self.fall_stage = 0
+            # 1-2. Data sampling and fall detection (cumulative window)
+            self._on_sample(*self.sampler.sample())
 
-            # 4. Adaptive Sampling Rate
-            rate = 50.0 if mag > 1.4 or self.fall_stage == 1 else 5.0
-            
-            # Precision Sleep
-            elapsed = time.monotonic() - t_start
-            sleep_time = max(0, (1.0 / rate) - elapsed)
-            time.sleep(sleep_time)
+            # 3. Heartbeat, location updates and other periodic jobs
+            if timers.peek(t_start):
+                timers.run_due(t_start)
+
+            # 4. Adaptive rate / motion-wake sleep
+            self.sampler.wait_next(t_start)
+
+    def _on_sample(self, data, fell):
+        """One in-process sample: activity, flight recorder, fall alert"""
+        self.iterations += 1
+        self.last_mag = data.mag
+        if data.ok:
+            self.activity.update(data.ts, data.mag, data.gyro, data.temp,
+                                 self.sampler.orientation.tilt_deg)
+            if self.recorder:
+                self.recorder.record_imu(data.ts, data.accel, data.gyro, data.temp)
+        if fell:
+            self.trigger_emergency(self.detector.last_impact_g,
+                                   impact_at=self.detector.last_impact_t)
+        if self.iterations == 1:
+            self._detector_online()
 
-    def trigger_emergency(self, impact_force):
-        logger.critical("!!! FALL CONFIRMED - INITIATING EMERGENCY ALERTS !!!")
+    def _run_supervisor(self):
+        """Split-process mode: consume the sample ring; GPS/GSM/logging live here"""
+        logger.info(f"Supervisor loop active (sampler PID {self.sampler_proc.pid}). "
+                    f"Heartbeat every {self.config.schedule_heartbeat_interval_s:g}s.")
         
-        # Get GPS data and status
+        while True:
+            for ts, kind, p in self.ring.drain():
+                self.iterations += 1
+                if kind == KIND_IMU:
+                    self.last_mag = p[7]
+                    self.activity.update(ts, p[7], p[3:6], p[6], p[8])
+                    if self.recorder:
+                        self.recorder.record_imu(ts, p[0:3], p[3:6], p[6])
+                elif kind == KIND_FALL:
+                    logger.critical(f"Sampler reported fall: {p[0]:.2f}g over {p[1]:.0f}ms")
+                    self.trigger_emergency(p[0], impact_at=ts - p[3])
+                if self.iterations == 1:
+                    self._detector_online()
+            
+            self.timers.run_due()
+            time.sleep(SUPERVISOR_POLL_S)
+
+    def _detector_online(self):
+        """First sample through the detector: log (or print) how long startup took"""
+        elapsed = STARTUP.mark("detector online (first sample)")
+        logger.info(f"Detector online {elapsed:.2f}s after start")
+        if self.startup_report:
+            print("Startup report (offset from module import, duration):")
+            print(STARTUP.report())
+            self._stop_after_report()
+
+    def _stop_after_report(self):
+        raise SystemExit(0)
+
+    def _heartbeat(self):
+        logger.info(f"[HEARTBEAT] System Healthy | Iterations: {self.iterations} | Accel: {self.last_mag:.2f}g")
+        if self.sampler:
+            logger.info(f"[HEARTBEAT] {self.sampler.imu.recovery_summary()}")
+        else:
+            logger.info(f"[HEARTBEAT] Sampler PID {self.sampler_proc.pid} | "
+                        f"Ring dropped: {self.ring.dropped}")
+        if self.button:
+            logger.info(f"[HEARTBEAT] {self.button.summary()}")
+        if self.governor:
+            logger.info(f"[HEARTBEAT] {self.governor.summary()}")
+        logger.info(f"[HEARTBEAT] {self.activity.summary()}")
+        if self.ble:
+            logger.info(f"[HEARTBEAT] {self.ble.summary()}")
+        logger.info(f"[HEARTBEAT] {self._memory_summary()}")
+        if self.uplink:
+            logger.info(f"[HEARTBEAT] {self.uplink.summary()}")
+            percent = self.governor.estimator.percent if self.governor else None
+            self.uplink.add('heartbeat', samples=self.iterations, accel_g=round(self.last_mag, 2),
+                            gps=self.gps.get_gps_status(), alert=self._alert_active(),
+                            battery=None if percent is None else round(percent),
+                            profile=self.governor.profile.name if self.governor else None,
+                            rss_kib=resident_kib())
+        logger.debug(f"[HEARTBEAT] Jobs: {self.timers.summary()}")
+
+    def _memory_summary(self):
+        """RSS and what the buffer caps have thrown away (growth here means a leak)"""
+        rss = resident_kib()
+        modem = self.gsm.modem.dropped if self.gsm.modem else 0
+        return (f"Memory: RSS {'n/a' if rss is None else f'{rss / 1024:.1f} MiB'} | "
+                f"dropped: GPS noise {self.gps.discarded}B, modem {modem}B, "
+                f"SMS {self.gsm.outbox.dropped}")
+
+    def _check_gps(self):
+        self.gps.check_data()
+        lost = self.gps.running and self.gps.powered and self.gps.get_last_fix() is None
+        self.annunciator.set_state('gps_lost', lost)
+
+    def _reload_config(self):
+        """Periodic job: apply validated config.ini edits without a restart"""
+        result = self.config_watcher.check()
+        if not result:
+            return
+        config, changed = result
+        self.config = config  # Single reference swap; readers see old or new, never a mix
+        logger.warning("Config reloaded: " +
+                       ", ".join(f"{name}={getattr(config, name)}" for name in changed))
+        if any(name.startswith(('fall_', 'alerts_', 'sampling_')) for name in changed):
+            self.apply_detector_params()
+        if 'schedule_heartbeat_interval_s' in changed:
+            self.timers.every("heartbeat", config.schedule_heartbeat_interval_s, self._heartbeat)
+        if 'schedule_location_interval_s' in changed:
+            self.sms_location_interval = None  # The file overrides an earlier SET-INTERVAL
+            self.schedule_location_updates()
+        if 'logging_level' in changed:
+            self.apply_log_level()
+        if any(name.startswith('uplink_') for name in changed):
+            self.configure_uplink()
+        if 'ble_window_s' in changed and self.vitals is not None:
+            self.timers.every("vitals", config.ble_window_s, self._forward_vitals, priority=PRIORITY_LOW)
+        self.gsm.phone = config.patient_caregiver_phone
+        if self.button:
+            self.button.long_press_s = config.button_long_press_s
+
+    def _power_profile(self):
+        """The governor's profile while it is below normal, else None"""
+        if self.governor and self.governor.profile is not PROFILES[0]:
+            return self.governor.profile
+        return None
+
+    def apply_detector_params(self):
+        """Send config + power profile detector settings to the in-process or split sampler"""
+        params = detector_params(self.config, self._power_profile())
+        if self.sampler:
+            self.sampler.apply_params(params)
+        else:
+            self.ring.write_control(params)
+
+    def location_interval(self):
+        """Location SMS interval: the SET-INTERVAL override, else config.ini's"""
+        interval = self.sms_location_interval
+        return self.config.schedule_location_interval_s if interval is None else interval
+
+    def schedule_location_updates(self):
+        interval = self.location_interval()
+        if not interval:
+            self.timers.cancel("location_update")  # Location on request only (SMS LOCATE)
+            return
+        profile = self._power_profile()
+        if profile:
+            interval = max(interval, profile.location_interval_s)
+        self.timers.every("location_update", interval, self._send_location_update,
+                          jitter_s=5, priority=PRIORITY_LOW)
+
+    def apply_log_level(self):
+        level = getattr(logging, self.config.logging_level)
+        profile = self._power_profile()
+        if profile:
+            level = max(level, profile.log_level)
+        logger.setLevel(level)
+
+    def configure_uplink(self):
+        """Start, retune or stop the telemetry uplink from the config snapshot"""
+        config = self.config
+        if not config.uplink_url:
+            if self.uplink:
+                logger.warning("Telemetry uplink off; unsent records stay spooled")
+            self.uplink = None
+            return
+        if self.uplink is None:
+            # Re-enabled: reuse the open spool, a second handle on the file would corrupt it
+            if self.uplink_spool is None:
+                try:
+                    self.uplink_spool = TelemetrySpool(UPLINK_SPOOL_FILE,
+                                                       max_bytes=UPLINK_SPOOL_MAX_BYTES)
+                except OSError as e:
+                    logger.error(f"Telemetry spool unavailable: {e}")
+                    return
+            spool = self.uplink_spool
+            self.uplink = TelemetryUplink(spool, self._uplink_post, config.patient_id,
+                                          clock=self.clock)
+            logger.info(f"Telemetry uplink to {config.uplink_url} via {config.uplink_transport} "
+                        f"({spool.pending} records waiting)")
+        self.uplink.device = config.patient_id
+        self.uplink.batch_bytes = config.uplink_batch_bytes
+        self.uplink.max_age_s = config.uplink_max_age_s
+
+    def _uplink_post(self, body, headers):
+        """Uplink transport (uplink thread): the modem's GPRS HTTP, or the Pi's network"""
+        config = self.config
+        if config.uplink_token:
+            headers = dict(headers, Authorization=f"Bearer {config.uplink_token}")
+        if config.uplink_transport == 'direct':
+            return post_direct(config.uplink_url, body, headers)
+        return self.gsm.http_post(config.uplink_url, body, headers, config.uplink_apn)
+
+    def _check_uplink(self):
+        """Periodic job: post waiting telemetry on its own thread when the policy says so"""
+        uplink = self.uplink
+        if not uplink or not uplink.due():
+            return
+        if self.uplink_thread and self.uplink_thread.is_alive():
+            return
+        self.uplink_thread = threading.Thread(target=uplink.flush, name="uplink")
+        self.uplink_thread.daemon = True
+        self.uplink_thread.start()
+
+    def _close_uplink(self):
+        """Close the telemetry spool on shutdown; unsent records stay on disk"""
+        if self.uplink_spool:
+            self.uplink_spool.close()
+
+    def _uplink_sms_fallback(self):
+        """True while location updates should still go by SMS"""
+        return not self.uplink or self.uplink.failures >= UPLINK_SMS_FALLBACK_FAILURES
+
+    def _record_fix(self):
+        """Periodic job: spool each new GPS fix for the dashboard"""
+        loc = self.gps.get_last_fix()
+        if not self.uplink or not loc or loc == self._last_uplink_fix:
+            return
+        self._last_uplink_fix = loc
+        self.uplink.add('fix', lat=round(loc[0], 6), lon=round(loc[1], 6), fix_t=round(loc[2], 1))
+
+    def _record_alert(self, reason, urgent=True, **fields):
+        """Alert record for the dashboard; the caregiver still gets the SMS"""
+        if not self.uplink:
+            return
         loc = self.gps.get_last_fix()
-        gps_status = self.gps.get_gps_status()
-        
         if loc:
-            coords = f"{loc[0]:.6f},{loc[1]:.6f}"
-            location_info = f"{coords}|{gps_status}"
+            fields.update(lat=round(loc[0], 6), lon=round(loc[1], 6))
+        self.uplink.add('alert', urgent=urgent, reason=reason, **fields)
+
+    def setup_ble(self, fake=False):
+        """Create the vitals buffer and the wearable gateway (started by run())"""
+        if not fake and not BLEAK_AVAILABLE:
+            logger.error("BLE gateway enabled but bleak is not installed (pip3 install bleak)")
+            return
+        connector = FakeWearable().connect if fake else bleak_connector
+        self.vitals = VitalsBuffer(VITALS_BUFFER_SAMPLES)
+        self._vitals_since = self.clock()
+        self.ble = BleGateway(self.vitals, connector, address=self.config.ble_address,
+                              on_emergency=self._on_wearable_emergency, clock=self.clock)
+        logger.info(f"BLE gateway for {'a simulated wearable' if fake else self.config.ble_address or 'the wearable'}")
+
+    def _forward_vitals(self):
+        """Periodic job: one aggregated vitals record per window, with the Pi's position"""
+        now = self.clock()
+        since, self._vitals_since = self._vitals_since, now
+        record = self.vitals.aggregate(since, now)
+        if record is None:
+            return
+        logger.debug(f"Vitals {record}")
+        if self.uplink:
+            loc = self.gps.get_last_fix()
+            if loc:
+                record.update(lat=round(loc[0], 6), lon=round(loc[1], 6))
+            self.uplink.add('vitals', window_s=round(now - since), **record)
+
+    def _vitals_info(self):
+        """'|HR:72|SpO2:97' from a fresh wearable sample with the finger on, else ''"""
+        latest = self.vitals.latest() if self.vitals is not None else None
+        if not latest or self.clock() - latest[0] > VITALS_FRESH_S or not latest[4] & FINGER:
+            return ""
+        return f"|HR:{latest[1]}|SpO2:{latest[2]}"
+
+    def _on_wearable_emergency(self):
+        """The wearable's own emergency button (rising edge)"""
+        logger.critical("Wearable reports an emergency")
+        self.trigger_emergency(None, reason="WEARABLE")
+
+    def _store_activity(self):
+        """Periodic job: append finished activity hours to ACTIVITY_FILE and the uplink"""
+        completed = self.activity.completed
+        while completed:
+            record = completed.popleft()
+            logger.info(f"Activity {record['hour']}: active {record['active_s'] // 60}m, "
+                        f"steps {record['steps']}, max {record['max_g']}g")
+            try:
+                os.makedirs(LOG_DIR, exist_ok=True)
+                if os.path.exists(ACTIVITY_FILE) and os.path.getsize(ACTIVITY_FILE) > ACTIVITY_FILE_MAX_BYTES:
+                    os.replace(ACTIVITY_FILE, ACTIVITY_FILE + ".1")
+                with open(ACTIVITY_FILE, 'a') as f:
+                    f.write(json.dumps(record, separators=(',', ':')) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not store activity record: {e}")
+            if self.uplink:
+                self.uplink.add('activity', **record)
+
+    def _close_activity(self):
+        """At exit: keep the partial hour too (a restart starts a new record for it)"""
+        self.activity.roll(self.clock())
+        self._store_activity()
+
+    def _on_sms(self, sender, body):
+        """Inbound SMS (GSM inbox thread): run commands from whitelisted numbers"""
+        config = self.config
+        allowed = (config.patient_caregiver_phone,) + config.patient_command_numbers
+        if not any(same_number(sender, number, config.patient_country_code) for number in allowed):
+            logger.warning(f"SMS from {sender} ignored - not a command number")
+            return
+        verb, arg = parse_command(body)
+        logger.warning(f"SMS command {verb or body[:20]!r} from {sender}")
+        ts = datetime.now().strftime('%H:%M:%S')
+        if verb == 'LOCATE':
+            if self.gps.get_last_fix() or not self.governor or self.governor.gps_on:
+                self._reply_location(sender)
+            else:
+                # GPS is duty-cycled off: power it and answer once it had time for a fix
+                self.governor.wake_gps()
+                self.timers.after(f"locate_{sender}", LOCATE_FIX_WAIT_S,
+                                  lambda: self._reply_location(sender))
+        elif verb == 'STATUS':
+            self.dispatch_sms(f"STATUS|{config.patient_id}|{self._status_info()}|{ts}|Device:PiZero",
+                              to=sender)
+        elif verb == 'SILENCE':
+            self.timers.cancel("fall_alarm_off")
+            self.annunciator.stop('fall')
+            self.annunciator.stop('panic')
+            self.dispatch_sms(f"SILENCED|{config.patient_id}|{ts}|Local alarm off|Device:PiZero", to=sender)
+        elif verb == 'SET-INTERVAL':
+            self._set_location_interval(sender, arg)
+        else:
+            self.dispatch_sms(f"HELP|{config.patient_id}|LOCATE, STATUS, SILENCE, "
+                              f"SET-INTERVAL <minutes or OFF>|Device:PiZero", to=sender)
+
+    def _reply_location(self, sender):
+        ts = datetime.now().strftime('%H:%M:%S')
+        self.dispatch_sms(f"LOCATION_UPDATE|{self.config.patient_id}|{self._location_info()}|{ts}|"
+                          f"Device:PiZero", to=sender)
+
+    def _set_location_interval(self, sender, arg):
+        """SET-INTERVAL <minutes>|OFF: periodic location SMS until config.ini changes it"""
+        pid = self.config.patient_id
+        try:
+            seconds = 0.0 if (arg or '').upper() in ('OFF', '0') else float(arg) * 60
+        except (TypeError, ValueError):
+            seconds = -1.0
+        if seconds and not 60 <= seconds <= 86400:
+            self.dispatch_sms(f"ERROR|{pid}|SET-INTERVAL takes 1-1440 minutes or OFF|Device:PiZero",
+                              to=sender)
+            return
+        self.sms_location_interval = seconds
+        self.schedule_location_updates()
+        state = f"every {seconds / 60:g} min" if seconds else "on request only"
+        logger.warning(f"Location updates {state} (SMS from {sender})")
+        self.dispatch_sms(f"INTERVAL|{pid}|Location updates {state}|Device:PiZero", to=sender)
+
+    def _status_info(self):
+        """One-line device state for the STATUS reply"""
+        parts = [f"GPS:{self.gps.get_gps_status()}"]
+        if self.governor and self.governor.estimator.percent is not None:
+            parts.append(f"Battery:{self.governor.estimator.percent:.0f}%")
+            parts.append(f"Profile:{self.governor.profile.name}")
+        vitals = self._vitals_info()
+        if vitals:
+            parts.append(vitals[1:])
+        steps, active_s = self.activity.today()
+        parts.append(f"Today:{active_s / 60:.0f}min active,{steps} steps")
+        parts.append(f"Alert:{'ACTIVE' if self._alert_active() else 'none'}")
+        interval = self.location_interval()
+        parts.append(f"Updates:{f'{interval / 60:g}min' if interval else 'on request'}")
+        parts.append(f"Samples:{self.iterations}")
+        return "|".join(parts)
+
+    def _send_location_update(self):
+        """Periodic location SMS (skipped without a recent fix, or while the uplink carries fixes)"""
+        if not self._uplink_sms_fallback():
+            return
+        loc = self.gps.get_last_fix()
+        if loc:
+            gps_status = self.gps.get_gps_status()
+            ts = datetime.now().strftime('%H:%M:%S')
+            loc_sms = f"LOCATION_UPDATE|{self.config.patient_id}|{loc[0]:.6f},{loc[1]:.6f}|{gps_status}|{ts}|Device:PiZero"
+            logger.info(f"Sending periodic location update: {loc_sms}")
+            self.dispatch_sms(loc_sms)
+
+    def _start_sampler(self):
+        ctx = multiprocessing.get_context('fork')
+        self.sampler_proc = ctx.Process(target=run_sampler_process, name="sampler",
+                                        args=(self.ring, self.config, self.rt_priority))
+        self.sampler_proc.daemon = True
+        self.sampler_proc.start()
+        self.sampler_started = time.monotonic()
+        logger.info(f"Sampler process started (PID {self.sampler_proc.pid})")
+
+    def _check_sampler(self):
+        """Restart the sampling process if it died or stopped publishing"""
+        now = time.monotonic()
+        if now - self.sampler_started < SAMPLER_STALL_S:
+            return
+        alive = self.sampler_proc.is_alive()
+        if alive and now - self.ring.heartbeat < SAMPLER_STALL_S:
+            return
+        logger.critical(f"Sampler process {'stalled' if alive else 'died'} - restarting")
+        self._stop_sampler()
+        self._start_sampler()
+
+    def _stop_sampler(self):
+        if self.sampler_proc and self.sampler_proc.is_alive():
+            self.sampler_proc.terminate()
+            self.sampler_proc.join(2)
+            if self.sampler_proc.is_alive():
+                self.sampler_proc.kill()
+
+    def trigger_emergency(self, impact_force, reason="FALL", pressed_at=None, impact_at=None):
+        if reason == "FALL":
+            logger.critical("!!! FALL CONFIRMED - INITIATING EMERGENCY ALERTS !!!")
         else:
-            location_info = f"NO_GPS_FIX|{gps_status}"
+            logger.critical(f"!!! {reason} - INITIATING EMERGENCY ALERTS !!!")
+        with self.alert_lock:
+            self.alert_active_until = self.monotonic() + BUTTON_CANCEL_WINDOW_S
+        if reason == "FALL":
+            # Local alarm for anyone nearby until cancelled or timed out
+            self.annunciator.play('fall')
+            self.timers.after("fall_alarm_off", ANNUNCIATOR_ALARM_S,
+                              lambda: self.annunciator.stop('fall'))
+        else:
+            self.annunciator.play('panic')
+        
+        # Freeze the pre/post-trigger sensor window for clinical review
+        if self.recorder:
+            now = self.clock()
+            if impact_at is None:
+                self.recorder.trigger(reason, now)
+            else:
+                # The posture check confirms a fall up to POSTURE_TIMEOUT_S after
+                # the impact: centre the window on the impact, reaching past now
+                self.recorder.trigger(reason, impact_at,
+                                      post_s=now - impact_at + RECORDER_POST_TRIGGER_S)
+        if self.governor:
+            self.governor.wake_gps()  # Follow-up location updates need the receiver on
         
         # Format SMS with more detailed information
         ts = datetime.now().strftime('%H:%M:%S')
-        sms = f"FALL_ALERT|{PATIENT_ID}|{location_info}|{ts}|Impact:{impact_force:.2f}g|Device:PiZero"
+        if impact_force is not None:
+            detail = f"Impact:{impact_force:.2f}g"
+        else:
+            detail = "Wearable" if reason == "WEARABLE" else "Button"
+        if self.governor and self.governor.estimator.percent is not None:
+            detail += f"|Battery:{self.governor.estimator.percent:.0f}%"
+        detail += self._vitals_info()
+        sms = f"{reason}_ALERT|{self.config.patient_id}|{self._location_info()}|{ts}|{detail}|Device:PiZero"
         
         logger.info(f"SMS Content: {sms}")
         
         # Dispatch Async
-        self.gsm.dispatch_sms_async(sms)
+        self.dispatch_sms(sms, pressed_at, alert=True)
+        self._record_alert(reason, impact_g=None if impact_force is None else round(impact_force, 2))
+
+    def _location_info(self):
+        """'lat,lon|GPS status' (or NO_GPS_FIX) SMS fields"""
+        loc = self.gps.get_last_fix()
+        gps_status = self.gps.get_gps_status()
+        if loc:
+            return f"{loc[0]:.6f},{loc[1]:.6f}|{gps_status}"
+        return f"NO_GPS_FIX|{gps_status}"
+
+    def send_battery_alert(self, level, percent, hours):
+        remaining = f"{hours:.1f}h" if hours is not None else "unknown"
+        logger.warning(f"{level} BATTERY: {percent:.0f}% - projected {remaining} remaining")
+        ts = datetime.now().strftime('%H:%M:%S')
+        self.dispatch_sms(f"{level}_BATTERY|{self.config.patient_id}|{self._location_info()}|{ts}|"
+                          f"Battery:{percent:.0f}%|Remaining:{remaining}|Device:PiZero")
+        self._record_alert(f"{level}_BATTERY", urgent=False, battery=round(percent),
+                           hours_left=None if hours is None else round(hours, 1))
+
+    def dispatch_sms(self, message, pressed_at=None, to=None, alert=False):
+        """Send an SMS (to the caregiver unless `to` is given) without blocking the monitoring loop
+
+        Alerts jump the queue and are never dropped to make room.
+        """
+        self._sms_started()
+        self.gsm.dispatch_sms_async(message, on_done=self._sms_done, to=to, alert=alert)
+        if pressed_at is not None and self.button:
+            self.button.record_latency(pressed_at)
+
+    def _sms_started(self):
+        with self.alert_lock:
+            self.sms_in_flight += 1
+        self.annunciator.play('sending')
+
+    def _sms_done(self, sent):
+        with self.alert_lock:
+            self.sms_in_flight -= 1
+            idle = self.sms_in_flight == 0
+        if idle:
+            self.annunciator.stop('sending')
+        self.annunciator.play('sent' if sent else 'failed')
+
+    def _alert_active(self):
+        with self.alert_lock:
+            return self.monotonic() < self.alert_active_until
+
+    def _on_button_press(self, pressed_at):
+        """Panic press: alert at once unless an alert is already out"""
+        if self._alert_active():
+            # A hold now cancels; a short press re-sends on release
+            self.annunciator.play('ack')
+            return
+        self._raised_by = pressed_at
+        # Straight to the alert path - the fall detector's cooldown does not apply
+        self.trigger_emergency(None, reason="PANIC", pressed_at=pressed_at)
+
+    def _on_button_release(self, pressed_at, held_s):
+        if held_s < self.button.long_press_s and self._raised_by != pressed_at:
+            logger.warning(f"Emergency button pressed again ({held_s * 1000:.0f}ms) - re-sending alert")
+            self._raised_by = pressed_at
+            self.trigger_emergency(None, reason="PANIC", pressed_at=pressed_at)
+
+    def _on_button_hold(self, pressed_at):
+        """Long press while an alert is out: the patient reports they are OK"""
+        if self._raised_by == pressed_at or not self._alert_active():
+            return  # The press that raised the alert cannot cancel it
+        with self.alert_lock:
+            self.alert_active_until = 0
+        self._raised_by = pressed_at  # Releasing this press must not re-send
+        self.annunciator.stop('fall')
+        self.annunciator.play('cancel')
+        logger.warning("Alert cancelled by the patient (button held)")
+        ts = datetime.now().strftime('%H:%M:%S')
+        self.dispatch_sms(f"ALERT_CANCELLED|{self.config.patient_id}|{ts}|Patient OK (button)|Device:PiZero",
+                          alert=True)
+        self._record_alert("CANCELLED")
+
+    def _on_snapshot_signal(self, signum, frame):
+        """SIGUSR1 handler: only note the request
+
+        The handler interrupts the main thread wherever it is, possibly
+        inside record_imu holding the recorder's lock, so the snapshot
+        itself is taken by the recorder_snapshot job.
+        """
+        self._snapshot_requested = self.clock()
+
+    def _serve_snapshot_request(self):
+        """Periodic job: write the on-demand snapshot asked for by SIGUSR1"""
+        requested, self._snapshot_requested = self._snapshot_requested, None
+        if requested is not None:
+            self.recorder.snapshot_now("MANUAL", requested)
+
+    def _close_recorder(self):
+        """Write any armed snapshots and unmap the ring on shutdown"""
+        if self.recorder:
+            self.recorder.flush_pending(self.clock())
+            self.recorder.close()
+
+class AsyncMonitor(Monitor):
+    """Single asyncio event loop runtime (--runtime asyncio)
+
+    Sampling, GPS ingestion, SMS alerting and periodic jobs are coroutines on
+    one loop. Blocking I2C and modem calls run on two single-thread executors,
+    which also serialise access to each bus; a hardware-serial GPS is read
+    straight from its file descriptor. SMS are queued to one worker instead of
+    a thread each, with a timeout per message.
+    """
+
+    loop = None
+
+    def run(self):
+        try:
+            asyncio.run(self._main())
+        finally:
+            logger.info("Async runtime stopped")
+
+    async def _main(self):
+        loop = asyncio.get_running_loop()
+        self.i2c_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="i2c")
+        self.modem_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="modem")
+        self.sms_queue = SmsQueue(ALERT_QUEUE_SIZE)  # Loop thread only
+        self.sms_ready = asyncio.Event()
+        self.loop = loop
+        stop = self._stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        tasks = [
+            asyncio.create_task(self._sampling_task(), name="sampling"),
+            asyncio.create_task(self._gps_task(), name="gps"),
+            asyncio.create_task(self._sms_task(), name="sms"),
+            asyncio.create_task(self._timer_task(), name="timers"),
+        ]
+        if self.ble:
+            tasks.append(asyncio.create_task(self.ble.run(), name="ble"))
+        stopper = asyncio.create_task(stop.wait(), name="stop")
+        logger.info(f"Async runtime active. Heartbeat every {self.config.schedule_heartbeat_interval_s:g}s.")
+        
+        # Run until asked to stop or a task crashes (tasks may also just finish)
+        pending = set(tasks) | {stopper}
+        while stopper in pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            crashed = [t for t in done if t is not stopper and t.exception()]
+            for task in crashed:
+                logger.critical(f"Task {task.get_name()} crashed: {task.exception()}")
+            if crashed:
+                break
+        for task in tasks + [stopper]:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop = None
+        self.i2c_pool.shutdown(wait=False, cancel_futures=True)
+        self.modem_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _stop_after_report(self):
+        self._stop.set()  # Leave through the normal shutdown path
+
+    async def _sampling_task(self):
+        loop = asyncio.get_running_loop()
+        if self.split_process:
+            # The sampler process does the I2C work; just drain its ring
+            while True:
+                for ts, kind, p in self.ring.drain():
+                    self.iterations += 1
+                    if kind == KIND_IMU:
+                        self.last_mag = p[7]
+                        self.activity.update(ts, p[7], p[3:6], p[6], p[8])
+                        if self.recorder:
+                            self.recorder.record_imu(ts, p[0:3], p[3:6], p[6])
+                    elif kind == KIND_FALL:
+                        self.trigger_emergency(p[0], impact_at=ts - p[3])
+                    if self.iterations == 1:
+                        self._detector_online()
+                await asyncio.sleep(SUPERVISOR_POLL_S)
+        
+        while True:
+            t_start = time.monotonic()
+            self._on_sample(*await loop.run_in_executor(self.i2c_pool, self.sampler.sample))
+            
+            delay = self.sampler.next_delay(t_start)
+            if delay is None:
+                await loop.run_in_executor(self.i2c_pool, self.sampler.wait_for_motion)
+            else:
+                await asyncio.sleep(delay)
+
+    async def _gps_task(self):
+        gps = self.gps
+        if not gps.running:
+            logger.warning("GPS not running - async GPS task idle")
+            return
+        if not gps._use_sw_uart and hasattr(gps, 'ser'):
+            # Hardware serial: wake only when bytes arrive
+            loop = asyncio.get_running_loop()
+            readable = asyncio.Event()
+            loop.add_reader(gps.ser.fileno(), readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    waiting = gps.ser.in_waiting
+                    if waiting:
+                        gps.feed(gps.ser.read(waiting))
+            finally:
+                loop.remove_reader(gps.ser.fileno())
+        
+        # Software serial: pigpio buffers in the daemon, so drain it periodically.
+        # bb_serial_read is a short local socket round trip, cheap enough for the loop.
+        while True:
+            try:
+                (count, data) = gps.pi.bb_serial_read(gps._rx_pin)
+                if count > 0:
+                    gps.feed(data)
+            except Exception as e:
+                logger.warning(f"GPS read error: {e}")
+                await asyncio.sleep(1)
+            await asyncio.sleep(GPS_POLL_INTERVAL_S)
+
+    async def _sms_task(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self.sms_queue:
+                self.sms_ready.clear()
+                await self.sms_ready.wait()
+            message, to = self.sms_queue.get()
+            sent = False
+            try:
+                sent = await asyncio.wait_for(
+                    loop.run_in_executor(self.modem_pool, self.gsm._send_sms_logic, message, to),
+                    timeout=SMS_SEND_TIMEOUT_S)
+                if not sent:
+                    logger.error(f"SMS not delivered: {message[:40]}")
+            except asyncio.TimeoutError:
+                # The executor thread keeps going; later messages queue behind it
+                logger.error(f"SMS timed out after {SMS_SEND_TIMEOUT_S}s")
+            self._sms_done(sent)
+
+    async def _timer_task(self):
+        """Run the timer wheel's jobs, sleeping until its next tick"""
+        while True:
+            await asyncio.sleep(self.timers.next_delay())
+            self.timers.run_due()
+
+    def dispatch_sms(self, message, pressed_at=None, to=None, alert=False):
+        """Queue an SMS for the single modem worker (safe from any thread)"""
+        if self.loop is None:
+            return super().dispatch_sms(message, pressed_at, to, alert)  # Loop not up yet
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._enqueue_sms(message, pressed_at, to, alert)
+        else:
+            # Button, GPIO and inbound-SMS callbacks arrive on their own threads
+            self.loop.call_soon_threadsafe(self._enqueue_sms, message, pressed_at, to, alert)
+
+    def _enqueue_sms(self, message, pressed_at, to=None, alert=False):
+        item = (message, to)
+        dropped = self.sms_queue.put(item, alert)
+        if dropped is item:
+            logger.error(f"SMS queue full - dropping: {message[:40]}")
+            self.annunciator.play('failed')
+            return
+        self.sms_ready.set()
+        self._sms_started()
+        if dropped is not None:
+            logger.error(f"SMS queue full - dropping: {dropped[0][:40]}")
+            self._sms_done(False)  # Counted by _sms_started when it was queued
+        if pressed_at is not None and self.button:
+            self.button.record_latency(pressed_at)
+
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Raspberry Pi patient monitor")
+    parser.add_argument("--split-process", action="store_true",
+                        help="Run IMU sampling and fall detection in a dedicated process")
+    parser.add_argument("--rt-priority", type=int, default=0, metavar="N",
+                        help="SCHED_FIFO priority for the sampling process (needs root; 0 = off)")
+    parser.add_argument("--runtime", choices=["threads", "asyncio"], default="threads",
+                        help="Threaded main loop (default) or a single asyncio event loop")
+    parser.add_argument("--ble-fake", action="store_true",
+                        help="Run the BLE gateway against a simulated wearable (no radio needed)")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="Start up, print the time spent per import and init phase "
+                             "until the first sample, then exit")
+    args = parser.parse_args()
+    setup_logging()
     try:
-        app = Monitor()
+        runtime = AsyncMonitor if args.runtime == "asyncio" else Monitor
+        app = runtime(split_process=args.split_process, rt_priority=args.rt_priority,
+                      startup_report=args.startup_report, ble_fake=args.ble_fake)
         app.run()
     except KeyboardInterrupt:
         logger.info("Monitor killed by user")
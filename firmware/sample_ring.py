@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Single-writer shared-memory ring for passing IMU samples between processes.
+
+The sampling process is the only writer. Each slot carries its own sequence
+number: the writer fills the payload, then stamps the slot's sequence, then
+publishes the new write index in the header. Readers keep a private cursor,
+copy a slot, and re-check its sequence afterwards, so a slot overwritten
+mid-copy (reader lapped by the writer) is detected and counted as dropped.
+No locks are shared between the processes.
+
+Header (64 bytes): '<4sHHIQd' magic, version, slot size, capacity,
+write index, writer heartbeat (monotonic seconds), then at offset 28 a
+'<I8f' control block written the other way, by the supervisor: a sequence
+number and the detector parameters in DETECTOR_PARAMS order (settings
+reloaded from config.ini and the power governor's sampling rates). The
+supervisor makes the sequence odd while it writes and even when done, so the
+sampler only takes a complete set, between two samples.
+Slot: '<QdB3x9f' sequence, wall time, kind, nine float payload fields.
+"""
+
+import struct
+import time
+from multiprocessing import shared_memory
+
+MAGIC = b'PMSR'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIQd')
+HEADER_SIZE = 64
+WRITE_INDEX = struct.Struct('<Q')
+WRITE_INDEX_OFFSET = 12
+HEARTBEAT = struct.Struct('<d')
+HEARTBEAT_OFFSET = 20
+CONTROL = struct.Struct('<I8f')
+CONTROL_SEQ = struct.Struct('<I')
+CONTROL_OFFSET = 28
+
+# FallDetector attributes carried by the control block
+DETECTOR_PARAMS = ('idle_rate', 'active_rate', 'threshold_g', 'duration_ms',
+                   'reset_window_s', 'confirm_cooldown_s', 'posture_confirm_s',
+                   'posture_timeout_s')
+
+SLOT = struct.Struct('<QdB3x9f')
+SLOT_SEQ = struct.Struct('<Q')
+
+# Slot kinds
+KIND_IMU = 1      # ax, ay, az, gx, gy, gz, temp, mag, tilt
+KIND_IMU_FAIL = 2 # Sensor read failed (payload unused)
+KIND_FALL = 3     # impact_g, window_ms, tilt, impact age (s before the slot's time)
+
+
+class SampleRing:
+    """Shared-memory ring; create in the supervisor, attach in the sampler"""
+
+    def __init__(self, name=None, capacity=4096, create=False):
+        size = HEADER_SIZE + capacity * SLOT.size
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, SLOT.size, capacity, 0, 0.0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            magic, version, slot_size, capacity, _, _ = HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MAGIC or version != VERSION or slot_size != SLOT.size:
+                raise ValueError(f"shared memory {name} is not a sample ring")
+        self.name = self.shm.name
+        self.capacity = capacity
+        self.owner = create
+        self.read_index = self.write_index  # Readers start at the live edge
+        self.dropped = 0
+
+    @property
+    def write_index(self):
+        return WRITE_INDEX.unpack_from(self.shm.buf, WRITE_INDEX_OFFSET)[0]
+
+    @property
+    def heartbeat(self):
+        """Monotonic time of the writer's last publish"""
+        return HEARTBEAT.unpack_from(self.shm.buf, HEARTBEAT_OFFSET)[0]
+
+    @property
+    def control_seq(self):
+        """Changes whenever the supervisor writes new detector parameters"""
+        return CONTROL_SEQ.unpack_from(self.shm.buf, CONTROL_OFFSET)[0]
+
+    def read_control(self):
+        """(seq, params dict), or None before the first write or mid-write"""
+        seq, *values = CONTROL.unpack_from(self.shm.buf, CONTROL_OFFSET)
+        if seq == 0 or seq & 1 or self.control_seq != seq:
+            return None
+        return seq, dict(zip(DETECTOR_PARAMS, values))
+
+    def write_control(self, params):
+        """Supervisor side: publish a full set of DETECTOR_PARAMS"""
+        buf = self.shm.buf
+        seq = self.control_seq
+        CONTROL_SEQ.pack_into(buf, CONTROL_OFFSET, seq + 1)  # Odd: write in progress
+        CONTROL.pack_into(buf, CONTROL_OFFSET, seq + 1, *(params[k] for k in DETECTOR_PARAMS))
+        CONTROL_SEQ.pack_into(buf, CONTROL_OFFSET, seq + 2)
+
+    # --- Writer side (sampling process) ---
+
+    def publish(self, ts, kind, *payload):
+        """Append one slot; payload is up to nine floats"""
+        buf = self.shm.buf
+        index = self.write_index
+        off = HEADER_SIZE + (index % self.capacity) * SLOT.size
+        fields = (payload + (0.0,) * 9)[:9]
+        # Payload first with the sequence invalidated, then stamp, then publish
+        SLOT_SEQ.pack_into(buf, off, 0)
+        SLOT.pack_into(buf, off, 0, ts, kind, *fields)
+        SLOT_SEQ.pack_into(buf, off, index + 1)
+        WRITE_INDEX.pack_into(buf, WRITE_INDEX_OFFSET, index + 1)
+        HEARTBEAT.pack_into(buf, HEARTBEAT_OFFSET, time.monotonic())
+
+    # --- Reader side (supervisor) ---
+
+    def drain(self, limit=None):
+        """Return new slots as (ts, kind, payload tuple) since the last call"""
+        buf = self.shm.buf
+        head = self.write_index
+        if head - self.read_index > self.capacity:
+            # Writer lapped us: skip to the oldest slot still intact
+            self.dropped += head - self.read_index - self.capacity
+            self.read_index = head - self.capacity
+        out = []
+        while self.read_index < head and (limit is None or len(out) < limit):
+            index = self.read_index
+            off = HEADER_SIZE + (index % self.capacity) * SLOT.size
+            record = SLOT.unpack_from(buf, off)
+            if record[0] != index + 1 or SLOT_SEQ.unpack_from(buf, off)[0] != index + 1:
+                self.dropped += 1  # Overwritten while we were copying it
+            else:
+                out.append((record[1], record[2], record[3:]))
+            self.read_index += 1
+        return out
+
+    def close(self):
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception:
+            pass
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Soak test: the monitor's long-lived state under hours of simulated use.
+
+Builds the real `Monitor` - fall detector, orientation, activity totals,
+flight recorder, GPS parser, GSM handler with its AT channel and SMS outbox,
+telemetry spool and uplink, wearable vitals buffer and the timer wheel with
+the monitor's own periodic jobs - with a simulated patient, GPS, modem,
+server and wearable attached, and runs it on a virtual clock so a day of use
+takes a minute or two. The mix covers what a unit sees in the field: still
+and walking periods, falls and their alerts, a GPS fix every second with
+bursts of line noise, modem URCs and junk, a daily server outage and random
+failed posts.
+
+After a warm-up the run compares tracemalloc snapshots (the allocation sites
+that grew the most) and fits a line to the resident set size sampled every
+ten simulated minutes. Steady-state memory should be flat: the exit status
+is 1 if RSS grows faster than --max-rss-slope KiB per simulated hour or
+traced memory grows by more than --max-growth KiB.
+
+Usage:
+    python3 soak_test.py --hours 24
+    python3 soak_test.py --hours 72 --max-rss-slope 32 --json
+"""
+
+import argparse
+import array
+import atexit
+import gc
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from ble_gateway import FakeWearable
+from fall_detector import STANDARD_GRAVITY, accel_magnitude_g
+from trace_replay import VirtualClock
+import raspberry_pi_monitor as rpm
+
+logger = logging.getLogger("PatientMonitor")
+
+RSS_SAMPLE_S = 600          # Simulated seconds between RSS samples
+WALK_S = 600                # Walking at the start of every simulated hour
+OUTAGE_S = (6 * 3600, 8 * 3600)   # Server down between these offsets into each simulated day
+
+# config.ini for the soak: uplink on (posts go to the simulated server), INFO
+# logging so --verbose shows the heartbeats
+SOAK_CONFIG = """\
+[uplink]
+url = http://127.0.0.1/telemetry
+transport = direct
+
+[logging]
+level = INFO
+"""
+
+
+def nmea(body):
+    """One NMEA sentence with its checksum"""
+    checksum = 0
+    for c in body.encode('ascii'):
+        checksum ^= c
+    return f"${body}*{checksum:02X}\r\n".encode('ascii')
+
+
+class SimModem:
+    """AT transport answering like a registered SIM800L; the soak injects unsolicited text"""
+
+    def __init__(self):
+        self.rx = bytearray()
+        self.lock = threading.Lock()
+        self.sent = 0          # SMS accepted by AT+CMGS
+        self._line = b''
+        self._sms = False      # Taking message text until Ctrl+Z
+
+    def read(self):
+        with self.lock:
+            data = bytes(self.rx)
+            self.rx.clear()
+        return data
+
+    def write(self, data):
+        if self._sms:
+            if b'\x1a' in data:
+                self._sms = False
+                self.sent += 1
+                self.inject(b"\r\n+CMGS: %d\r\n\r\nOK\r\n" % (self.sent % 256))
+            return
+        self._line += data
+        while b'\r\n' in self._line:
+            cmd, self._line = self._line.split(b'\r\n', 1)
+            if cmd.startswith(b'AT+CMGS='):
+                self._sms = True
+                self.inject(b"\r\n> ")
+            elif cmd == b'AT+CREG?':
+                self.inject(b"\r\n+CREG: 0,1\r\n\r\nOK\r\n")
+            elif cmd:
+                self.inject(b"\r\nOK\r\n")
+
+    def inject(self, data):
+        with self.lock:
+            self.rx += data
+
+
+class SoakMonitor(rpm.Monitor):
+    """The monitor with the soak's simulated IMU, GPS, modem and server attached"""
+
+    def __init__(self, soak):
+        self.soak = soak
+        super().__init__(ble_fake=True, clock=soak.clock, monotonic=soak.clock)
+        self.alerts = 0
+
+    def _open_sampler(self):
+        return rpm.Sampler(None, self.config, imu=self.soak, clock=self.clock)
+
+    def _open_gps(self):
+        return rpm.GPSHandler(open_port=False, clock=self.clock)
+
+    def _open_gsm(self):
+        modem = self.soak.modem_io
+        return rpm.GSMHandler(self.config.patient_caregiver_phone, on_message=self._on_sms,
+                              transport=(modem.read, modem.write))
+
+    def _uplink_post(self, body, headers):
+        return self.soak.post(body, headers)
+
+    def trigger_emergency(self, impact_force, reason="FALL", pressed_at=None, impact_at=None):
+        self.alerts += 1
+        super().trigger_emergency(impact_force, reason, pressed_at, impact_at)
+
+
+class Soak:
+    """The simulated patient and surroundings around one SoakMonitor, on one virtual clock"""
+
+    def __init__(self, workdir, seed=0, fall_every_s=7200):
+        self.rng = random.Random(seed)
+        self.clock = VirtualClock(time.time())
+        self.start = self.clock.now
+        self.fall_every_s = fall_every_s
+        self.fall_at = None
+
+        # The monitor keeps its settings, spool, activity log and recorder
+        # ring under these paths
+        rpm.CONFIG_FILE = os.path.join(workdir, "config.ini")
+        rpm.LOG_DIR = workdir
+        rpm.UPLINK_SPOOL_FILE = os.path.join(workdir, "uplink.spool")
+        rpm.ACTIVITY_FILE = os.path.join(workdir, "activity.jsonl")
+        rpm.RECORDER_FILE = os.path.join(workdir, "flight_recorder.ring")
+        rpm.RECORDER_SNAPSHOT_DIR = os.path.join(workdir, "snapshots")
+        with open(rpm.CONFIG_FILE, 'w') as f:
+            f.write(SOAK_CONFIG)
+
+        self.modem_io = SimModem()
+        self.wearable = FakeWearable(seed=seed)
+        self.monitor = SoakMonitor(self)
+
+        every = self.monitor.timers.every
+        every("sim_gps", 1.0, self._gps_fix)
+        every("sim_gps_noise", 300, self._gps_noise, jitter_s=60)
+        every("sim_modem_urc", 20, self._modem_urc, jitter_s=10)
+        every("sim_modem_command", 600, lambda: self.monitor.gsm.modem.command("AT+CSQ", timeout=1))
+        every("sim_wearable", self.wearable.interval_s, self._wearable)
+        every("sim_fall", fall_every_s, self._fall, first_in=fall_every_s / 2)
+
+    # --- Simulated inputs ---
+
+    def read_all(self):
+        """IMU reading for the sampler: the simulated patient at the current time"""
+        offset = self.clock.now - self.start
+        rng = self.rng
+        x, z = 0.0, 1.0
+        if offset % 3600 < WALK_S:
+            z += 0.5 * math.sin(2 * math.pi * 1.8 * offset)
+        if self.fall_at is not None:
+            since = self.clock.now - self.fall_at
+            if since < 0.15:
+                z = 3.5
+            elif since < 60:
+                x, z = 1.0, 0.0  # Lying down
+            else:
+                self.fall_at = None
+        accel = ((x + rng.gauss(0, 0.03)) * STANDARD_GRAVITY, rng.gauss(0, 0.03) * STANDARD_GRAVITY,
+                 (z + rng.gauss(0, 0.03)) * STANDARD_GRAVITY)
+        gyro = (rng.gauss(0, 0.02), rng.gauss(0, 0.02), rng.gauss(0, 0.02))
+        return rpm.ImuSample(accel, gyro, 31.0, accel_magnitude_g(accel), True)
+
+    def _fall(self):
+        self.fall_at = self.clock.now
+
+    def _gps_fix(self):
+        t = time.gmtime(self.clock.now)
+        hhmmss = time.strftime('%H%M%S', t)
+        lat = 4807.038 + self.rng.uniform(-0.01, 0.01)
+        self.monitor.gps.feed(
+            nmea(f"GPGGA,{hhmmss}.00,{lat:.3f},N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,") +
+            nmea(f"GPRMC,{hhmmss}.00,A,{lat:.3f},N,01131.000,E,0.1,0.0,"
+                 f"{time.strftime('%d%m%y', t)},,,A"))
+
+    def _gps_noise(self):
+        # Baud-rate garbage without line ends, then a sentence cut short
+        gps = self.monitor.gps
+        gps.feed(bytes(self.rng.randrange(32, 127) for _ in range(self.rng.randrange(100, 2000))))
+        gps.feed(b"$GPGGA,1,2,N,3\r\n$GPGGA,x,y,N,z,E,Q,R,,,\r\n")
+
+    def _modem_urc(self):
+        junk = self.rng.choice((b"\r\nRING\r\n", b'\r\n+CMTI: "SM",3\r\n', b"\r\n+CSQ: 17,0\r\n",
+                                b"\r\nUNDER-VOLTAGE WARNNING\r\n", b"\xff\xfe" * 700))
+        self.modem_io.inject(junk)
+
+    def _wearable(self):
+        self.monitor.ble._on_notify(None, self.wearable.payload(self.rng.random() < 0.5))
+
+    def post(self, body, headers):
+        """The telemetry server: down for OUTAGE_S each day, and some posts fail"""
+        day_offset = (self.clock.now - self.start) % 86400
+        if OUTAGE_S[0] <= day_offset < OUTAGE_S[1] or self.rng.random() < 0.1:
+            return None
+        return 200
+
+    # --- Driving it ---
+
+    def run(self, hours, warmup_h, on_warm, on_rss):
+        """Simulate `hours`; calls on_warm() once after the warm-up and
+        on_rss(simulated hours) every RSS_SAMPLE_S after that"""
+        end = self.start + hours * 3600
+        warm_at = self.start + warmup_h * 3600
+        next_rss = None
+        clock, monitor = self.clock, self.monitor
+        sampler, timers = monitor.sampler, monitor.timers
+        while clock.now < end:
+            # Monitor.run's loop, with the sleep replaced by a clock step
+            monitor._on_sample(*sampler.sample())
+            clock.now += 1.0 / sampler.detector.sample_rate(sampler.last_mag)
+            timers.run_due()
+
+            if next_rss is None:
+                if clock.now >= warm_at:
+                    on_warm()
+                    next_rss = clock.now
+            if next_rss is not None and clock.now >= next_rss:
+                on_rss((clock.now - self.start) / 3600)
+                next_rss += RSS_SAMPLE_S
+
+    def close(self):
+        """The monitor's shutdown, now rather than at exit (the workdir goes first)"""
+        monitor = self.monitor
+        for hook in (monitor._close_activity, monitor._close_recorder, monitor._close_uplink):
+            atexit.unregister(hook)
+            hook()
+        monitor.gsm.modem.stop()
+
+
+def slope(points):
+    """Least-squares slope of (x, y) points"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    sxx = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / sxx if sxx else 0.0
+
+
+def _traced(snapshot):
+    return snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                   tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                                   tracemalloc.Filter(False, "<unknown>")))
+
+
+def run_soak(hours, warmup_h=1.0, seed=0, fall_every_s=7200, top=10, trace=True):
+    """Run the soak; returns a result dict (see main for the fields)"""
+    if trace:
+        tracemalloc.start()
+    # Arrays, so the samples themselves do not show up as growth
+    rss_h, rss_kib = array.array('d'), array.array('d')
+    state = {'baseline': None}
+
+    def on_warm():
+        gc.collect()
+        if trace:
+            state['baseline'] = _traced(tracemalloc.take_snapshot())
+
+    def on_rss(sim_h):
+        rss = rpm.resident_kib()
+        if rss is not None:
+            rss_h.append(sim_h)
+            rss_kib.append(rss)
+
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory(prefix="soak_") as workdir:
+        soak = Soak(workdir, seed=seed, fall_every_s=fall_every_s)
+        try:
+            soak.run(hours, warmup_h, on_warm, on_rss)
+        finally:
+            soak.close()
+        elapsed = time.monotonic() - started
+        gc.collect()
+
+        growth, top_growth = None, []
+        if trace and state['baseline'] is not None:
+            diff = _traced(tracemalloc.take_snapshot()).compare_to(state['baseline'], 'lineno')
+            growth = sum(d.size_diff for d in diff) / 1024
+            diff.sort(key=lambda d: d.size_diff, reverse=True)
+            top_growth = [{'site': f"{os.path.basename(d.traceback[0].filename)}:{d.traceback[0].lineno}",
+                           'kib': round(d.size_diff / 1024, 1), 'blocks': d.count_diff}
+                          for d in diff[:top] if d.size_diff > 0]
+        traced_peak = tracemalloc.get_traced_memory()[1] / 1024 if trace else None
+        if trace:
+            tracemalloc.stop()
+        rss = list(zip(rss_h, rss_kib))
+        monitor = soak.monitor
+        return {
+            'hours': hours, 'elapsed_s': round(elapsed, 1), 'samples': monitor.iterations,
+            'alerts': monitor.alerts, 'sms_sent': soak.modem_io.sent,
+            'sms_dropped': monitor.gsm.outbox.dropped,
+            'gps_discarded': monitor.gps.discarded, 'modem_dropped': monitor.gsm.modem.dropped,
+            'uplink_records': monitor.uplink.records_sent,
+            'spool_dropped': monitor.uplink.spool.dropped,
+            'rss_first_kib': int(rss_kib[0]) if rss else None, 'rss_last_kib': int(rss_kib[-1]) if rss else None,
+            'rss_slope_kib_h': round(slope(rss), 2) if rss else None,
+            'traced_growth_kib': None if growth is None else round(growth, 1),
+            'traced_peak_kib': None if traced_peak is None else round(traced_peak),
+            'top_growth': top_growth,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak the monitor's long-lived state at accelerated time")
+    parser.add_argument("--hours", type=float, default=24, help="Simulated hours to run")
+    parser.add_argument("--warmup", type=float, default=1.0,
+                        help="Simulated hours before the baseline is taken")
+    parser.add_argument("--fall-every", type=float, default=120, metavar="MIN",
+                        help="Simulated minutes between falls")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the simulation")
+    parser.add_argument("--max-rss-slope", type=float, default=64,
+                        help="Fail above this RSS growth (KiB per simulated hour)")
+    parser.add_argument("--max-growth", type=float, default=256,
+                        help="Fail above this traced memory growth since the warm-up (KiB)")
+    parser.add_argument("--top", type=int, default=10, help="Allocation sites to list")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="Measure RSS only (runs faster, no allocation sites)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show component log output")
+    args = parser.parse_args(argv)
+    if args.warmup >= args.hours:
+        parser.error("--warmup must be shorter than --hours")
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)  # The monitor sets its own level from config.ini
+
+    result = run_soak(args.hours, args.warmup, args.seed, args.fall_every * 60, args.top,
+                      trace=not args.no_tracemalloc)
+    failures = []
+    if result['rss_slope_kib_h'] is not None and result['rss_slope_kib_h'] > args.max_rss_slope:
+        failures.append(f"RSS slope {result['rss_slope_kib_h']:+.1f} KiB/h > {args.max_rss_slope:g}")
+    if result['traced_growth_kib'] is not None and result['traced_growth_kib'] > args.max_growth:
+        failures.append(f"traced growth {result['traced_growth_kib']:+.1f} KiB > {args.max_growth:g}")
+    result['failures'] = failures
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        r = result
+        print(f"Soak: {r['hours']:g} simulated hours in {r['elapsed_s']:.0f}s "
+              f"(x{r['hours'] * 3600 / max(r['elapsed_s'], 1e-9):.0f}), {r['samples']} samples, "
+              f"{r['alerts']} alerts, {r['sms_sent']} SMS sent")
+        print(f"Caps: GPS noise {r['gps_discarded']}B, modem {r['modem_dropped']}B, "
+              f"SMS {r['sms_dropped']}, spool {r['spool_dropped']} records dropped | "
+              f"uplink sent {r['uplink_records']} records")
+        if r['rss_slope_kib_h'] is None:
+            print("RSS: not available (no /proc)")
+        else:
+            print(f"RSS: {r['rss_first_kib'] / 1024:.1f} -> {r['rss_last_kib'] / 1024:.1f} MiB, "
+                  f"slope {r['rss_slope_kib_h']:+.1f} KiB/h (limit {args.max_rss_slope:g})")
+        if r['traced_growth_kib'] is not None:
+            print(f"Traced: {r['traced_growth_kib']:+.1f} KiB since warm-up (limit {args.max_growth:g}), "
+                  f"peak {r['traced_peak_kib']} KiB")
+            for site in r['top_growth']:
+                print(f"  {site['kib']:+8.1f} KiB {site['blocks']:+6d} blocks  {site['site']}")
+        print("FAIL: " + "; ".join(failures) if failures else "PASS")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Deferred imports and startup timing for the monitor.
+
+`lazy_import('board', globals())` returns a placeholder that imports the real
+module the first time one of its attributes is used, then puts the module in
+the caller's namespace in its own place so later lookups cost nothing extra.
+Backends that are never used are never imported: the split-process
+supervisor never loads Blinka, and the threaded runtime never loads asyncio.
+`module_available` asks the import system whether a module is installed
+without running it.
+
+StartupTimer records init phases and the lazy imports they trigger, for the
+one-line startup log and `--startup-report`.
+"""
+
+import contextlib
+import importlib
+import importlib.util
+import os
+import sys
+import time
+
+
+class StartupTimer:
+    """Wall-clock startup phases and imports, measured from `start`"""
+
+    def __init__(self, start=None, clock=time.perf_counter):
+        self.clock = clock
+        self.start = clock() if start is None else start
+        self.entries = []  # (offset_s, duration_s, kind, name)
+        self.milestones = {}
+        self._lap_start = self.start
+
+    def lap(self, name, kind='init'):
+        """Close a phase that ran from the previous lap (or start) until now"""
+        now = self.clock()
+        self.entries.append((self._lap_start - self.start, now - self._lap_start, kind, name))
+        self._lap_start = now
+
+    @contextlib.contextmanager
+    def phase(self, name, kind='init'):
+        """Time a block that is not part of the lap sequence"""
+        begin = self.clock()
+        try:
+            yield
+        finally:
+            self.entries.append((begin - self.start, self.clock() - begin, kind, name))
+
+    def record(self, name, begin, end, kind='import'):
+        """Add a span measured elsewhere (a lazy import)"""
+        self.entries.append((begin - self.start, end - begin, kind, name))
+
+    def mark(self, name):
+        """Remember when a milestone was reached; returns seconds since start"""
+        elapsed = self.clock() - self.start
+        self.milestones.setdefault(name, elapsed)
+        return elapsed
+
+    def report(self):
+        """Human-readable breakdown, in start order"""
+        lines = []
+        age = process_age()
+        if age is not None:
+            before = age - (self.clock() - self.start)
+            lines.append(f"{'':>9} {max(0.0, before):8.3f}s  interpreter start (before the monitor module ran)")
+        # Longest first at equal offsets, so enclosing phases print above what they contain
+        entries = sorted(self.entries, key=lambda e: (e[0], -e[1]))
+        for offset, duration, kind, name in entries:
+            depth = sum(1 for o, d, _, _ in entries
+                        if (o, d) != (offset, duration) and o <= offset and offset + duration <= o + d)
+            lines.append(f"{offset:+8.3f}s {duration:8.3f}s  {'  ' * depth}{kind:<6} {name}")
+        for name, elapsed in sorted(self.milestones.items(), key=lambda m: m[1]):
+            lines.append(f"{elapsed:+8.3f}s {'':>9}  {name}")
+        return "\n".join(lines)
+
+
+def process_age():
+    """Seconds since this process was started (Linux /proc), or None"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (starttime) follows the parenthesised command name
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def module_available(name):
+    """True if `name` is installed, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Placeholder for a module imported on first attribute access"""
+    __slots__ = ('_name', '_namespace', '_alias', '_timer')
+
+    def __init__(self, name, namespace, alias, timer=None):
+        self._name = name
+        self._namespace = namespace
+        self._alias = alias
+        self._timer = timer
+
+    def _load(self):
+        begin = time.perf_counter()
+        loaded = self._name in sys.modules
+        module = importlib.import_module(self._name)
+        if self._timer is not None and not loaded:
+            self._timer.record(self._name, begin, time.perf_counter())
+        if self._namespace.get(self._alias) is self:
+            self._namespace[self._alias] = module  # Later lookups skip the placeholder
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+def lazy_import(name, namespace, alias=None, timer=None):
+    """Bind a LazyModule for `name` as `alias` (default: last name part) in `namespace`
+
+    The import's duration is recorded in `timer` (a StartupTimer) when given.
+    """
+    alias = alias or name.rpartition('.')[2]
+    module = LazyModule(name, namespace, alias, timer)
+    namespace[alias] = module
+    return module
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Batched telemetry uplink: a disk spool of JSON records posted in batches.
+
+Fixes, heartbeats and alert records are appended to a line-per-record spool
+file as they happen. `TelemetryUplink.flush()` posts what is waiting as one
+gzip-compressed JSON batch (`{"device", "batch", "records": [...]}`) once
+enough has accumulated (`batch_bytes`) or the oldest record is old enough
+(`max_age_s`); an urgent record (an alert) makes the next check flush at once.
+
+Delivery is at-least-once and resumable. The spool's read cursor only moves
+past a batch after the endpoint answers 2xx, and is kept on disk, so a
+dropped connection, a modem reset or a reboot resumes from the first
+unacknowledged record. A retried batch carries the same id (device plus the
+first-last record sequence numbers, also sent as `Idempotency-Key`) so the
+server can discard duplicates. A long backlog goes out as several batches,
+each acknowledged on its own. Failed posts back off exponentially.
+
+Hardware-free: `post(body, headers)` is supplied by the caller and returns the
+HTTP status (or None when nothing got through) - the SIM800L's AT+HTTP stack
+on the device, `post_direct` (urllib) over the Pi's own network or against a
+local HTTP stand-in.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("PatientMonitor")
+
+
+class TelemetrySpool:
+    """Append-only record file with a persistent read cursor (thread-safe)"""
+
+    def __init__(self, path, max_bytes=512 * 1024):
+        self.path = path
+        self.cursor_path = path + ".sent"
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.dropped = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'ab+')
+        self.acked = self._read_cursor()  # Sequence number of the last delivered record
+        self.next_seq = self.acked + 1
+        self.offset = 0         # File position of the first undelivered record
+        self.pending = 0        # Records from there on
+        self.pending_bytes = 0
+        self.oldest = None      # Timestamp of the oldest of them
+        self._scan()
+
+    def _read_cursor(self):
+        try:
+            with open(self.cursor_path) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 0
+
+    def _write_cursor(self):
+        # A sequence number, not a file offset, so it stays right across compaction
+        tmp = self.cursor_path + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(f"{self.acked}\n")
+        os.replace(tmp, self.cursor_path)
+
+    def _scan(self):
+        """Find the undelivered tail at startup; cut a record torn by a power cut"""
+        self._file.seek(0)
+        end = 0
+        for line in self._file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            end += len(line)
+            if record['seq'] <= self.acked:
+                self.offset = end
+                continue
+            if self.oldest is None:
+                self.oldest = record.get('t')
+            self.pending += 1
+            self.pending_bytes += len(line)
+            self.next_seq = max(self.next_seq, record['seq'] + 1)
+        if end < os.path.getsize(self.path):
+            logger.warning(f"Uplink spool: discarding {os.path.getsize(self.path) - end} torn bytes")
+            self._file.truncate(end)
+
+    def append(self, record):
+        """Store one record (a dict with 't'); returns its sequence number"""
+        with self.lock:
+            seq = self.next_seq
+            line = json.dumps(dict(record, seq=seq), separators=(',', ':')).encode() + b'\n'
+            if self.pending_bytes + len(line) > self.max_bytes:
+                self._drop_oldest(len(line))
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(line)
+            self._file.flush()
+            self.next_seq += 1
+            self.pending += 1
+            self.pending_bytes += len(line)
+            if self.oldest is None:
+                self.oldest = record.get('t')
+            return seq
+
+    def _drop_oldest(self, need):
+        """Spool full (long outage): the oldest records give way to new ones"""
+        self._file.seek(self.offset)
+        lines, freed = [], 0
+        while self.pending_bytes - freed + need > self.max_bytes * 3 // 4:
+            line = self._file.readline()
+            if not line:
+                break
+            lines.append(line)
+            freed += len(line)
+        if lines:
+            self.dropped += len(lines)
+            logger.warning(f"Uplink spool full - dropped {len(lines)} oldest records")
+            self._advance(lines, self.offset + freed)
+
+    def peek(self, max_bytes):
+        """(lines, last_seq) of the next batch: whole records up to max_bytes, at least one"""
+        with self.lock:
+            self._file.seek(self.offset)
+            lines, size = [], 0
+            for line in self._file:
+                if len(lines) >= self.pending or (lines and size + len(line) > max_bytes):
+                    break
+                lines.append(line.rstrip(b'\n'))
+                size += len(line)
+            return lines, json.loads(lines[-1])['seq'] if lines else self.acked
+
+    def commit(self, last_seq):
+        """Records up to `last_seq` (a batch from peek()) were delivered
+
+        While the batch was in flight a full spool may have dropped some or
+        all of it and compacted the file, so the records are looked up by
+        sequence number rather than by the offsets peek() saw.
+        """
+        with self.lock:
+            self._file.seek(self.offset)
+            lines, size = [], 0
+            while len(lines) < self.pending:
+                line = self._file.readline()
+                if not line or json.loads(line)['seq'] > last_seq:
+                    break
+                lines.append(line)
+                size += len(line)
+            if lines:
+                self._advance(lines, self.offset + size)
+
+    def _advance(self, lines, end_offset):
+        self.acked = json.loads(lines[-1])['seq']
+        self.pending_bytes -= end_offset - self.offset
+        self.pending -= len(lines)
+        self.offset = end_offset
+        self.oldest = None
+        if self.pending:
+            self._file.seek(self.offset)
+            self.oldest = json.loads(self._file.readline()).get('t')
+        self._write_cursor()
+        if self.pending == 0 or self.offset > self.max_bytes:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the spool without its delivered head"""
+        self._file.seek(self.offset)
+        rest = self._file.read()
+        tmp = self.path + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(rest)
+        os.replace(tmp, self.path)
+        self._file.close()
+        self._file = open(self.path, 'ab+')
+        self.offset = 0
+
+    def close(self):
+        with self.lock:
+            self._file.close()
+
+
+def encode_batch(device, lines, compress=True):
+    """(body, headers, batch_id) for spooled record lines"""
+    first = json.loads(lines[0])['seq']
+    last = json.loads(lines[-1])['seq']
+    batch_id = f"{device}-{first}-{last}"
+    body = (b'{"device":' + json.dumps(device).encode() +
+            b',"batch":"' + batch_id.encode() + b'","records":[' + b','.join(lines) + b']}')
+    headers = {'Content-Type': 'application/json', 'Idempotency-Key': batch_id}
+    if compress:
+        body = gzip.compress(body, mtime=0)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers, batch_id
+
+
+def post_direct(url, body, headers, timeout=30):
+    """POST over the host's own network (urllib); returns the HTTP status or None"""
+    import urllib.error
+    import urllib.request  # Pulls in ssl and http.client: only when this transport is used
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError) as e:
+        logger.warning(f"Uplink POST failed: {e}")
+        return None
+
+
+class TelemetryUplink:
+    """Size/age flush policy, retries and back-off over a TelemetrySpool"""
+
+    def __init__(self, spool, post, device, batch_bytes=4096, max_age_s=300,
+                 compress=True, backoff_s=(15, 900), clock=time.time):
+        self.spool = spool
+        self.post = post
+        self.device = device
+        self.batch_bytes = batch_bytes
+        self.max_age_s = max_age_s
+        self.compress = compress
+        self.backoff_s = backoff_s  # (first retry, cap)
+        self.clock = clock
+        self.urgent = False
+        self.failures = 0   # Consecutive failed posts
+        self.retry_at = 0.0
+        self.batches = 0
+        self.records_sent = 0
+        self.bytes_sent = 0
+        self.last_success = None
+
+    def add(self, kind, urgent=False, **fields):
+        """Spool one record of `kind` (fix, heartbeat, alert, ...)"""
+        self.spool.append(dict(fields, type=kind, t=round(self.clock(), 1)))
+        if urgent:
+            self.urgent = True
+            self.retry_at = 0.0  # An alert is worth a retry now
+
+    def due(self, now=None):
+        """True when the flush policy says to post now"""
+        spool = self.spool
+        if not spool.pending:
+            return False
+        now = self.clock() if now is None else now
+        if now < self.retry_at:
+            return False
+        return (self.urgent or spool.pending_bytes >= self.batch_bytes or
+                (spool.oldest is not None and now - spool.oldest >= self.max_age_s))
+
+    def flush(self):
+        """Post what is waiting now, batch by batch; returns True if all of it went"""
+        spool = self.spool
+        last = spool.next_seq - 1  # Records added meanwhile wait for the next flush
+        while spool.pending and spool.acked < last:
+            lines, last_seq = spool.peek(self.batch_bytes)
+            body, headers, batch_id = encode_batch(self.device, lines, self.compress)
+            try:
+                status = self.post(body, headers)
+            except Exception as e:
+                logger.warning(f"Uplink transport error: {e}")
+                status = None
+            if status is None or not 200 <= status < 300:
+                self.failures += 1
+                delay = min(self.backoff_s[1], self.backoff_s[0] * 2 ** (self.failures - 1))
+                self.retry_at = self.clock() + delay
+                logger.warning(f"Uplink batch {batch_id} failed ({status}); "
+                               f"{spool.pending} records wait, retry in {delay:g}s")
+                return False
+            spool.commit(last_seq)
+            self.failures = 0
+            self.batches += 1
+            self.records_sent += len(lines)
+            self.bytes_sent += len(body)
+            self.last_success = self.clock()
+            logger.info(f"Uplink batch {batch_id}: {len(lines)} records in {len(body)} bytes ({status})")
+        self.urgent = False
+        return True
+
+    def summary(self):
+        return (f"Uplink: {self.batches} batches, {self.records_sent} records, {self.bytes_sent} bytes | "
+                f"waiting {self.spool.pending} | failures {self.failures} | dropped {self.spool.dropped}")
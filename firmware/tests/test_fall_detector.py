@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the fall detector state machine and its posture stage.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fall_detector import STANDARD_GRAVITY, FallDetector
+from orientation import OrientationEstimator
+
+G = STANDARD_GRAVITY
+UPRIGHT = (0.0, 0.0, G)
+LYING = (G, 0.0, 0.0)
+STILL = (0.0, 0.0, 0.0)
+
+
+class FakeClock:
+    """Wall clock the test moves by hand"""
+
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class DetectorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("PatientMonitor").disabled = True
+        self.clock = FakeClock()
+        self.start = self.clock.t
+
+    def tearDown(self):
+        logging.getLogger("PatientMonitor").disabled = False
+
+    def run_magnitudes(self, detector, seconds, mag, rate_hz=100):
+        """Feed a constant magnitude; returns the clock offsets of confirmed falls"""
+        falls = []
+        for _ in range(int(round(seconds * rate_hz))):
+            self.clock.t += 1.0 / rate_hz
+            if detector.update(mag):
+                falls.append(self.clock.t - self.start)
+        return falls
+
+
+class ImpactWindowTest(DetectorTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.detector = FallDetector(threshold_g=2.0, duration_ms=40, posture=None,
+                                     clock=self.clock)
+
+    def test_sustained_impact_confirms(self):
+        self.assertEqual(self.run_magnitudes(self.detector, 1, 1.0), [])
+        falls = self.run_magnitudes(self.detector, 0.06, 3.2)
+        falls += self.run_magnitudes(self.detector, 1, 1.0)
+        self.assertEqual(len(falls), 1)
+        self.assertAlmostEqual(falls[0], 1.05, delta=0.011)
+        self.assertEqual(self.detector.last_impact_g, 3.2)
+        self.assertAlmostEqual(self.detector.last_impact_t, self.start + 1.01)
+        self.assertEqual(self.detector.fall_stage, 0)
+
+    def test_brief_spike_resets(self):
+        self.run_magnitudes(self.detector, 0.02, 3.2)
+        self.assertEqual(self.detector.fall_stage, 1)
+        self.assertEqual(self.run_magnitudes(self.detector, 0.03, 1.0), [])
+        self.assertEqual(self.detector.fall_stage, 1)  # Quiet, but inside the reset window
+        self.run_magnitudes(self.detector, 0.3, 1.0)
+        self.assertEqual(self.detector.fall_stage, 0)
+
+    def test_second_impact_inside_cooldown_is_dropped(self):
+        self.assertEqual(len(self.run_magnitudes(self.detector, 0.06, 3.0)), 1)
+        self.run_magnitudes(self.detector, 10, 1.0)
+        self.assertEqual(self.run_magnitudes(self.detector, 0.06, 3.0), [])
+        self.assertEqual(self.detector.fall_stage, 0)
+        self.run_magnitudes(self.detector, 60, 1.0)
+        self.assertEqual(len(self.run_magnitudes(self.detector, 0.06, 3.0)), 1)
+
+    def test_sample_rate_follows_motion_and_stage(self):
+        self.assertEqual(self.detector.sample_rate(1.0), self.detector.idle_rate)
+        self.assertEqual(self.detector.sample_rate(1.6), self.detector.active_rate)
+        self.run_magnitudes(self.detector, 0.02, 3.0)
+        self.assertEqual(self.detector.sample_rate(1.0), self.detector.active_rate)
+
+
+class PostureStageTest(DetectorTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.posture = OrientationEstimator()
+        self.detector = FallDetector(threshold_g=2.0, duration_ms=40, posture=self.posture,
+                                     posture_confirm_s=5.0, posture_timeout_s=15.0,
+                                     clock=self.clock)
+
+    def feed(self, seconds, accel, gyro=STILL, rate_hz=50):
+        """Drive estimator and detector together like the monitor loop"""
+        falls = []
+        for _ in range(int(round(seconds * rate_hz))):
+            self.clock.t += 1.0 / rate_hz
+            self.posture.update(accel, gyro, self.clock.t)
+            if self.detector.update(sum(c * c for c in accel) ** 0.5 / G):
+                falls.append(self.clock.t - self.start)
+        return falls
+
+    def impact(self):
+        self.feed(1, UPRIGHT)
+        self.assertEqual(self.feed(0.1, (0.0, 0.0, 3.5 * G)), [])
+        self.assertEqual(self.detector.fall_stage, 2)
+
+    def test_lying_still_confirms(self):
+        self.impact()
+        falls = self.feed(10, LYING)
+        self.assertEqual(len(falls), 1)
+        self.assertGreater(falls[0] - 1.1, 5.0)
+        self.assertLess(falls[0] - 1.1, 7.0)
+        self.assertAlmostEqual(self.detector.last_impact_g, 3.5)
+
+    def test_getting_up_cancels(self):
+        self.impact()
+        self.assertEqual(self.feed(20, UPRIGHT), [])
+        self.assertEqual(self.detector.fall_stage, 0)
+
+    def test_restless_posture_times_out(self):
+        self.impact()
+        # Lying but moving about: never still, never upright
+        falls = self.feed(20, LYING, gyro=(0.0, 0.0, 1.0))
+        self.assertEqual(len(falls), 1)
+        self.assertAlmostEqual(falls[0] - 1.1, 15.0, delta=0.2)
+
+    def test_lying_before_impact_does_not_count(self):
+        self.feed(10, LYING)
+        self.feed(0.1, (3.5 * G, 0.0, 0.0))
+        self.assertEqual(self.detector.fall_stage, 2)
+        # Lying still since before the impact; only time after it counts
+        self.assertEqual(self.feed(3, LYING), [])
+        self.assertEqual(len(self.feed(3, LYING)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the flight recorder ring and snapshots.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flight_recorder
+from flight_recorder import (KIND_GPS, KIND_IMU, FlightRecorder, read_records,
+                             read_snapshot_info)
+
+T0 = 1760000000.0
+
+
+class FlightRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "ring.bin")
+        self.snapshots = os.path.join(self.dir, "snapshots")
+        self.recorder = FlightRecorder(self.path, capacity=100, snapshot_dir=self.snapshots,
+                                       pre_trigger_s=1.0, post_trigger_s=0.5)
+
+    def tearDown(self):
+        self.recorder.close()
+        shutil.rmtree(self.dir)
+
+    def record(self, start_s, end_s, rate_hz=50):
+        for i in range(int(round((end_s - start_s) * rate_hz))):
+            ts = T0 + start_s + i / rate_hz
+            self.recorder.record_imu(ts, (0.0, 0.0, 9.8), (0.0, 0.0, 0.0), 30.0)
+
+    def wait_for_snapshots(self, count):
+        """Snapshots are saved on a background thread"""
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if os.path.isdir(self.snapshots):
+                names = sorted(n for n in os.listdir(self.snapshots) if n.endswith(".bin"))
+                if len(names) >= count:
+                    return [os.path.join(self.snapshots, n) for n in names]
+            time.sleep(0.01)
+        self.fail(f"expected {count} snapshot(s)")
+
+    def test_ring_keeps_newest_records_in_order(self):
+        self.record(0, 3)  # 150 records into a 100-record ring
+        self.recorder.record_gps(T0 + 3.0, 10.5, 76.25, 7)
+        self.recorder.mm.flush()
+        records = read_records(self.path)
+        self.assertEqual(len(records), 100)
+        times = [r[0] for r in records]
+        self.assertEqual(times, sorted(times))
+        self.assertAlmostEqual(times[0], T0 + 51 / 50)
+        self.assertEqual(records[-1][1:], (KIND_GPS, 10.5, 76.25, 7))
+        self.assertEqual(records[0][1], KIND_IMU)
+
+    def test_ring_resumes_after_reopen(self):
+        self.record(0, 1)
+        self.recorder.close()
+        self.recorder = FlightRecorder(self.path, capacity=100, snapshot_dir=self.snapshots)
+        self.assertEqual(self.recorder.head, 50)
+        self.record(1, 2)
+        self.assertEqual(len(read_records(self.path)), 100)
+
+    def test_ring_reset_when_capacity_changes(self):
+        self.record(0, 1)
+        self.recorder.close()
+        self.recorder = FlightRecorder(self.path, capacity=64, snapshot_dir=self.snapshots)
+        self.assertEqual(self.recorder.head, 0)
+        self.assertEqual(read_records(self.path), [])
+
+    def test_trigger_waits_for_post_window(self):
+        self.record(0, 1)
+        self.recorder.trigger("FALL", T0 + 0.98)
+        self.record(1, 1.2)
+        self.assertFalse(os.path.isdir(self.snapshots))
+        self.record(1.2, 2)
+        path, = self.wait_for_snapshots(1)
+        trigger_ts, count, reason = read_snapshot_info(path)
+        self.assertEqual((trigger_ts, reason), (T0 + 0.98, "FALL"))
+        times = [r[0] for r in read_records(path)]
+        self.assertEqual(len(times), count)
+        self.assertGreaterEqual(times[0], T0 - 0.02)
+        self.assertLessEqual(times[-1], T0 + 1.48)
+        self.assertAlmostEqual(times[-1] - times[0], 1.48, places=6)
+
+    def test_pre_window_larger_than_ring(self):
+        self.record(0, 3)
+        path = self.recorder.snapshot_now("DUMP", T0 + 3.0, pre_s=60.0)
+        self.wait_for_snapshots(1)
+        self.assertEqual(read_snapshot_info(path)[1], 100)
+
+    def test_flush_pending_writes_early(self):
+        self.record(0, 1)
+        self.recorder.trigger("SOS", T0 + 0.5)
+        self.recorder.flush_pending(T0 + 0.7)
+        path, = self.wait_for_snapshots(1)
+        self.assertLessEqual(read_records(path)[-1][0], T0 + 0.7)
+
+    def test_pending_triggers_are_capped(self):
+        with self.assertLogs("PatientMonitor", "WARNING") as logs:
+            for i in range(flight_recorder.MAX_PENDING + 3):
+                self.recorder.trigger("FALL", T0 + i)
+        self.assertEqual(len(logs.output), 3)
+        self.assertEqual(len(self.recorder._pending), flight_recorder.MAX_PENDING)
+
+    def test_old_snapshots_pruned(self):
+        self.recorder.max_snapshots = 3
+        self.record(0, 1)
+        paths = []
+        for i in range(5):
+            paths.append(self.recorder.snapshot_now("DUMP", T0 + i))
+            self.wait_for_snapshots(min(i + 1, 3))
+        deadline = time.time() + 5
+        while sorted(os.listdir(self.snapshots)) != sorted(map(os.path.basename, paths[2:])):
+            if time.time() > deadline:
+                self.fail(f"left behind: {sorted(os.listdir(self.snapshots))}")
+            time.sleep(0.01)
+
+    def test_read_records_rejects_other_files(self):
+        other = os.path.join(self.dir, "other.bin")
+        with open(other, 'wb') as f:
+            f.write(b'\0' * 128)
+        with self.assertRaises(ValueError):
+            read_records(other)
+
+
+if __name__ == "__main__":
+    unittest.main()
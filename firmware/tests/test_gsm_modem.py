@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the outgoing SMS queue and the command whitelist match.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gsm_modem import SmsOutbox, SmsQueue, e164, same_number
+
+
+class SmsQueueTest(unittest.TestCase):
+    """A full queue never drops an alert"""
+
+    def test_alert_displaces_oldest_ordinary(self):
+        q = SmsQueue(3)
+        for text in ("a", "b", "c"):
+            self.assertIsNone(q.put(text))
+        self.assertEqual(q.put("d"), "d")  # Ordinary SMS refused when full
+        self.assertEqual(q.put("FALL", alert=True), "a")
+        self.assertEqual([q.get() for _ in range(len(q))], ["FALL", "b", "c"])
+
+    def test_alerts_only_goes_over_the_limit(self):
+        q = SmsQueue(2)
+        for i in range(4):
+            self.assertIsNone(q.put(f"PANIC{i}", alert=True))
+        self.assertEqual([q.get() for _ in range(len(q))], ["PANIC0", "PANIC1", "PANIC2", "PANIC3"])
+
+
+class SmsOutboxTest(unittest.TestCase):
+    """A stalled modem with a full outbox still sends the alert next"""
+
+    def test_alert_sent_before_queued_ordinary(self):
+        release = threading.Event()
+        sent = []
+        done = []
+
+        def send(message, to):
+            release.wait(5)
+            sent.append(message)
+            return True
+
+        outbox = SmsOutbox(send, maxsize=4)
+        outbox.submit("busy")  # Taken by the worker, blocks in send
+        while outbox.pending():
+            time.sleep(0.01)
+        for i in range(4):
+            self.assertTrue(outbox.submit(f"STATUS{i}", on_done=done.append))
+        self.assertFalse(outbox.submit("STATUS4"))
+        finished = threading.Event()
+        self.assertTrue(outbox.submit("FALL_ALERT", alert=True, on_done=lambda ok: finished.set()))
+        self.assertEqual(done, [False])  # STATUS0 made room
+        self.assertEqual(outbox.dropped, 2)
+        release.set()
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(sent[:2], ["busy", "FALL_ALERT"])
+
+
+class SameNumberTest(unittest.TestCase):
+    """Only the whitelisted number itself may send commands"""
+
+    def test_formats_of_the_same_number(self):
+        for sender in ("+447911123456", "+44 7911 123456", "00447911123456", "07911 123456",
+                       "7911123456"):
+            self.assertTrue(same_number(sender, "+447911123456", 44), sender)
+        self.assertEqual(e164("(0)7911-123.456", 44), "+447911123456")
+
+    def test_other_country_prefix_rejected(self):
+        self.assertFalse(same_number("+17911123456", "+447911123456", 44))
+        self.assertFalse(same_number("+447911123456", "+917911123456", 91))
+        # A national number only matches in the configured country
+        self.assertFalse(same_number("07911123456", "+447911123456", 1))
+
+    def test_short_suffix_rejected(self):
+        for sender in ("123456", "1123456", "+1123456", "23456"):
+            self.assertFalse(same_number(sender, "+447911123456", 44), sender)
+
+    def test_non_numbers_rejected(self):
+        for sender in ("", "+", "VODAFONE", "+44791112345a", "+4479111234567890"):
+            self.assertIsNone(e164(sender, 44), sender)
+        self.assertFalse(same_number("", "", 44))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Regression tests for config.ini reloading.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import monitor_config
+from monitor_config import Config, ConfigWatcher
+
+DEFAULTS = dict.fromkeys(Config._fields)
+DEFAULTS['patient_caregiver_phone'] = '+10000000000'  # The placeholder
+
+
+class MissingFileReloadTest(unittest.TestCase):
+    """A config.ini deleted or renamed while running"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "config.ini")
+        with mock.patch.object(monitor_config, 'INOTIFY_AVAILABLE', False):
+            self.watcher = ConfigWatcher(self.path, DEFAULTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, phone):
+        with open(self.path, 'w') as f:
+            f.write(f"[patient]\ncaregiver_phone = {phone}\n")
+
+    def test_missing_at_startup_uses_defaults(self):
+        self.assertEqual(self.watcher.load().patient_caregiver_phone, '+10000000000')
+
+    def test_missing_on_reload_keeps_running_settings(self):
+        self.write('+15551234567')
+        self.watcher.load()
+        os.remove(self.path)
+        self.assertIsNone(self.watcher.check())
+        self.assertEqual(self.watcher.rejected, 1)
+        self.assertEqual(self.watcher.current.patient_caregiver_phone, '+15551234567')
+
+        # Putting a file back is picked up as usual
+        self.write('+15557654321')
+        config, changed = self.watcher.check()
+        self.assertEqual(changed, ['patient_caregiver_phone'])
+        self.assertEqual(config.patient_caregiver_phone, '+15557654321')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the orientation estimator's tilt and posture timers.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fall_detector import STANDARD_GRAVITY
+from orientation import OrientationEstimator
+
+G = STANDARD_GRAVITY
+UPRIGHT = (0.0, 0.0, G)
+LYING = (G, 0.0, 0.0)
+STILL = (0.0, 0.0, 0.0)
+
+
+class OrientationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.est = OrientationEstimator()
+        self.t = 0.0
+
+    def feed(self, seconds, accel, gyro=STILL, rate_hz=50):
+        for _ in range(int(round(seconds * rate_hz))):
+            self.t += 1.0 / rate_hz
+            self.est.update(accel, gyro, self.t)
+
+    def test_first_sample_sets_gravity(self):
+        self.est.update(LYING, STILL, 0.0)
+        self.assertAlmostEqual(self.est.tilt_deg, 90.0, places=6)
+        self.assertTrue(self.est.still)
+
+    def test_accelerometer_pulls_estimate_to_gravity(self):
+        self.feed(1, UPRIGHT)
+        self.assertLess(self.est.tilt_deg, 1.0)
+        self.feed(0.1, LYING)
+        self.assertLess(self.est.tilt_deg, 60.0)  # Filtered, not a step
+        self.feed(3, LYING)
+        self.assertAlmostEqual(self.est.tilt_deg, 90.0, delta=1.0)
+
+    def test_gyro_carries_tilt_through_high_g(self):
+        self.feed(1, UPRIGHT)
+        # 1.5 g is not trusted as gravity, so only the gyro moves the estimate
+        self.feed(1, (0.0, 0.0, 1.5 * G), gyro=(math.radians(45), 0.0, 0.0))
+        self.assertAlmostEqual(self.est.tilt_deg, 45.0, delta=1.0)
+        self.assertFalse(self.est.still)
+
+    def test_lying_still_timer(self):
+        self.feed(1, UPRIGHT)
+        self.assertEqual(self.est.lying_still_s(self.t), 0.0)
+        self.assertGreaterEqual(self.est.upright_s(self.t), 0.98)
+        self.feed(6, LYING)
+        self.assertEqual(self.est.upright_s(self.t), 0.0)
+        lying = self.est.lying_still_s(self.t)
+        self.assertGreater(lying, 4.5)
+        self.assertLess(lying, 6.0)
+        self.assertAlmostEqual(self.est.lying_still_s(self.t, since=self.t - 2.0), 2.0)
+
+    def test_short_twitch_keeps_lying_timer(self):
+        self.feed(5, LYING)
+        since = self.est.lying_since
+        self.feed(0.3, LYING, gyro=(0.0, 0.0, 1.0))  # Rotation about gravity: tilt unchanged
+        self.feed(1, LYING)
+        self.assertEqual(self.est.lying_since, since)
+
+    def test_long_movement_restarts_lying_timer(self):
+        self.feed(5, LYING)
+        self.feed(1, LYING, gyro=(0.0, 0.0, 1.0))
+        self.assertIsNone(self.est.lying_since)
+        self.feed(1, LYING)
+        self.assertLess(self.est.lying_still_s(self.t), 1.0)
+
+    def test_calibrate_takes_current_axis(self):
+        self.feed(3, LYING)
+        self.est.calibrate()
+        self.assertEqual(self.est.tilt_deg, 0.0)
+        self.feed(0.5, LYING)
+        self.assertLess(self.est.tilt_deg, 1.0)
+        self.assertGreater(self.est.upright_s(self.t), 0.4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the shared-memory sample ring.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sample_ring
+from sample_ring import (CONTROL_OFFSET, CONTROL_SEQ, DETECTOR_PARAMS, HEADER_SIZE,
+                         KIND_IMU, SLOT, SLOT_SEQ, SampleRing)
+
+
+class LappedReader(SampleRing):
+    """Reader whose writer gets to run between reading the head and the slots"""
+
+    def __init__(self, name):
+        self.on_head = None
+        super().__init__(name)
+
+    @property
+    def write_index(self):
+        index = SampleRing.write_index.fget(self)
+        if self.on_head is not None:
+            hook, self.on_head = self.on_head, None
+            hook()
+        return index
+
+
+class SampleRingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.writer = SampleRing(capacity=8, create=True)
+        self.reader = SampleRing(self.writer.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+
+    def publish(self, first, count):
+        for i in range(first, first + count):
+            self.writer.publish(float(i), KIND_IMU, float(i))
+
+    def test_reader_sees_slots_in_order(self):
+        self.publish(0, 5)
+        out = self.reader.drain()
+        self.assertEqual([ts for ts, _, _ in out], [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(out[0][1], KIND_IMU)
+        self.assertEqual(out[3][2], (3.0,) + (0.0,) * 8)
+        self.assertEqual(self.reader.drain(), [])
+        self.assertEqual(self.reader.dropped, 0)
+
+    def test_drain_limit_keeps_the_rest(self):
+        self.publish(0, 5)
+        self.assertEqual(len(self.reader.drain(limit=2)), 2)
+        self.assertEqual([ts for ts, _, _ in self.reader.drain()], [2.0, 3.0, 4.0])
+
+    def test_overrun_skips_to_oldest_intact_slot(self):
+        self.publish(0, 8 + 5)
+        out = self.reader.drain()
+        self.assertEqual(self.reader.dropped, 5)
+        self.assertEqual([ts for ts, _, _ in out], [float(i) for i in range(5, 13)])
+
+    def test_torn_read_while_writer_laps(self):
+        self.publish(0, 4)
+        reader = LappedReader(self.writer.name)
+        reader.read_index = 0
+        # The writer laps half the ring after the reader has taken its head
+        reader.on_head = lambda: self.publish(4, 8 + 2)
+        try:
+            out = reader.drain()
+            self.assertEqual([ts for ts, _, _ in out], [])
+            self.assertEqual(reader.dropped, 4)
+            # The next call catches up from the oldest slot still intact
+            out = reader.drain()
+            self.assertEqual([ts for ts, _, _ in out], [float(i) for i in range(6, 14)])
+            self.assertEqual(reader.dropped, 6)
+        finally:
+            reader.close()
+
+    def test_slot_mid_write_is_dropped(self):
+        self.publish(0, 3)
+        # Writer stopped after invalidating slot 1 but before stamping it
+        off = HEADER_SIZE + 1 * SLOT.size
+        SLOT_SEQ.pack_into(self.writer.shm.buf, off, 0)
+        out = self.reader.drain()
+        self.assertEqual([ts for ts, _, _ in out], [0.0, 2.0])
+        self.assertEqual(self.reader.dropped, 1)
+
+    def test_control_block_round_trip(self):
+        self.assertIsNone(self.reader.read_control())
+        params = {k: float(i + 1) for i, k in enumerate(DETECTOR_PARAMS)}
+        self.writer.write_control(params)
+        seq, read = self.reader.read_control()
+        self.assertEqual(read, params)
+        self.writer.write_control(dict(params, threshold_g=2.5))
+        self.assertGreater(self.reader.control_seq, seq)
+        self.assertEqual(self.reader.read_control()[1]['threshold_g'], 2.5)
+
+    def test_control_block_mid_write_is_ignored(self):
+        params = {k: 1.0 for k in DETECTOR_PARAMS}
+        self.writer.write_control(params)
+        seq = self.writer.control_seq
+        CONTROL_SEQ.pack_into(self.writer.shm.buf, CONTROL_OFFSET, seq + 1)
+        self.assertIsNone(self.reader.read_control())
+
+    def test_attach_rejects_other_memory(self):
+        self.writer.shm.buf[:4] = b'XXXX'
+        with self.assertRaises(ValueError):
+            SampleRing(self.writer.name)
+        self.writer.shm.buf[:4] = sample_ring.MAGIC
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the timer wheel scheduler.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timer_wheel import PRIORITY_HIGH, PRIORITY_LOW, TimerWheel
+
+
+class FakeClock:
+    """Monotonic clock the test moves by hand"""
+
+    def __init__(self, t=1000.02):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.start = self.clock.t
+        self.wheel = TimerWheel(tick_s=0.1, slots=16, clock=self.clock)
+        self.ran = []
+
+    def advance_to(self, offset_s, step_s=0.05):
+        """Walk the clock forward, running the wheel like the sampling loop does"""
+        end = self.start + offset_s
+        while self.clock.t < end:
+            self.clock.t = min(self.clock.t + step_s, end)
+            self.wheel.run_due()
+
+    def record(self, name):
+        return lambda: self.ran.append((name, self.clock.t - self.start))
+
+    def test_cadence_does_not_drift(self):
+        job = self.wheel.every("beat", 1.0, self.record("beat"))
+        # A slow, irregular loop runs each job late, but the next deadline
+        # is still counted from the previous one
+        self.advance_to(50.5, step_s=0.37)
+        self.assertEqual(job.runs, 50)
+        self.assertEqual(job.skipped, 0)
+        self.assertAlmostEqual(job.base, self.start + 51.0, places=6)
+        for n, (_, at) in enumerate(self.ran, 1):
+            # Due on the tick its deadline falls in, at most one loop pass late
+            self.assertGreater(at, n - 0.1)
+            self.assertLess(at, n + 0.37)
+
+    def test_missed_intervals_are_skipped(self):
+        job = self.wheel.every("beat", 1.0, self.record("beat"))
+        self.advance_to(1.05)
+        self.assertEqual(job.runs, 1)
+        self.clock.t = self.start + 5.55  # Loop stalled for four intervals
+        self.assertEqual(self.wheel.run_due(), 1)
+        self.assertEqual(job.runs, 2)
+        self.assertEqual(job.skipped, 3)
+        self.assertAlmostEqual(job.base, self.start + 6.0, places=6)
+        self.advance_to(6.05)
+        self.assertEqual(job.runs, 3)
+
+    def test_priority_order_on_same_tick(self):
+        self.wheel.every("low", 1.0, self.record("low"), priority=PRIORITY_LOW)
+        self.wheel.every("high", 1.0, self.record("high"), priority=PRIORITY_HIGH)
+        self.advance_to(1.05)
+        self.assertEqual([name for name, _ in self.ran], ["high", "low"])
+
+    def test_cancel_other_job_from_callback(self):
+        self.wheel.every("first", 1.0, lambda: self.wheel.cancel("second"),
+                         priority=PRIORITY_HIGH)
+        second = self.wheel.every("second", 1.0, self.record("second"))
+        self.advance_to(3.05)
+        self.assertEqual(self.ran, [])
+        self.assertEqual(second.runs, 0)
+        self.assertNotIn("second", self.wheel.jobs)
+
+    def test_cancel_self_from_callback(self):
+        def once_then_stop():
+            self.ran.append("self")
+            self.wheel.cancel("self")
+
+        job = self.wheel.every("self", 1.0, once_then_stop)
+        self.advance_to(5.05)
+        self.assertEqual(self.ran, ["self"])
+        self.assertEqual(job.runs, 1)
+        self.assertNotIn("self", self.wheel.jobs)
+
+    def test_replace_from_callback(self):
+        def reschedule():
+            self.ran.append(("old", self.clock.t - self.start))
+            self.wheel.every("job", 2.0, self.record("new"))
+
+        self.wheel.every("job", 1.0, reschedule)
+        self.advance_to(5.05)
+        self.assertEqual([name for name, _ in self.ran], ["old", "new", "new"])
+
+    def test_one_shot_runs_once_and_is_forgotten(self):
+        self.wheel.after("once", 0.5, self.record("once"))
+        self.advance_to(3.0)
+        self.assertEqual([name for name, _ in self.ran], ["once"])
+        self.assertNotIn("once", self.wheel.jobs)
+
+    def test_job_beyond_one_turn_waits_for_its_tick(self):
+        turn_s = self.wheel.slots * self.wheel.tick_s
+        self.wheel.after("far", 2.5 * turn_s, self.record("far"))
+        self.advance_to(2.5 * turn_s - 0.1)
+        self.assertEqual(self.ran, [])  # Its bucket came round twice already
+        self.advance_to(2.5 * turn_s + 0.1)
+        self.assertEqual(len(self.ran), 1)
+        self.assertAlmostEqual(self.ran[0][1], 2.5 * turn_s, delta=0.1)
+
+    def test_stall_longer_than_one_turn(self):
+        turn_s = self.wheel.slots * self.wheel.tick_s
+        fast = self.wheel.every("fast", 0.3, self.record("fast"))
+        self.wheel.after("late", turn_s + 0.5, self.record("late"))
+        self.clock.t = self.start + 3 * turn_s + 0.05
+        self.assertEqual(self.wheel.run_due(), 2)
+        self.assertEqual(fast.runs, 1)
+        self.assertGreater(fast.skipped, 0)
+        self.assertNotIn("late", self.wheel.jobs)
+
+    def test_jitter_stays_inside_half_an_interval(self):
+        wheel = TimerWheel(tick_s=0.1, slots=16, clock=self.clock, rng=random.Random(7))
+        job = wheel.every("jittery", 1.0, lambda: None, jitter_s=5.0)
+        self.assertEqual(job.jitter_s, 0.5)
+        for _ in range(50):
+            self.assertGreaterEqual(job.due, job.base)
+            self.assertLessEqual(job.due, job.base + 0.5)
+            self.clock.t = job.due + 0.1
+            wheel.run_due()
+
+    def test_peek_and_next_delay(self):
+        self.assertFalse(self.wheel.peek())
+        self.assertAlmostEqual(self.wheel.next_delay(), 0.08, places=6)
+        self.clock.t += 0.1
+        self.assertTrue(self.wheel.peek())
+        self.wheel.run_due()
+        self.assertFalse(self.wheel.peek())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the replay loop's polling and motion-wake models.
+
+Run from firmware/:  python3 -m unittest discover tests
+"""
+
+import logging
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trace_replay import simulate
+
+RATE_HZ = 200
+
+
+def impact_trace(start_s, length_s=0.1, peak_g=3.5, duration_s=60):
+    """Magnitudes in g: still at 1 g with one impact"""
+    t = [i / RATE_HZ for i in range(duration_s * RATE_HZ)]
+    mag = [peak_g if start_s <= x < start_s + length_s else 1.0 for x in t]
+    return t, mag
+
+
+class MotionWakeTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("PatientMonitor").disabled = True
+
+    def tearDown(self):
+        logging.getLogger("PatientMonitor").disabled = False
+
+    def test_short_impact_between_idle_polls(self):
+        t, mag = impact_trace(30.05)
+        # 5 Hz polling reads 30.0 and 30.2 and never sees the impact
+        self.assertEqual(simulate(t, mag), [])
+        alerts = simulate(t, mag, motion_wake_g=0.1)
+        self.assertEqual(len(alerts), 1)
+        when, impact_g, window_ms = alerts[0]
+        self.assertAlmostEqual(when, 30.11, places=6)
+        self.assertEqual(impact_g, 3.5)
+        self.assertGreater(window_ms, 40)
+
+    def test_impact_seen_by_both_modes(self):
+        t, mag = impact_trace(30.13)
+        self.assertEqual(len(simulate(t, mag)), 1)
+        self.assertEqual(len(simulate(t, mag, motion_wake_g=0.1)), 1)
+
+    def test_motion_below_threshold_does_not_wake(self):
+        t = [i / RATE_HZ for i in range(60 * RATE_HZ)]
+        mag = [1.05 if i % 2 else 0.95 for i in range(len(t))]
+        self.assertEqual(simulate(t, mag, motion_wake_g=0.1), [])
+
+    def test_two_impacts_apart_by_more_than_the_cooldown(self):
+        t, mag = impact_trace(30.05, duration_s=200)
+        mag = [3.5 if 150.05 <= x < 150.15 else m for x, m in zip(t, mag)]
+        alerts = simulate(t, mag, motion_wake_g=0.1)
+        self.assertEqual(len(alerts), 2)
+        self.assertAlmostEqual(alerts[0][0], 30.1, delta=0.05)
+        self.assertAlmostEqual(alerts[1][0], 150.1, delta=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Hashed timer wheel for the monitor's periodic and one-shot jobs.
+
+Jobs are hashed into a ring of buckets by the tick they fall due on, so
+scheduling and cancelling are O(1) and the sampling loop only has to compare
+the monotonic clock with the next tick boundary (`peek`) on each iteration.
+When a tick has passed, `run_due` walks the elapsed buckets and runs what is
+due, highest priority (lowest number) first. Jobs further out than one turn
+of the wheel simply stay in their bucket until their tick comes round.
+
+Periodic jobs are rescheduled from their previous deadline rather than from
+when they actually ran, so intervals do not drift with the sample rate; a
+job that fell behind by whole intervals skips them instead of bursting.
+Callbacks run on the caller's thread and must not block.
+"""
+
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger("PatientMonitor")
+
+# Priorities: lower runs first when several jobs fall due on the same tick
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class TimerJob:
+    """One scheduled callback; `interval_s` is None for one-shot jobs"""
+    __slots__ = ('name', 'callback', 'interval_s', 'jitter_s', 'priority',
+                 'base', 'due', 'due_tick', 'cancelled', 'runs', 'skipped', 'last_run')
+
+    def __init__(self, name, callback, interval_s, jitter_s, priority):
+        self.name = name
+        self.callback = callback
+        self.interval_s = interval_s
+        self.jitter_s = jitter_s
+        self.priority = priority
+        self.base = 0.0        # Nominal deadline; jitter is added on top of it
+        self.due = 0.0
+        self.due_tick = 0
+        self.cancelled = False
+        self.runs = 0
+        self.skipped = 0       # Whole intervals missed while the loop was busy
+        self.last_run = None
+
+
+class TimerWheel:
+    """Named periodic/one-shot jobs on a hashed wheel of `slots` x `tick_s`"""
+
+    def __init__(self, tick_s=0.1, slots=512, clock=time.monotonic, rng=None):
+        self.tick_s = tick_s
+        self.slots = slots
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.buckets = [[] for _ in range(slots)]
+        self.jobs = {}
+        self.lock = threading.Lock()  # Jobs may be added from callback threads
+        self.tick = int(clock() / tick_s)
+        self.next_tick_at = (self.tick + 1) * tick_s
+
+    # --- Scheduling ---
+
+    def every(self, name, interval_s, callback, jitter_s=0.0,
+              priority=PRIORITY_NORMAL, first_in=None):
+        """Run `callback()` every `interval_s` seconds (plus 0..jitter_s)"""
+        if interval_s <= 0:
+            raise ValueError(f"interval for {name} must be positive")
+        delay = interval_s if first_in is None else first_in
+        # Jitter spreads jobs apart; more than half an interval would eat runs
+        jitter_s = min(jitter_s, interval_s / 2)
+        return self._add(name, callback, interval_s, jitter_s, priority, delay)
+
+    def after(self, name, delay_s, callback, priority=PRIORITY_NORMAL):
+        """Run `callback()` once, `delay_s` seconds from now"""
+        return self._add(name, callback, None, 0.0, priority, delay_s)
+
+    def cancel(self, name):
+        """Cancel a job by name; returns True if one was scheduled"""
+        with self.lock:
+            job = self.jobs.pop(name, None)
+            if job is None:
+                return False
+            job.cancelled = True  # Its bucket entry is dropped when reached
+            return True
+
+    def _add(self, name, callback, interval_s, jitter_s, priority, delay):
+        job = TimerJob(name, callback, interval_s, jitter_s, priority)
+        with self.lock:
+            old = self.jobs.get(name)
+            if old is not None:
+                old.cancelled = True  # Re-registering a name replaces the job
+            self.jobs[name] = job
+            self._place(job, self.clock() + max(0.0, delay))
+        return job
+
+    def _place(self, job, base):
+        job.base = base
+        job.due = base
+        if job.jitter_s > 0:
+            job.due += self.rng.uniform(0.0, job.jitter_s)
+        # Never earlier than the next tick we will process
+        job.due_tick = max(int(job.due / self.tick_s), self.tick + 1)
+        self.buckets[job.due_tick % self.slots].append(job)
+
+    # --- Running ---
+
+    def peek(self, now=None):
+        """O(1): has a tick boundary passed since the last run_due?"""
+        return (self.clock() if now is None else now) >= self.next_tick_at
+
+    def next_delay(self, now=None):
+        """Seconds until the next tick boundary (for sleeping event loops)"""
+        now = self.clock() if now is None else now
+        return max(0.0, self.next_tick_at - now)
+
+    def run_due(self, now=None):
+        """Run every job due by `now`; returns how many ran"""
+        now = self.clock() if now is None else now
+        target = int(now / self.tick_s)
+        if target <= self.tick:
+            return 0
+        due = []
+        with self.lock:
+            # After a long stall one pass over every bucket covers all ticks
+            steps = min(target - self.tick, self.slots)
+            for step in range(steps):
+                bucket = self.buckets[(target - step) % self.slots]
+                if not bucket:
+                    continue
+                keep = []
+                for job in bucket:
+                    if job.cancelled:
+                        continue
+                    if job.due_tick <= target:
+                        due.append(job)
+                    else:
+                        keep.append(job)  # A later turn of the wheel
+                bucket[:] = keep
+            self.tick = target
+            self.next_tick_at = (target + 1) * self.tick_s
+
+        due.sort(key=lambda j: (j.priority, j.due))
+        for job in due:
+            if job.cancelled:
+                continue  # Cancelled by a job that ran before it
+            try:
+                job.callback()
+            except Exception as e:
+                logger.error(f"Timer job '{job.name}' failed: {e}")
+            job.runs += 1
+            job.last_run = now
+            with self.lock:
+                if job.cancelled:
+                    continue
+                if job.interval_s is None:
+                    if self.jobs.get(job.name) is job:
+                        del self.jobs[job.name]
+                    continue
+                # Keep the original cadence; skip whole intervals we missed
+                next_base = job.base + job.interval_s
+                if next_base <= now:
+                    missed = int((now - next_base) / job.interval_s) + 1
+                    job.skipped += missed
+                    next_base += missed * job.interval_s
+                self._place(job, next_base)
+        return len(due)
+
+    def summary(self):
+        """One-line job overview for the heartbeat log"""
+        with self.lock:
+            jobs = sorted(self.jobs.values(), key=lambda j: j.due)
+        now = self.clock()
+        return " ".join(f"{j.name}:{j.runs}x/next {max(0.0, j.due - now):.0f}s"
+                        + (f"/skipped {j.skipped}" if j.skipped else "")
+                        for j in jobs)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Deterministic trace replay for the fall detector.
+
+Feeds recorded or synthetic IMU/GPS traces through the same `FallDetector`
+used by `Monitor.run`, on a virtual clock, reproducing the monitor's adaptive
+sampling cadence (the loop only sees the sample that was current when it
+would have woken up). Alerts are captured instead of sent, so hours of data
+replay in seconds.
+
+Trace formats:
+- CSV with a header row. Columns `t` (seconds) and `ax,ay,az` (m/s^2, or g
+  with --units g) are required; `gx,gy,gz,temp` are optional. Rows with
+  `lat,lon` filled and no acceleration are GPS fixes.
+- Flight recorder ring or snapshot files (see flight_recorder.py).
+
+Usage:
+    python3 trace_replay.py session.csv snapshot_*.bin
+    python3 trace_replay.py --synthetic 3600 --fall-at 600 --fall-at 1800 --impact-ms 300
+    python3 trace_replay.py --threshold 2.5 --expect-alerts 2 corpus/*.csv
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import logging
+import math
+import random
+import sys
+import time
+
+import fall_detector
+from fall_detector import FallDetector, STANDARD_GRAVITY
+from flight_recorder import KIND_GPS, read_records
+from orientation import OrientationEstimator
+
+logger = logging.getLogger("PatientMonitor")
+
+
+class VirtualClock:
+    """Manually advanced clock injected in place of time.time()"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+
+class Trace:
+    """Time-ordered IMU samples and GPS fixes held in flat lists"""
+
+    def __init__(self, name):
+        self.name = name
+        self.t = []
+        self.accel = []
+        self.gyro = []
+        self.temp = []
+        self.mag = []
+        self.fixes = []  # [(t, lat, lon)]
+
+    def add_imu(self, t, accel, gyro=(0.0, 0.0, 0.0), temp=0.0):
+        self.t.append(t)
+        self.accel.append(accel)
+        self.gyro.append(gyro)
+        self.temp.append(temp)
+        self.mag.append(fall_detector.accel_magnitude_g(accel))
+
+    def add_fix(self, t, lat, lon):
+        self.fixes.append((t, lat, lon))
+
+    @property
+    def start(self):
+        return self.t[0] if self.t else 0.0
+
+    @property
+    def end(self):
+        return self.t[-1] if self.t else 0.0
+
+    def __len__(self):
+        return len(self.t)
+
+
+def load_csv(path, units="ms2"):
+    """Load a CSV trace (see module docstring for the column layout)"""
+    scale = STANDARD_GRAVITY if units == "g" else 1.0
+    trace = Trace(path)
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            t = float(row['t'])
+            if row.get('ax'):
+                accel = (float(row['ax']) * scale, float(row['ay']) * scale,
+                         float(row['az']) * scale)
+                gyro = tuple(float(row.get(k) or 0.0) for k in ('gx', 'gy', 'gz'))
+                trace.add_imu(t, accel, gyro, float(row.get('temp') or 0.0))
+            elif row.get('lat') and row.get('lon'):
+                trace.add_fix(t, float(row['lat']), float(row['lon']))
+    return trace
+
+
+def load_binary(path):
+    """Load a flight recorder ring or snapshot file"""
+    trace = Trace(path)
+    for rec in read_records(path):
+        if rec[1] == KIND_GPS:
+            trace.add_fix(rec[0], rec[2], rec[3])
+        else:
+            trace.add_imu(rec[0], rec[2:5], rec[5:8], rec[8])
+    return trace
+
+
+def load_trace(path, units="ms2"):
+    if path.lower().endswith('.csv'):
+        return load_csv(path, units)
+    return load_binary(path)
+
+
+def synthetic_trace(duration_s, rate_hz=200.0, falls=(), peak_g=3.5, impact_ms=120,
+                    noise_g=0.03, walk_periods=(), seed=0):
+    """Generate a trace: standing still, optional walking bouts, and fall impacts"""
+    rng = random.Random(seed)
+    trace = Trace(f"synthetic:{duration_s:g}s")
+    step = 1.0 / rate_hz
+    impact_s = impact_ms / 1000.0
+    for i in range(int(duration_s * rate_hz)):
+        t = i * step
+        x, z = 0.0, 1.0
+        for start, end in walk_periods:
+            if start <= t < end:
+                z += 0.35 * math.sin(2 * math.pi * 1.8 * t)  # ~1.8 steps/s
+        for fall_t in falls:
+            if fall_t <= t < fall_t + impact_s:
+                z = peak_g
+            elif fall_t + impact_s <= t < fall_t + 30:
+                x, z = 1.0, 0.0  # Lying down: gravity moves to the x axis
+        accel = ((x + rng.gauss(0, noise_g)) * STANDARD_GRAVITY,
+                 rng.gauss(0, noise_g) * STANDARD_GRAVITY,
+                 (z + rng.gauss(0, noise_g)) * STANDARD_GRAVITY)
+        trace.add_imu(t, accel, (0.0, 0.0, 0.0), 30.0)
+    return trace
+
+
+class TraceGPS:
+    """Stand-in for GPSHandler answering from the trace's GPS fixes"""
+
+    def __init__(self, trace, clock):
+        self.times = [f[0] for f in trace.fixes]
+        self.fixes = trace.fixes
+        self.clock = clock
+
+    def get_last_fix(self):
+        now = self.clock()
+        i = bisect.bisect_right(self.times, now) - 1
+        if i >= 0 and now - self.fixes[i][0] < 300:
+            return self.fixes[i][1], self.fixes[i][2], self.fixes[i][0]
+        return None
+
+
+class CapturedAlert:
+    """An alert the monitor would have sent"""
+    __slots__ = ('trace', 't', 'offset_s', 'impact_g', 'duration_ms', 'location')
+
+    def __init__(self, trace, t, offset_s, impact_g, duration_ms, location):
+        self.trace = trace
+        self.t = t
+        self.offset_s = offset_s
+        self.impact_g = impact_g
+        self.duration_ms = duration_ms
+        self.location = location
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def simulate(t, mag, detector_kwargs=None, accel=None, gyro=None,
+             motion_wake_g=None, wake_hold_s=3.0, sanity_s=5.0):
+    """Run the monitor's sampling loop over time/magnitude arrays on a virtual clock
+
+    Returns a list of (alert_time, impact_g, window_ms). `t` and `mag` can be
+    any indexable sequences (lists, arrays or memoryviews of doubles). The
+    post-impact posture check needs raw `accel`/`gyro` samples and is skipped
+    when they are not supplied.
+
+    With `motion_wake_g` set, idle periods model MOTION_WAKE_ENABLED: the loop
+    sleeps until |mag - 1g| exceeds the threshold (a stand-in for the MPU6050's
+    high-passed motion interrupt) or the sanity read is due, then samples at
+    the active rate for `wake_hold_s`.
+    """
+    n = len(t)
+    if n == 0:
+        return []
+    clock = VirtualClock(t[0])
+    kwargs = dict(detector_kwargs or {})
+    posture = None
+    if accel is not None and gyro is not None:
+        posture = OrientationEstimator()
+    else:
+        kwargs['posture_confirm_s'] = 0
+    detector = FallDetector(clock=clock, posture=posture, **kwargs)
+    update = detector.update
+    sample_rate = detector.sample_rate
+    alerts = []
+    end = t[n - 1]
+    cursor = 0
+    active_until = float('-inf')
+
+    while clock.now <= end:
+        # Only the sample that is current when the loop wakes is seen; the
+        # clock only moves forward, so advancing a cursor is amortised O(1)
+        now = clock.now
+        while cursor + 1 < n and t[cursor + 1] <= now:
+            cursor += 1
+        m = mag[cursor]
+        if posture is not None:
+            posture.update(accel[cursor], gyro[cursor], now)
+        if update(m):
+            alerts.append((now, detector.last_impact_g, detector.last_duration_ms))
+        rate = sample_rate(m)
+        if motion_wake_g is not None:
+            if now < active_until:
+                rate = detector.active_rate
+            elif rate == detector.idle_rate:
+                limit = now + sanity_s
+                j = cursor + 1
+                while j < n and t[j] <= limit and abs(mag[j] - 1.0) <= motion_wake_g:
+                    j += 1
+                if j < n and t[j] <= limit:
+                    clock.now = t[j]
+                    active_until = t[j] + wake_hold_s
+                else:
+                    clock.now = limit
+                continue
+        clock.now = now + 1.0 / rate
+
+    return alerts
+
+
+def replay(trace, detector_kwargs=None, motion_wake_g=None):
+    """Replay one trace and return the captured alerts"""
+    gps = TraceGPS(trace, VirtualClock())
+    alerts = []
+    for when, impact, window in simulate(trace.t, trace.mag, detector_kwargs,
+                                         trace.accel, trace.gyro, motion_wake_g):
+        gps.clock.now = when
+        loc = gps.get_last_fix()
+        alerts.append(CapturedAlert(trace.name, when, when - trace.start, impact, window,
+                                    (loc[0], loc[1]) if loc else None))
+    return alerts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay IMU/GPS traces through the fall detector")
+    parser.add_argument("traces", nargs="*", help="CSV or flight recorder files")
+    parser.add_argument("--units", choices=["ms2", "g"], default="ms2",
+                        help="Acceleration units used in CSV traces")
+    parser.add_argument("--synthetic", type=float, metavar="SECONDS",
+                        help="Replay a generated trace of this length")
+    parser.add_argument("--fall-at", type=float, action="append", default=[],
+                        help="Insert a synthetic fall at this offset (seconds)")
+    parser.add_argument("--impact-ms", type=float, default=120,
+                        help="Length of each synthetic impact; idle sampling is 5 Hz, so "
+                             "impacts shorter than 200 ms can fall between samples")
+    parser.add_argument("--threshold", type=float, default=fall_detector.DEFAULT_THRESHOLD_G,
+                        help="FALL_THRESHOLD_G")
+    parser.add_argument("--duration-ms", type=float, default=fall_detector.DEFAULT_DURATION_MS,
+                        help="FALL_DURATION_MS")
+    parser.add_argument("--reset-window", type=float, default=fall_detector.DEFAULT_RESET_WINDOW_S,
+                        help="Quiet time (s) that cancels an impact window")
+    parser.add_argument("--high-rate-g", type=float, default=fall_detector.DEFAULT_HIGH_RATE_G,
+                        help="Magnitude that switches to high-rate sampling")
+    parser.add_argument("--posture-confirm", type=float,
+                        default=fall_detector.DEFAULT_POSTURE_CONFIRM_S,
+                        help="Seconds lying still/upright that confirm/cancel a fall (0 = off)")
+    parser.add_argument("--posture-timeout", type=float,
+                        default=fall_detector.DEFAULT_POSTURE_TIMEOUT_S,
+                        help="Alert anyway if posture is unresolved after this long")
+    parser.add_argument("--motion-wake", type=float, metavar="MG",
+                        help="Model interrupt wake mode with this motion threshold (milli-g)")
+    parser.add_argument("--expect-alerts", type=int,
+                        help="Exit with status 1 unless exactly this many alerts fire")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show detector log output")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL + 1,
+                        format='%(levelname)s - %(message)s')
+
+    traces = []
+    if args.synthetic:
+        traces.append(synthetic_trace(args.synthetic, falls=args.fall_at,
+                                      impact_ms=args.impact_ms))
+    for path in args.traces:
+        traces.append(load_trace(path, args.units))
+    if not traces:
+        parser.error("no traces given (pass files or --synthetic)")
+
+    detector_kwargs = {
+        'threshold_g': args.threshold,
+        'duration_ms': args.duration_ms,
+        'reset_window_s': args.reset_window,
+        'high_rate_g': args.high_rate_g,
+        'posture_confirm_s': args.posture_confirm,
+        'posture_timeout_s': args.posture_timeout,
+    }
+
+    started = time.perf_counter()
+    all_alerts = []
+    total_s = 0.0
+    total_samples = 0
+    for trace in traces:
+        all_alerts.extend(replay(trace, detector_kwargs,
+                                 args.motion_wake / 1000.0 if args.motion_wake else None))
+        total_s += trace.end - trace.start
+        total_samples += len(trace)
+    wall = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({
+            'parameters': detector_kwargs,
+            'traces': len(traces),
+            'trace_seconds': total_s,
+            'samples': total_samples,
+            'wall_seconds': wall,
+            'alerts': [a.as_dict() for a in all_alerts],
+        }, indent=2))
+    else:
+        for a in all_alerts:
+            loc = f"{a.location[0]:.6f},{a.location[1]:.6f}" if a.location else "NO_GPS_FIX"
+            print(f"ALERT {a.trace} +{a.offset_s:.2f}s impact={a.impact_g:.2f}g "
+                  f"window={a.duration_ms:.0f}ms loc={loc}")
+        speedup = total_s / wall if wall > 0 else float('inf')
+        print(f"{len(traces)} trace(s), {total_s:.0f}s of data, {total_samples} samples, "
+              f"{len(all_alerts)} alert(s) in {wall:.2f}s ({speedup:.0f}x real time)")
+
+    if args.expect_alerts is not None and len(all_alerts) != args.expect_alerts:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Uplink simulator: the telemetry path end to end, without a SIM800L or server.
+
+Runs the monitor's own GSMHandler, TelemetrySpool and TelemetryUplink against
+a simulated SIM800L and a local HTTP stand-in for the telemetry endpoint.
+The simulated modem answers the AT init, SMS sends, the GPRS bearer
+(AT+SAPBR) and the HTTP stack (AT+HTTPINIT/PARA/DATA/ACTION/TERM); every
+AT+HTTPACTION is forwarded to the stand-in as a real HTTP POST, headers
+included, and its status comes back in the +HTTPACTION URC.
+
+The scenarios replay the failures the uplink has to survive:
+
+    post         a backlog goes out as several batches over a fresh bearer
+    bearer-drop  the network drops the bearer (+SAPBR 1: DEACT) between posts
+    60x          HTTPACTION reports a network error (601); the bearer is re-checked
+    server-error the endpoint answers 503; nothing is acknowledged
+    lost-ack     the server stores a batch but the modem loses the answer (604);
+                 the retry carries the same Idempotency-Key and is de-duplicated
+    resume       a restart with records still spooled picks up where it stopped
+
+Afterwards the server must hold every record exactly once, in order. The
+exit status is 1 if any scenario fails.
+
+Usage:
+    python3 uplink_sim.py
+    python3 uplink_sim.py --serve 8080     # only run the stand-in server
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telemetry_uplink import TelemetrySpool, TelemetryUplink
+import raspberry_pi_monitor as rpm
+
+logger = logging.getLogger("PatientMonitor")
+
+APN = "sim.apn"
+INIT_TIMEOUT_S = 15       # The module init sleeps a few seconds before its first AT
+URC_WAIT_S = 2            # For an unsolicited code to reach the handler
+
+
+class TelemetryServer:
+    """Local HTTP stand-in for the telemetry endpoint
+
+    Accepts plain or gzip JSON batches on any path and answers `status`.
+    Batches it has already stored (same Idempotency-Key) are answered but
+    not stored again, as the real endpoint should.
+    """
+
+    def __init__(self, port=0):
+        self.status = 204
+        self.batches = []    # Batch ids stored, in order
+        self.seqs = []       # Record sequence numbers stored, in order
+        self.duplicates = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, fmt, *args):
+                logger.debug(f"Server: {fmt % args}")
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/telemetry"
+        thread = threading.Thread(target=self.httpd.serve_forever, name="server")
+        thread.daemon = True
+        thread.start()
+
+    def _handle(self, request):
+        body = request.rfile.read(int(request.headers.get('Content-Length', 0)))
+        status = self.status
+        if 200 <= status < 300:
+            if request.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            batch = json.loads(body)
+            with self.lock:
+                if batch['batch'] in self.batches:
+                    self.duplicates += 1
+                else:
+                    self.batches.append(batch['batch'])
+                    self.seqs.extend(record['seq'] for record in batch['records'])
+        request.send_response(status)
+        request.end_headers()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class Sim800:
+    """SIM800L stand-in on a `read()`/`write(bytes)` transport
+
+    `drop_bearer()` sends the network's +SAPBR 1: DEACT. With `fail_status`
+    set (601-604) HTTPACTION reports that error without posting; with
+    `lose_response` set the POST reaches the server but the modem reports
+    604 anyway.
+    """
+
+    BEARER_OPEN_S = 0.5
+    ACTION_S = 0.2
+
+    def __init__(self):
+        self.rx = bytearray()
+        self.lock = threading.Lock()
+        self.bearer = False
+        self.bearer_opens = 0
+        self.fail_status = None
+        self.lose_response = False
+        self.posts = 0
+        self.sms = []          # (number, text) accepted by AT+CMGS
+        self._line = b''
+        self._http = None      # HTTPPARA values while an HTTP session is open
+        self._download = 0     # Body bytes still expected after AT+HTTPDATA
+        self._data = b''
+        self._sms_to = None
+        self._sms_text = b''
+
+    # --- Transport ---
+
+    def read(self):
+        with self.lock:
+            data = bytes(self.rx)
+            self.rx.clear()
+        return data
+
+    def write(self, data):
+        if self._download:
+            taken = data[:self._download]
+            self._data += taken
+            self._download -= len(taken)
+            if not self._download:
+                self._emit("\r\nOK\r\n")
+            data = data[len(taken):]
+        if self._sms_to is not None:
+            if b'\x1a' not in data:
+                self._sms_text += data
+                return
+            text, data = data.split(b'\x1a', 1)
+            self.sms.append((self._sms_to, (self._sms_text + text).decode('utf-8', 'replace')))
+            self._sms_to, self._sms_text = None, b''
+            self._emit(f"\r\n+CMGS: {len(self.sms)}\r\n\r\nOK\r\n")
+        self._line += data
+        while b'\r\n' in self._line:
+            line, self._line = self._line.split(b'\r\n', 1)
+            self._command(line.decode('ascii', 'replace').strip())
+
+    def _emit(self, text):
+        with self.lock:
+            self.rx += text.encode('ascii')
+
+    def _later(self, delay, action):
+        timer = threading.Timer(delay, action)
+        timer.daemon = True
+        timer.start()
+
+    # --- Network events ---
+
+    def drop_bearer(self):
+        self.bearer = False
+        self._emit("\r\n+SAPBR 1: DEACT\r\n")
+
+    # --- AT commands ---
+
+    def _command(self, cmd):
+        if not cmd:
+            return
+        if cmd == 'AT+CREG?':
+            self._emit("\r\n+CREG: 0,1\r\n\r\nOK\r\n")
+        elif cmd == 'AT+CSQ':
+            self._emit("\r\n+CSQ: 18,0\r\n\r\nOK\r\n")
+        elif cmd.startswith('AT+CMGS='):
+            self._sms_to = cmd.split('"')[1]
+            self._emit("\r\n> ")
+        elif cmd == 'AT+SAPBR=2,1':
+            state = '1,1,"10.64.1.2"' if self.bearer else '1,3,"0.0.0.0"'
+            self._emit(f"\r\n+SAPBR: {state}\r\n\r\nOK\r\n")
+        elif cmd == 'AT+SAPBR=1,1':
+            def opened():
+                self.bearer = True
+                self.bearer_opens += 1
+                self._emit("\r\nOK\r\n")
+            self._later(self.BEARER_OPEN_S, opened)
+        elif cmd == 'AT+SAPBR=0,1':
+            self.bearer = False
+            self._emit("\r\nOK\r\n")
+        elif cmd == 'AT+HTTPINIT':
+            ok = self._http is None
+            if ok:
+                self._http = {}
+            self._emit("\r\nOK\r\n" if ok else "\r\nERROR\r\n")
+        elif cmd == 'AT+HTTPTERM':
+            ok = self._http is not None
+            self._http = None
+            self._emit("\r\nOK\r\n" if ok else "\r\nERROR\r\n")
+        elif cmd.startswith('AT+HTTPPARA=') and self._http is not None:
+            key, value = cmd[len('AT+HTTPPARA='):].split(',', 1)
+            self._http[key.strip('"')] = value.strip('"')
+            self._emit("\r\nOK\r\n")
+        elif cmd.startswith('AT+HTTPDATA=') and self._http is not None:
+            self._download = int(cmd.split('=')[1].split(',')[0])
+            self._data = b''
+            self._emit("\r\nDOWNLOAD\r\n")
+        elif cmd == 'AT+HTTPACTION=1' and self._http is not None:
+            self._emit("\r\nOK\r\n")
+            http, data = dict(self._http), self._data
+            self._later(self.ACTION_S, lambda: self._action(http, data))
+        else:
+            self._emit("\r\nOK\r\n")
+
+    def _action(self, http, data):
+        status = self.fail_status if self.bearer else 601
+        if status is None:
+            status = self._post(http, data)
+            if self.lose_response:
+                status = 604
+        self._emit(f"\r\n+HTTPACTION: 1,{status},0\r\n")
+
+    def _post(self, http, data):
+        headers = {'Content-Type': http.get('CONTENT', 'application/json')}
+        for header in http.get('USERDATA', '').split('\\r\\n'):
+            if header:
+                name, value = header.split(': ', 1)
+                headers[name] = value
+        request = urllib.request.Request(http['URL'], data=data, headers=headers, method='POST')
+        self.posts += 1
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 603  # DNS / connection failure, as the SIM800L reports it
+
+
+def _wait(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class Simulation:
+    """One simulated modem, server and spool, and the scenarios run on them"""
+
+    def __init__(self, workdir, records=20, batch_bytes=1024):
+        self.server = TelemetryServer()
+        self.sim = Sim800()
+        self.gsm = rpm.GSMHandler("+15550000001", transport=(self.sim.read, self.sim.write))
+        self.spool_path = os.path.join(workdir, "uplink.spool")
+        self.records = records
+        self.batch_bytes = batch_bytes
+        self.spool = None
+        self.uplink = None
+        self.fixes = 0
+        self._open_spool()
+
+    def _open_spool(self):
+        self.spool = TelemetrySpool(self.spool_path)
+        self.uplink = TelemetryUplink(self.spool, self._post, "SIM_001",
+                                      batch_bytes=self.batch_bytes)
+
+    def _post(self, body, headers):
+        return self.gsm.http_post(self.server.url, body, headers, APN)
+
+    def _add_fixes(self):
+        for _ in range(self.records):
+            self.fixes += 1
+            self.uplink.add('fix', lat=round(48.1 + self.fixes / 1e5, 6), lon=11.5, sats=8)
+
+    def close(self):
+        if self.spool:
+            self.spool.close()
+        self.gsm.modem.stop()
+        self.server.close()
+
+    # --- Scenarios: each returns a list of failed checks ---
+
+    def post(self):
+        self._add_fixes()
+        failed = []
+        if not self.uplink.flush():
+            failed.append("flush did not deliver the backlog")
+        if self.uplink.batches < 2:
+            failed.append(f"{self.uplink.batches} batch(es), expected several")
+        if self.sim.bearer_opens != 1:
+            failed.append(f"bearer opened {self.sim.bearer_opens} times, expected once")
+        return failed
+
+    def bearer_drop(self):
+        opens = self.sim.bearer_opens
+        self.sim.drop_bearer()
+        failed = []
+        if not _wait(lambda: not self.gsm.bearer_up, URC_WAIT_S):
+            failed.append("+SAPBR 1: DEACT did not clear bearer_up")
+        self._add_fixes()
+        if not self.uplink.flush():
+            failed.append("flush failed after the bearer came back")
+        if self.sim.bearer_opens != opens + 1:
+            failed.append("bearer was not reopened")
+        return failed
+
+    def network_error(self):
+        self._add_fixes()
+        waiting = self.spool.pending
+        self.sim.fail_status = 601
+        failed = []
+        if self.uplink.flush():
+            failed.append("flush reported success on 601")
+        if self.gsm.bearer_up:
+            failed.append("601 did not mark the bearer for a re-check")
+        if self.spool.pending != waiting:
+            failed.append(f"{waiting - self.spool.pending} records acknowledged on 601")
+        self.sim.fail_status = None
+        if not self.uplink.flush():
+            failed.append("flush failed after the network came back")
+        if self.uplink.failures:
+            failed.append("failure count not reset")
+        return failed
+
+    def server_error(self):
+        self._add_fixes()
+        waiting = self.spool.pending
+        self.server.status = 503
+        failed = []
+        if self.uplink.flush():
+            failed.append("flush reported success on 503")
+        if self.spool.pending != waiting:
+            failed.append(f"{waiting - self.spool.pending} records acknowledged on 503")
+        self.server.status = 204
+        if not self.uplink.flush():
+            failed.append("flush failed after the server came back")
+        return failed
+
+    def lost_ack(self):
+        self._add_fixes()
+        duplicates = self.server.duplicates
+        self.sim.lose_response = True
+        failed = []
+        if self.uplink.flush():
+            failed.append("flush reported success without an answer")
+        self.sim.lose_response = False
+        if not self.uplink.flush():
+            failed.append("retry failed")
+        if self.server.duplicates != duplicates + 1:
+            failed.append("retried batch was not recognised by its Idempotency-Key")
+        return failed
+
+    def resume(self):
+        self.server.status = 503
+        self._add_fixes()
+        self.uplink.flush()
+        waiting = self.spool.pending
+        self.spool.close()  # The restart
+        self._open_spool()
+        self.server.status = 204
+        failed = []
+        if self.spool.pending != waiting:
+            failed.append(f"{self.spool.pending} records waiting after the restart, expected {waiting}")
+        if not self.uplink.flush():
+            failed.append("flush failed after the restart")
+        return failed
+
+    def delivered(self):
+        """Every spooled record on the server, once and in order"""
+        expected = list(range(1, self.spool.next_seq))
+        if self.server.seqs != expected:
+            missing = sorted(set(expected) - set(self.server.seqs))
+            return [f"server holds {len(self.server.seqs)} records, expected {len(expected)} "
+                    f"(missing {missing[:10]})"]
+        return []
+
+
+SCENARIOS = (
+    ('post', Simulation.post),
+    ('bearer-drop', Simulation.bearer_drop),
+    ('60x', Simulation.network_error),
+    ('server-error', Simulation.server_error),
+    ('lost-ack', Simulation.lost_ack),
+    ('resume', Simulation.resume),
+    ('delivered', Simulation.delivered),
+)
+
+
+def run_simulation(records=20, batch_bytes=1024):
+    """Run every scenario in order; returns [(name, failed checks, seconds)]"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="uplink_sim_") as workdir:
+        sim = Simulation(workdir, records, batch_bytes)
+        try:
+            sim.gsm.init_thread.join(INIT_TIMEOUT_S)
+            if not sim.gsm.module_ready:
+                return [('init', ["simulated modem did not initialise"], 0.0)]
+            for name, scenario in SCENARIOS:
+                started = time.monotonic()
+                results.append((name, scenario(sim), time.monotonic() - started))
+        finally:
+            sim.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exercise the telemetry uplink against a "
+                                                 "simulated SIM800L and a local server")
+    parser.add_argument("--records", type=int, default=20, help="Records spooled per scenario")
+    parser.add_argument("--batch-bytes", type=int, default=1024,
+                        help="Uplink batch size (small, so a backlog takes several posts)")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="Only run the stand-in server on PORT until interrupted")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show component log output")
+    args = parser.parse_args(argv)
+    if args.records < 1:
+        parser.error("--records must be at least 1")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL + 1,
+                        format='%(levelname)s - %(message)s')
+
+    if args.serve is not None:
+        server = TelemetryServer(args.serve)
+        print(f"Telemetry stand-in at {server.url} (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(60)
+                print(f"{len(server.batches)} batches, {len(server.seqs)} records, "
+                      f"{server.duplicates} duplicates")
+        except KeyboardInterrupt:
+            server.close()
+        return 0
+
+    failures = 0
+    for name, failed, seconds in run_simulation(args.records, args.batch_bytes):
+        print(f"{name:<13} {'FAIL' if failed else 'ok'}  ({seconds:.1f}s)")
+        for check in failed:
+            print(f"    {check}")
+        failures += bool(failed)
+    print(f"FAIL: {failures} scenario(s)" if failures else "PASS")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())